@@ -0,0 +1,81 @@
+"""
+Responses per second for tools/list and initialize.
+
+"before" rebuilds the tool catalogue (a deep copy stands in for the old
+inline literal) and serializes it through JSONResponse on every call, as
+mcp_endpoint used to; "after" splices the request id into
+the bytes precomputed at import time. The end-to-end figures drive the real
+/mcp route in-process through httpx's ASGI transport.
+
+Usage:
+    python benchmarks/bench_catalogue.py --seconds 2
+"""
+import argparse
+import asyncio
+import copy
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+
+def rate(fn, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            fn()
+        count += 100
+    return count / seconds
+
+
+async def end_to_end(app, method, seconds):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        count = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            resp = await http.post("/mcp", json={"jsonrpc": "2.0", "id": count, "method": method})
+            resp.raise_for_status()
+            count += 1
+        return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    import cloud_server
+    from fastapi.responses import JSONResponse
+    from jsonrpc import Message
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    class FakeRequest:
+        headers = {}
+
+    for method, result in (("tools/list", cloud_server.TOOLS_LIST_RESULT), ("initialize", cloud_server.INITIALIZE_RESULT)):
+        body = {"jsonrpc": "2.0", "id": 1, "method": method}
+
+        def before():
+            JSONResponse({"jsonrpc": "2.0", "id": body.get("id"), "result": copy.deepcopy(result)})
+
+        message = Message(method, id=1)
+
+        def after():
+            cloud_server.precomputed_response(FakeRequest, message)
+
+        before_rate = rate(before, args.seconds)
+        after_rate = rate(after, args.seconds)
+        e2e = asyncio.run(end_to_end(cloud_server.app, method, args.seconds))
+        print(f"{method:<11} build+encode: before {before_rate:10.0f}/s  after {after_rate:10.0f}/s  "
+              f"({after_rate / before_rate:.1f}x)   end-to-end /mcp: {e2e:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Concurrent-request throughput of /mcp against the local stub Scanova API.
+
+Compares the blocking path (the sync ``qrcode.py`` wrappers called one after
+another, which is how the event loop behaved when tools/call used them
+directly) with concurrent ``tools/call`` requests to ``/mcp`` awaiting the
+async client, and samples ``/health`` latency while the load is running.
+
+Usage:
+    python benchmarks/bench_concurrency.py --requests 200 --concurrency 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from mock_scanova import create_app, free_port, serve_in_thread
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def tool_call(i):
+    return {
+        "jsonrpc": "2.0",
+        "id": i,
+        "method": "tools/call",
+        "params": {"name": "retrieve_qr_code", "arguments": {"qrid": str(i)}},
+    }
+
+
+def bench_blocking(total):
+    import qrcode
+
+    started = time.perf_counter()
+    for i in range(total):
+        qrcode.retrieve_qr_code(str(i), api_key="bench-key")
+    return time.perf_counter() - started
+
+
+async def bench_async(base_url, total, concurrency):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        semaphore = asyncio.Semaphore(concurrency)
+        health = []
+        done = asyncio.Event()
+
+        async def one(i):
+            async with semaphore:
+                resp = await http.post("/mcp", json=tool_call(i), headers={"Authorization": "bench-key"})
+                resp.raise_for_status()
+
+        async def probe():
+            while not done.is_set():
+                t = time.perf_counter()
+                await http.get("/health")
+                health.append(time.perf_counter() - t)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+        return elapsed, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub API latency in seconds")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = serve_in_thread(create_app(args.latency), stub_port)
+    os.environ["SCANOVA_BASE_URL"] = f"http://127.0.0.1:{stub_port}/"
+    # All benchmark calls share one API key and repeat the same reads; measure
+    # upstream concurrency, not the per-key limits or the response cache
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+    sys.path.insert(0, str(SRC))
+
+    import cloud_server
+    import httpx
+
+    # Per-request INFO logs from httpx would dominate the measurement
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    mcp_port = free_port()
+    mcp = serve_in_thread(cloud_server.app, mcp_port)
+
+    blocking = bench_blocking(args.requests)
+    elapsed, health = asyncio.run(bench_async(f"http://127.0.0.1:{mcp_port}", args.requests, args.concurrency))
+
+    print(f"stub latency {args.latency * 1000:.0f} ms, {args.requests} tools/call requests")
+    print(f"  blocking (sequential sync calls): {args.requests / blocking:8.1f} req/s  ({blocking:.2f} s)")
+    print(f"  async /mcp, concurrency {args.concurrency:<4}   : {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f} s)")
+    if health:
+        print(f"  /health under load: median {statistics.median(health) * 1000:.1f} ms, max {max(health) * 1000:.1f} ms")
+    pool = httpx.get(f"http://127.0.0.1:{mcp_port}/health").json()["upstream_pool"]
+    print(f"  upstream pool: {pool['requests']} calls, reuse ratio {pool['reuse_ratio']:.2f}, "
+          f"avg {pool['avg_latency_ms']:.1f} ms")
+
+    mcp.should_exit = True
+    stub.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold start of the stdio servers: time to the first initialize response.
+
+Starts each stdio server as a fresh process (as an IDE does per session),
+sends initialize and tools/list, and measures the time until each answer
+arrives. It compares the lightweight ``stdio_server.py`` with the FastMCP
+``server.py``. It also profiles the import graph of ``stdio_server`` with
+``python -X importtime``, and fails if heavy packages are imported before
+the first tools/call or if the imports exceed a time budget.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 250
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+SERVERS = {
+    "stdio_server.py": [sys.executable, str(SRC / "stdio_server.py")],
+    "server.py (FastMCP)": [sys.executable, "-c", "from server import server; server.run()"],
+}
+
+# Packages the stdio server must not import before the first tools/call
+DEFERRED_PACKAGES = ("mcp", "fastapi", "starlette", "uvicorn", "httpx", "pydantic", "sqlite3")
+
+MESSAGES = [
+    {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {
+        "protocolVersion": "2025-06-18", "capabilities": {},
+        "clientInfo": {"name": "bench", "version": "1.0"},
+    }},
+    {"jsonrpc": "2.0", "method": "notifications/initialized"},
+    {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+]
+
+
+def cold_start(command):
+    """
+    Returns:
+        tuple: Seconds until the initialize and the tools/list responses.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=SRC, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        process.stdin.write(b"".join(json.dumps(m).encode() + b"\n" for m in MESSAGES))
+        process.stdin.flush()
+        times = {}
+        while len(times) < 2:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"{command[-1]} exited before answering")
+            times[json.loads(line)["id"]] = time.perf_counter() - started
+        return times[1], times[2]
+    finally:
+        process.stdin.close()
+        process.terminate()
+        process.wait()
+
+
+def import_profile(module):
+    """
+    Returns:
+        tuple: (total import ms, {top-level package: cumulative ms}) for ``module``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        if name == module:
+            total = int(cumulative) / 1000
+        top = name.split(".")[0]
+        packages[top] = max(packages.get(top, 0.0), int(cumulative) / 1000)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=250.0,
+                        help="import time budget of stdio_server")
+    args = parser.parse_args()
+
+    print(f"time to first response, median of {args.runs} cold starts:")
+    for name, command in SERVERS.items():
+        samples = [cold_start(command) for _ in range(args.runs)]
+        initialize = statistics.median(s[0] for s in samples)
+        tools_list = statistics.median(s[1] for s in samples)
+        print(f"  {name:<20} initialize {initialize * 1000:7.1f} ms   tools/list {tools_list * 1000:7.1f} ms")
+
+    total, packages = import_profile("stdio_server")
+    print(f"stdio_server imports: {total:.1f} ms; slowest packages:")
+    slowest = sorted((item for item in packages.items() if item[0] != "stdio_server"), key=lambda item: -item[1])
+    for package, ms in slowest[:8]:
+        print(f"  {package:<20} {ms:7.1f} ms")
+
+    failures = [f"{package} is imported at startup" for package in DEFERRED_PACKAGES if package in packages]
+    if total > args.max_import_ms:
+        failures.append(f"imports take {total:.1f} ms, budget {args.max_import_ms:.0f} ms")
+    if failures:
+        sys.exit("import check failed: " + "; ".join(failures))
+    print("import check passed")
+
+
+if __name__ == "__main__":
+    main()
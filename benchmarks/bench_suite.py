@@ -0,0 +1,306 @@
+"""
+Latency, throughput and memory of /mcp under realistic request mixes.
+
+Starts the stub Scanova API and ``src/cloud_server.py`` as separate
+processes and drives /mcp with each workload mix in turn. Per mix it
+reports p50/p95/p99 latency, throughput, the share of failed calls and the
+server's resident memory. Then each mix is replayed sequentially against the
+same app loaded in this process, under tracemalloc, to measure memory
+allocated per request: the peak of memory allocated while a request is
+handled (``alloc_kb``; the in-process httpx client is included, the same
+for every run) and the blocks still held after it (``retained_blocks``,
+which grows with caches and leaks). Results can be saved as a baseline and
+later runs compared against it, so regressions in the request path show up.
+
+Usage:
+    python benchmarks/bench_suite.py --save benchmarks/baselines/baseline.json
+    python benchmarks/bench_suite.py --compare benchmarks/baselines/baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+from mock_scanova import free_port, wait_until_up
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def rpc(method, params=None):
+    body = {"jsonrpc": "2.0", "method": method}
+    if params is not None:
+        body["params"] = params
+    return body
+
+
+def call(name, **arguments):
+    return rpc("tools/call", {"name": name, "arguments": arguments})
+
+
+def qrid():
+    return str(random.randint(1, 500))
+
+
+# Workload mixes: (weight, request builder) pairs
+MIXES = {
+    "catalogue": [
+        (8, lambda: rpc("tools/list")),
+        (1, lambda: rpc("initialize", {})),
+        (1, lambda: call("retrieve_qr_code", qrid=qrid())),
+    ],
+    "list": [
+        (6, lambda: call("list_qr_codes", page=random.randint(1, 20))),
+        (1, lambda: call("list_qr_codes", page=1, fields=["qrid", "name"])),
+        (3, lambda: call("retrieve_qr_code", qrid=qrid())),
+    ],
+    "bulk": [
+        (1, lambda: call("bulk_create_qr_codes", items=[
+            {"name": f"bench-{i}", "qr_type": "dy", "category": "website_url",
+             "info": {"url": f"https://example.com/{i}"}}
+            for i in range(20)
+        ])),
+    ],
+    "download": [
+        (7, lambda: call("download_qr_code", qrid=qrid())),
+        (3, lambda: call("retrieve_qr_code", qrid=qrid())),
+    ],
+}
+
+# Compared against a baseline: lower is better for these, higher for throughput
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "rss_mb", "alloc_kb")
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def memory(pid):
+    """Return (current, peak) resident memory of a process in MB, or Nones off Linux."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None, None
+    values = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    return tuple(
+        int(values[key].split()[0]) / 1024 if key in values else None
+        for key in ("VmRSS", "VmHWM")
+    )
+
+
+async def run_mix(base_url, mix, total, concurrency, tenants):
+    builders = [builder for weight, builder in MIXES[mix] for _ in range(weight)]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as http:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        failures = 0
+
+        async def one(i):
+            nonlocal failures
+            body = random.choice(builders)()
+            body["id"] = i
+            headers = {"Authorization": f"bench-key-{i % tenants}"}
+            async with semaphore:
+                started = time.perf_counter()
+                resp = await http.post("/mcp", json=body, headers=headers)
+                latencies.append(time.perf_counter() - started)
+            answer = resp.json() if resp.status_code == 200 else {}
+            if "error" in answer or answer.get("result", {}).get("isError") or resp.status_code != 200:
+                failures += 1
+
+        # Warm-up: connections, caches and lazy imports
+        await asyncio.gather(*(one(-i - 1) for i in range(min(concurrency, total))))
+        latencies.clear()
+        failures = 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "throughput": total / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "error_rate": failures / total,
+    }
+
+
+async def measure_allocations(app, mix, total, tenants):
+    """
+    Replay ``total`` requests of a mix one at a time against ``app`` in this
+    process and return the mean peak allocation per request in KiB and the
+    mean number of memory blocks each request left allocated.
+    """
+    builders = [builder for weight, builder in MIXES[mix] for _ in range(weight)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        async def one(i):
+            body = random.choice(builders)()
+            body["id"] = i
+            await http.post("/mcp", json=body, headers={"Authorization": f"bench-key-{i % tenants}"})
+
+        # Warm-up: imports, connections and per-key state
+        for i in range(tenants):
+            await one(-i - 1)
+
+        peaks = []
+        tracemalloc.start()
+        try:
+            for i in range(total):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                await one(i)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+
+        # Counted in a second pass, since tracemalloc allocates blocks of its own
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        for i in range(total):
+            await one(i)
+        gc.collect()
+        retained = (sys.getallocatedblocks() - blocks) / total
+    return statistics.fmean(peaks) / 1024, retained
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each metric next to its baseline and return the regressions found.
+    """
+    regressions = []
+    for mix, result in results.items():
+        base = baseline.get("results", {}).get(mix)
+        if base is None:
+            continue
+        for metric in ("throughput",) + LOWER_IS_BETTER:
+            if result.get(metric) is None or not base.get(metric):
+                continue
+            change = result[metric] / base[metric] - 1
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"  {mix:<10} {metric:<11} {base[metric]:10.1f} -> {result[metric]:10.1f}  ({change:+.0%}){flag}")
+            if worse:
+                regressions.append((mix, metric, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mixes", nargs="+", choices=sorted(MIXES), default=list(MIXES))
+    parser.add_argument("--requests", type=int, default=500, help="requests per mix")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--tenants", type=int, default=20, help="distinct API keys")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub API requests failing with 503")
+    parser.add_argument("--payload-size", type=int, default=256, help="padding bytes per QR code")
+    parser.add_argument("--image-size", type=int, default=16 * 1024, help="bytes per downloaded image")
+    parser.add_argument("--allocation-requests", type=int, default=100,
+                        help="requests per mix replayed in-process to measure allocations (0 to skip)")
+    parser.add_argument("--save", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before flagging")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    stub_port, port = free_port(), free_port()
+    stub = subprocess.Popen(
+        [sys.executable, str(ROOT / "benchmarks" / "mock_scanova.py"), "--port", str(stub_port),
+         "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+         "--payload-size", str(args.payload_size), "--image-size", str(args.image_size)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    data_dir = tempfile.mkdtemp(prefix="scanova-bench-")
+    env = dict(
+        os.environ,
+        SCANOVA_BASE_URL=f"http://127.0.0.1:{stub_port}/",
+        PORT=str(port),
+        HOST="127.0.0.1",
+        SCANOVA_DATA_DIR=data_dir,
+        # The per-key limits would reject most of the load, which is not
+        # what the suite measures
+        RATE_LIMIT_ENABLED="false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "src" / "cloud_server.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(f"http://127.0.0.1:{stub_port}/qrcode/1/", stub)
+        wait_until_up(f"http://127.0.0.1:{port}/health", server)
+        print(f"{os.cpu_count()} CPUs, Python {platform.python_version()}, stub latency {args.latency * 1000:.0f} ms, "
+              f"{args.requests} requests per mix, concurrency {args.concurrency}")
+        print(f"  {'mix':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'RSS MB':>7}")
+        results = {}
+        for mix in args.mixes:
+            result = asyncio.run(run_mix(f"http://127.0.0.1:{port}", mix, args.requests, args.concurrency, args.tenants))
+            result["rss_mb"], result["peak_rss_mb"] = memory(server.pid)
+            results[mix] = result
+            rss = f"{result['rss_mb']:7.1f}" if result["rss_mb"] is not None else "      -"
+            print(f"  {mix:<10} {result['throughput']:8.1f} {result['p50_ms']:8.1f} {result['p95_ms']:8.1f} "
+                  f"{result['p99_ms']:8.1f} {result['error_rate']:7.1%} {rss}")
+
+        if args.allocation_requests:
+            # The app is loaded here against the same stub, with its own state
+            os.environ.update(env, SCANOVA_DATA_DIR=tempfile.mkdtemp(prefix="scanova-bench-"))
+            sys.path.insert(0, str(ROOT / "src"))
+            import cloud_server
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+            print(f"  {'mix':<10} {'alloc KiB/req':>14} {'retained blocks/req':>20}")
+
+            async def allocations(mix):
+                try:
+                    return await measure_allocations(cloud_server.app, mix, args.allocation_requests, args.tenants)
+                finally:
+                    await cloud_server.close_client()
+
+            for mix in args.mixes:
+                alloc_kb, retained = asyncio.run(allocations(mix))
+                results[mix]["alloc_kb"], results[mix]["retained_blocks"] = alloc_kb, retained
+                print(f"  {mix:<10} {alloc_kb:14.1f} {retained:20.1f}")
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+
+    report = {
+        "meta": {
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+        },
+        "results": results,
+    }
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2, default=str) + "\n")
+        print(f"saved to {args.save}")
+    if args.compare:
+        print(f"compared with {args.compare} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
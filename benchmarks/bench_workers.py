@@ -0,0 +1,130 @@
+"""
+Throughput of /mcp with 1..N uvicorn worker processes.
+
+Starts the stub Scanova API and then ``src/cloud_server.py`` once per worker
+count (WORKERS=n), and drives tools/call load from several generator
+processes so the load generator itself is not the single-core bottleneck.
+Throughput should grow with the worker count up to the number of free cores;
+on a single-core machine it stays flat.
+
+Usage:
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from mock_scanova import free_port, wait_until_up
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def tool_call(i):
+    return {
+        "jsonrpc": "2.0",
+        "id": i,
+        "method": "tools/call",
+        "params": {"name": "retrieve_qr_code", "arguments": {"qrid": str(i % 100)}},
+    }
+
+
+async def generate(base_url, offset, total, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        semaphore = asyncio.Semaphore(concurrency)
+        workers = set()
+
+        async def one(i):
+            async with semaphore:
+                resp = await http.post("/mcp", json=tool_call(i), headers={"Authorization": "bench-key"})
+                resp.raise_for_status()
+
+        await asyncio.gather(*(one(offset + i) for i in range(total)))
+        # Which worker answered is only visible on /health; a new connection
+        # each time, since a keep-alive connection stays with one worker
+        for _ in range(concurrency):
+            workers.add((await http.get("/health", headers={"Connection": "close"})).json()["worker"])
+        return workers
+
+
+def generator(args):
+    return asyncio.run(generate(*args))
+
+
+def run(workers, stub_url, args):
+    port = free_port()
+    env = dict(
+        os.environ,
+        SCANOVA_BASE_URL=stub_url,
+        PORT=str(port),
+        HOST="127.0.0.1",
+        WORKERS=str(workers),
+        # One API key repeating the same reads: measure serving, not the
+        # per-key limits or the response cache
+        RATE_LIMIT_ENABLED="false",
+        RESPONSE_CACHE_BACKEND="none",
+        SCANOVA_DATA_DIR=str(Path(args.data_dir) / f"workers-{workers}"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "src" / "cloud_server.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(base_url + "/health", server)
+        per_generator = args.requests // args.generators
+        jobs = [
+            (base_url, g * per_generator, per_generator, max(args.concurrency // args.generators, 1))
+            for g in range(args.generators)
+        ]
+        with multiprocessing.Pool(args.generators) as pool:
+            started = time.perf_counter()
+            answered_by = pool.map(generator, jobs)
+            elapsed = time.perf_counter() - started
+        return per_generator * args.generators / elapsed, set().union(*answered_by)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--generators", type=int, default=max(os.cpu_count() // 2, 1),
+                        help="load generator processes")
+    parser.add_argument("--latency", type=float, default=0.01, help="stub API latency in seconds")
+    parser.add_argument("--data-dir", default=str(Path(os.getenv("TMPDIR", "/tmp")) / "scanova-bench-workers"))
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, str(ROOT / "benchmarks" / "mock_scanova.py"), "--port", str(stub_port), "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        stub_url = f"http://127.0.0.1:{stub_port}/"
+        wait_until_up(stub_url + "qrcode/1/", stub)
+        print(f"{os.cpu_count()} CPUs, stub latency {args.latency * 1000:.0f} ms, "
+              f"{args.requests} tools/call requests, concurrency {args.concurrency}, {args.generators} generator(s)")
+        baseline = None
+        for workers in args.workers:
+            throughput, answered_by = run(workers, stub_url, args)
+            baseline = baseline or throughput
+            print(f"  workers {workers:<3}: {throughput:8.1f} req/s  (x{throughput / baseline:.2f}, "
+                  f"{len(answered_by)} worker(s) answered /health)")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
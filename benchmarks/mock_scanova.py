@@ -0,0 +1,145 @@
+"""
+Local stub of the Scanova management API used by the benchmarks.
+
+Serves the /qrcode/ endpoints used in src/qrcode.py with an artificial
+per-request latency, so throughput numbers reflect how the MCP server
+overlaps upstream waits rather than real network conditions. A share of
+requests can fail with 503, and QR codes and images can be padded to a
+given size.
+
+Run standalone with:
+    python benchmarks/mock_scanova.py --port 9100 --latency 0.05 --error-rate 0.01 --payload-size 512
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+
+def create_app(latency=0.05, error_rate=0.0, payload_size=0, image_size=2048):
+    """
+    Build the stub API app.
+
+    Args:
+        latency (float): Seconds to sleep before answering each request.
+        error_rate (float): Share of requests answered with 503 Service Unavailable.
+        payload_size (int): Bytes of padding in each QR code's "description".
+        image_size (int): Size in bytes of downloaded images.
+
+    Returns:
+        FastAPI: The stub application.
+    """
+    app = FastAPI()
+    ids = itertools.count(1)
+    store = {}
+
+    padding = "x" * payload_size
+    image = b"\x89PNG\r\n\x1a\n" + b"\x00" * max(image_size - 8, 0)
+
+    async def wait():
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and random.random() < error_rate:
+            raise HTTPException(503, "Service temporarily unavailable")
+
+    def qr(qrid, **fields):
+        item = store.setdefault(qrid, {
+            "qrid": qrid,
+            "name": f"qr-{qrid}",
+            "qr_type": "dy",
+            "category": "website_url",
+            "info": {"url": f"https://example.com/{qrid}"},
+            "is_active": True,
+            "description": padding,
+            "updated": time.time(),
+        })
+        if fields:
+            item.update(fields, updated=time.time())
+        return item
+
+    @app.get("/qrcode/")
+    async def list_qr(page: int = 1, limit: int = 10):
+        await wait()
+        start = (page - 1) * limit
+        return {"count": 1000, "results": [qr(str(i)) for i in range(start + 1, start + limit + 1)]}
+
+    @app.post("/qrcode/")
+    async def create_qr(request: Request):
+        await wait()
+        body = await request.json()
+        return qr(str(next(ids) + 100000), **body)
+
+    @app.get("/qrcode/{qrid}/")
+    async def retrieve_qr(qrid: str):
+        await wait()
+        return qr(qrid)
+
+    @app.put("/qrcode/{qrid}/")
+    @app.patch("/qrcode/{qrid}/")
+    async def update_qr(qrid: str, request: Request):
+        await wait()
+        return qr(qrid, **(await request.json()))
+
+    @app.get("/qrcode/{qrid}/download")
+    async def download_qr(qrid: str):
+        await wait()
+        return Response(image, media_type="image/png")
+
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=30):
+    """
+    Poll ``url`` until it answers, failing early if ``process`` (a Popen) exits.
+    """
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {timeout} seconds")
+
+
+def serve_in_thread(app, port):
+    """
+    Start a uvicorn server for ``app`` on a daemon thread and wait until it accepts connections.
+
+    Returns:
+        uvicorn.Server: The running server; set ``should_exit = True`` to stop it.
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument("--image-size", type=int, default=2048)
+    args = parser.parse_args()
+    app = create_app(args.latency, args.error_rate, args.payload_size, args.image_size)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
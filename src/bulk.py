@@ -0,0 +1,204 @@
+import asyncio
+import time
+
+from config import BULK_CONCURRENCY, BULK_MAX_ITEMS, BULK_MAX_RETRIES
+from progress import report_progress
+from resilience import parse_retry_after
+from scanova_client import API_KEY_REQUIRED, last_response
+
+# Fallback pause when a 429 response carries no usable Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimitGate:
+    """
+    Shared pause for the workers of one bulk run.
+
+    When any item is rate limited by the Scanova API, every worker waits until
+    the Retry-After period has passed before sending its next request.
+    """
+
+    def __init__(self):
+        self.until = 0.0
+
+    def block(self, seconds):
+        self.until = max(self.until, time.monotonic() + seconds)
+
+    async def wait(self):
+        delay = self.until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.until - time.monotonic()
+
+
+def retry_after_seconds(resp, attempt):
+    """
+    Return how long to wait after a 429 response.
+
+    Uses the Retry-After header when present, otherwise an exponential
+    backoff based on the attempt number.
+    """
+    delay = parse_retry_after(resp)
+    if delay is None:
+        return DEFAULT_RETRY_AFTER * 2 ** attempt
+    return delay
+
+
+async def run_bulk(items, operation, concurrency=BULK_CONCURRENCY, max_retries=BULK_MAX_RETRIES, on_result=None):
+    """
+    Run ``operation`` for every item with bounded concurrency.
+
+    Items answered with 429 Too Many Requests are retried after the Retry-After
+    delay, and all workers of the run pause for that delay too. Other failures
+    are reported per item without stopping the run.
+
+    Args:
+        items (list): Items to process.
+        operation (callable): Coroutine function called as ``operation(item)``
+            returning the ScanovaClient result dict.
+        concurrency (int): Maximum number of upstream requests in flight.
+        max_retries (int): Retries per item after a 429 response.
+        on_result (callable, optional): Called with each item's result dict
+            as soon as the item finishes.
+
+    Returns:
+        dict: Totals and per-item results in input order, e.g.
+            {"total": 2, "succeeded": 1, "failed": 1,
+             "results": [{"index": 0, "success": True, "result": {...}}, ...]}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = RateLimitGate()
+    done = 0
+
+    async def run_item(index, item):
+        nonlocal done
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                await gate.wait()
+                last_response.set(None)
+                try:
+                    result = await operation(item)
+                except Exception as e:
+                    result = {"error": f"Bulk item failed: {str(e)}"}
+                resp = last_response.get()
+                if resp is None or resp.status_code != 429 or attempt == max_retries:
+                    break
+                gate.block(retry_after_seconds(resp, attempt))
+
+        # No response: answered without an upstream call, e.g. from a cache
+        success = (
+            (resp is None or resp.is_success)
+            and not (isinstance(result, dict) and "error" in result)
+        )
+        done += 1
+        report_progress(done, len(items), f"{done} of {len(items)} items processed")
+        outcome = {"index": index, "success": success, "result": result}
+        if on_result is not None:
+            on_result(outcome)
+        return outcome
+
+    results = await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items)))
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+def create_operation(client, api_key):
+    """Per-item operation of bulk_create_qr_codes: item is the create parameters."""
+    return lambda params: client.create_qr_code(params, api_key=api_key)
+
+
+def update_operation(client, api_key):
+    """Per-item operation of bulk_update_qr_codes: item is {"qrid": ..., "params": ...}."""
+    async def update(item):
+        if not isinstance(item, dict):
+            return {"error": "Each item must be an object with 'qrid' and 'params'"}
+        return await client.update_qr_code(item.get("qrid"), item.get("params"), api_key=api_key)
+
+    return update
+
+
+def set_active_operation(client, is_active, api_key):
+    """Per-item operation of bulk_set_qr_active: item is a qrid."""
+    if is_active:
+        return lambda qrid: client.activate_qr_code(qrid, api_key=api_key)
+    return lambda qrid: client.deactivate_qr_code(qrid, api_key=api_key)
+
+
+def _check_items(items, name):
+    if not isinstance(items, list) or not items:
+        return {"error": f"A non-empty list of {name} is required for bulk operations"}
+    if len(items) > BULK_MAX_ITEMS:
+        return {"error": f"Too many {name}: at most {BULK_MAX_ITEMS} are allowed per bulk call"}
+    return None
+
+
+async def bulk_create_qr_codes(client, items=None, api_key=None):
+    """
+    Create many QR codes.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        items (list): QR code parameters for each QR code, as for create_qr_code.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results (see run_bulk).
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    error = _check_items(items, "items")
+    if error:
+        return error
+
+    return await run_bulk(items, create_operation(client, api_key))
+
+
+async def bulk_update_qr_codes(client, items=None, api_key=None):
+    """
+    Update many QR codes.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        items (list): Dicts with the "qrid" of the QR code and the "params" to update.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results (see run_bulk).
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    error = _check_items(items, "items")
+    if error:
+        return error
+
+    return await run_bulk(items, update_operation(client, api_key))
+
+
+async def bulk_set_qr_active(client, qrids=None, is_active=True, api_key=None):
+    """
+    Activate or deactivate many QR codes.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        qrids (list): IDs of the QR codes to change.
+        is_active (bool): True to activate, False to deactivate.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results (see run_bulk).
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    error = _check_items(qrids, "qrids")
+    if error:
+        return error
+
+    return await run_bulk(qrids, set_active_operation(client, is_active, api_key))
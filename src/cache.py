@@ -0,0 +1,242 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlencode
+
+from config import (
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL,
+)
+
+
+class CacheBackend:
+    """
+    Storage interface for ResponseCache.
+
+    Keys are strings and values are bytes. Implementations own expiry and
+    size bounds, and must be safe to call from several threads. A shared
+    backend (e.g. Redis) can be plugged in later by implementing these methods.
+    """
+
+    def get(self, key):
+        """Return the stored bytes, or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``ttl`` seconds and return the number of entries evicted to make room."""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix):
+        """Delete every entry whose key starts with ``prefix`` and return how many were deleted."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU store bounded by total value bytes and entry count.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+            evicted = 0
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class SqliteBackend(CacheBackend):
+    """
+    Local-file store, so entries survive restarts and can be shared by
+    processes on the same host. LRU order is tracked with an access timestamp.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl, now),
+            )
+            evicted = self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,)).rowcount
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+            if total <= self.max_bytes and count <= self.max_entries:
+                return evicted
+            for old_key, size in self._db.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+                if total <= self.max_bytes and count <= self.max_entries:
+                    break
+                self._db.execute("DELETE FROM cache WHERE key = ?", (old_key,))
+                total -= size
+                count -= 1
+                evicted += 1
+            return evicted
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            # Range scan on the primary key instead of LIKE, which would need escaping
+            return self._db.execute(
+                "DELETE FROM cache WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff")
+            ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache:
+    """
+    Tenant-scoped read-through cache for Scanova API reads.
+
+    Entries are keyed by (hashed API key, endpoint path, normalized query
+    params) and stored as JSON bytes, so every hit returns a fresh copy.
+    """
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(tenant, path, params=None):
+        """
+        Build the cache key for a read.
+
+        Params are sorted and stringified so ``{"page": 1}`` and ``{"page": "1"}`` share an entry.
+        """
+        query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None))
+        return f"{tenant}|{path}|{query}"
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, result):
+        self.evictions += self.backend.set(key, json.dumps(result).encode("utf-8"), self.ttl)
+
+    def invalidate(self, tenant, path):
+        """Drop every cached read of ``path`` for one tenant, whatever its params."""
+        self.invalidations += self.backend.delete_prefix(f"{tenant}|{path}|")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit, miss, eviction and invalidation counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Return the process-wide ResponseCache configured by RESPONSE_CACHE_BACKEND,
+    or None when caching is disabled.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None and RESPONSE_CACHE_BACKEND != "none":
+            if RESPONSE_CACHE_BACKEND == "sqlite":
+                backend = SqliteBackend()
+            else:
+                backend = MemoryBackend()
+            _default_cache = ResponseCache(backend)
+    return _default_cache
@@ -1,19 +1,81 @@
-from mcp.server.fastmcp import FastMCP
-from mcp.types import ToolAnnotations
 import json
 import os
 import asyncio
-from qrcode import create_qr_code, list_qr_codes, update_qr_code, retrieve_qr_code, download_qr_code, activate_qr_code, deactivate_qr_code
-from config import OAUTH_SERVER_URL, MCP_RESOURCE_URL, OPENAI_APPS_CHALLENGE
+import hashlib
+import math
+import time
+import weakref
+from contextlib import asynccontextmanager, nullcontext
+from scanova_client import get_client, close_client, current_tenant, tenant_hash, UpstreamTimer, upstream_timer
+from credentials import CredentialCache
+from image_cache import content_type_for
+from governor import Governor, RateLimited
+import jobs
+import metrics
+import qr_render
+import tracing
+from progress import ProgressReporter, progress_reporter, progress_token
+from sessions import SessionStore
+from tools import PROTOCOL_VERSIONS, SERVER_INFO, TOOLS, TOOL_HANDLERS, tool_stats
+from serialization import dumps, tool_result
+import jsonrpc
+from jsonrpc import INVALID_REQUEST
+from config import OAUTH_SERVER_URL, MCP_RESOURCE_URL, OPENAI_APPS_CHALLENGE, MCP_BATCH_CONCURRENCY, MCP_MAX_BATCH_SIZE, MCP_MAX_BODY_BYTES, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MAX_BYTES, RATE_LIMIT_ENABLED
+from config import WORKERS, SERVER_BACKLOG, SERVER_KEEP_ALIVE, SERVER_GRACEFUL_TIMEOUT, METRICS_DIR, METRICS_SNAPSHOT_INTERVAL
+from config import MCP_SESSIONS_ENABLED, MCP_SSE_PING_INTERVAL, JOBS_ENABLED, AUTH_CACHE_ENABLED
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 import uvicorn
 import logging
 log = logging.getLogger('mcp')
 
+
+class FastJSONResponse(Response):
+    """
+    JSONResponse replacement that encodes with ``serialization.dumps``.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every upstream call feeds the scanova_upstream_* metrics
+    get_client().add_stats_hook(metrics.record_upstream)
+    if credentials is not None:
+        get_client().add_stats_hook(forget_revoked)
+    metrics.REGISTRY.add_collector(collect_component_metrics)
+    snapshots = asyncio.ensure_future(write_metrics_snapshots()) if WORKERS > 1 else None
+    # Background jobs; queued and interrupted ones resume once their tenant calls again
+    job_runner = jobs.get_job_runner() if JOBS_ENABLED else None
+    if job_runner is not None:
+        job_runner.start()
+    yield
+    if job_runner is not None:
+        await job_runner.stop()
+    if snapshots is not None:
+        snapshots.cancel()
+        metrics.remove_snapshot(METRICS_DIR)
+    metrics.REGISTRY.remove_collector(collect_component_metrics)
+    # Release pooled upstream connections held by the Scanova client
+    await close_client()
+
+
+async def write_metrics_snapshots():
+    # Lets whichever worker is scraped report the metrics of all workers
+    while True:
+        try:
+            metrics.write_snapshot(METRICS_DIR)
+        except OSError as e:
+            log.warning(f"Metrics snapshot failed: {str(e)}")
+        await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL)
+
 # Create FastAPI app for HTTP transport
-app = FastAPI(title="Scanova MCP Server", version="1.0.0")
+app = FastAPI(title="Scanova MCP Server", version="1.0.0", lifespan=lifespan)
 
 
 # Add CORS middleware for web access
@@ -23,6 +85,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After", "Mcp-Session-Id"],
 )
 
 def extract_api_key(request: Request) -> str:
@@ -56,67 +119,90 @@ def extract_api_key(request: Request) -> str:
     
     return api_key
 
-# Create MCP server
-server = FastMCP()
-
-READ_ONLY_TOOL_ANNOTATIONS = ToolAnnotations(
-    readOnlyHint=True, openWorldHint=True, destructiveHint=False
-)
-WRITE_TOOL_ANNOTATIONS = ToolAnnotations(
-    readOnlyHint=False, openWorldHint=True, destructiveHint=False
-)
-READ_ONLY_TOOL_ANNOTATIONS_JSON = {
-    "readOnlyHint": True, "openWorldHint": True, "destructiveHint": False
-}
-WRITE_TOOL_ANNOTATIONS_JSON = {
-    "readOnlyHint": False, "openWorldHint": True, "destructiveHint": False
+UNAUTHORIZED_BODY = dumps({"error": "unauthorized", "message": "Valid Bearer token required"})
+UNAUTHORIZED_HEADERS = {
+    "WWW-Authenticate": f'Bearer realm="Scanova MCP", resource_metadata="{MCP_RESOURCE_URL}/.well-known/oauth-protected-resource/mcp'
 }
 
-@server.tool()
-def get_scanova_data(query: str) -> str:
-    return "This is a test response"
-
-@server.tool("create_qr_code", description="Create a new QR code. Can be called with: create qr, make qr code, generate qr, new qr code, add qr code", annotations=WRITE_TOOL_ANNOTATIONS)
-def create_qr_code_tool(params: dict = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    log.error(f"create_qr_code_tool")
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("list_qr_codes", description="List QR codes. Can be called with: list qr codes, fetch qr list, get qr codes, show qr codes, display qr codes, last 5 qr codes, recent qr codes", annotations=READ_ONLY_TOOL_ANNOTATIONS)
-def list_qr_codes_tool(page: int = 1, limit: int = 10, search: str = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    log.info(f"list_qr_codes_tool")
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("update_qr_code", description="Update an existing QR code. Can be called with: update qr, modify qr code, edit qr code, change qr code", annotations=WRITE_TOOL_ANNOTATIONS)
-def update_qr_code_tool(qrid: str = None, params: dict = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("retrieve_qr_code", description="Get details of a specific QR code. Can be called with: get qr details, fetch qr code, show qr info, qr code info", annotations=READ_ONLY_TOOL_ANNOTATIONS)
-def retrieve_qr_code_tool(qrid: str = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("download_qr_code", description="Download QR code image. Can be called with: download qr, get qr image, save qr code, export qr code", annotations=READ_ONLY_TOOL_ANNOTATIONS)
-def download_qr_code_tool(qrid: str = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("activate_qr_code", description="Activate a QR code. Can be called with: activate qr, enable qr code, turn on qr code, make qr active", annotations=WRITE_TOOL_ANNOTATIONS)
-def activate_qr_code_tool(qrid: str = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
-
-@server.tool("deactivate_qr_code", description="Deactivate a QR code. Can be called with: deactivate qr, disable qr code, turn off qr code, make qr inactive", annotations=WRITE_TOOL_ANNOTATIONS)
-def deactivate_qr_code_tool(qrid: str = None):
-    # This tool is mainly for FastMCP, the HTTP endpoint handles API key extraction
-    return {"error": "Please use the HTTP MCP endpoint for API key authentication"}
+def encoded_response(content, status_code=200, headers=None):
+    """A JSON response whose body is already encoded."""
+    return Response(content, status_code=status_code, headers=headers, media_type="application/json")
+
+def unauthorized_response():
+    return encoded_response(UNAUTHORIZED_BODY, 401, UNAUTHORIZED_HEADERS)
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "scanova-mcp"}
+    client = get_client()
+    circuits = {host: breaker.snapshot() for host, breaker in client.breakers.items()}
+    return {
+        # Degraded while the Scanova API is failing fast behind an open circuit
+        "status": "degraded" if any(c["state"] == "open" for c in circuits.values()) else "healthy",
+        "service": "scanova-mcp",
+        "worker": os.getpid(),
+        "upstream_pool": client.stats.snapshot(),
+        "upstream_circuit": circuits,
+        "coalescing": client.flights.stats(),
+        "response_cache": client.cache.stats() if client.cache is not None else None,
+        "image_cache": client.images.stats() if client.images is not None else None,
+        "qr_preview_cache": qr_render.cache_stats(),
+        "tools": tool_stats(),
+        "rate_limits": governor.stats() if governor is not None else None,
+        "tracing": tracing.tracer.stats() if tracing.tracer is not None else None,
+        "sessions": sessions.stats() if sessions is not None else None,
+        "credentials": credentials.stats() if credentials is not None else None,
+        "jobs": jobs.get_job_runner().stats() if JOBS_ENABLED else None,
+    }
+
+def collect_component_metrics():
+    """
+    Scrape-time gauges read from the client, caches and governor.
+    """
+    client = get_client()
+    yield from metrics.stats_gauges("scanova_upstream_pool", "Upstream connection pool", client.stats.snapshot())
+    yield from metrics.stats_gauges("scanova_coalescing", "Coalescing of identical upstream reads", client.flights.stats())
+    if client.cache is not None:
+        yield from metrics.stats_gauges("mcp_response_cache", "Upstream response cache", client.cache.stats())
+    if client.images is not None:
+        yield from metrics.stats_gauges("mcp_image_cache", "On-disk image cache", client.images.stats())
+    yield from metrics.stats_gauges("mcp_qr_preview_cache", "Local QR preview caches", qr_render.cache_stats())
+    if sessions is not None:
+        yield from metrics.stats_gauges("mcp_sessions", "Streamable HTTP sessions", sessions.stats())
+    if credentials is not None:
+        yield from metrics.stats_gauges("mcp_credentials", "Validated API key cache", credentials.stats())
+    if JOBS_ENABLED:
+        yield from metrics.stats_gauges("mcp_jobs", "Background jobs", jobs.get_job_runner().stats())
+    if governor is not None:
+        stats = governor.stats()
+        rejected = stats.pop("rejected")
+        yield from metrics.stats_gauges("mcp_rate_limit", "tools/call admission", stats)
+        gauge = metrics.Gauge("mcp_rate_limit_rejected", "tools/call calls rejected by admission control, by scope.", ["scope"])
+        for scope, count in rejected.items():
+            gauge.set(count, scope)
+        yield gauge
+    state = metrics.Gauge("scanova_circuit_state", "Circuit breaker state per upstream host (0 closed, 1 half open, 2 open).", ["host"])
+    opened = metrics.Gauge("scanova_circuit_opened", "Times the circuit breaker opened, per upstream host.", ["host"])
+    for host, breaker in client.breakers.items():
+        snapshot = breaker.snapshot()
+        state.set(CIRCUIT_STATES[snapshot["state"]], host)
+        opened.set(snapshot["opened"], host)
+    yield state
+    yield opened
+
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics_endpoint():
+    if WORKERS > 1:
+        metrics.write_snapshot(METRICS_DIR)
+        content = metrics.merge_snapshots(METRICS_DIR, max_age=3 * METRICS_SNAPSHOT_INTERVAL)
+    else:
+        content = metrics.REGISTRY.render()
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
 
 # OAuth Discovery Endpoint
 @app.get("/.well-known/oauth-protected-resource")
@@ -137,230 +223,647 @@ async def oauth_protected_resource_mcp():
 async def openai_apps_challenge():
     return OPENAI_APPS_CHALLENGE if OPENAI_APPS_CHALLENGE else "No challenge token configured"
 
-# MCP JSON-RPC endpoint
-@app.post("/mcp")
-async def mcp_endpoint(request: Request):
-    try:
-        # Get the JSON-RPC request body first to check the method
-        body = await request.json()
-        method = body.get("method")
-        
-        # Extract API key from headers
-        api_key = extract_api_key(request)
-        
-        # Define public methods that don't require authentication
-        public_methods = ["initialize", "tools/list"]
-        
-        # Check authentication for protected methods
-        if method not in public_methods:
-            # Token validation logic: ensure a token is present
-            # The token will be passed along as the Scanova API key for backend requests
-            if not api_key:
-                log.warning(f"Unauthorized access attempt to method: {method}")
-                return JSONResponse(
-                    content={"error": "unauthorized", "message": "Valid Bearer token required"},
-                    status_code=401,
-                    headers={
-                        "WWW-Authenticate": f'Bearer realm="Scanova MCP", resource_metadata="{MCP_RESOURCE_URL}/.well-known/oauth-protected-resource/mcp'
-                    }
-                )
-        
-        # Handle basic MCP protocol methods
-        if method == "tools/list":
-            # Return available tools
-            tools = [
-                {
-                    "name": "create_qr_code",
-                    "title": "Create QR code",
-                    "description": "Create a new QR code. Can be called with: create qr, make qr code, generate qr",
-                    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "params": {
-                                "type": "object",
-                                "description": "QR code parameters including qr_type, category, info, and name"
-                            }
-                        },
-                        "required": ["params"]
-                    }
-                },
-                {
-                    "name": "list_qr_codes", 
-                    "title": "List QR codes",
-                    "description": "List QR codes. Can be called with: list qr codes, show qr codes",
-                    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "page": {"type": "integer", "default": 1},
-                            "limit": {"type": "integer", "default": 10},
-                            "search": {"type": "string"}
-                        }
-                    }
-                },
-                {
-                    "name": "update_qr_code",
-                    "title": "Update QR code",
-                    "description": "Update an existing QR code",
-                    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object", 
-                        "properties": {
-                            "qrid": {"type": "string"},
-                            "params": {"type": "object"}
-                        },
-                        "required": ["qrid", "params"]
-                    }
-                },
-                {
-                    "name": "retrieve_qr_code",
-                    "title": "Retrieve QR code details",
-                    "description": "Get details of a specific QR code",
-                    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "qrid": {"type": "string"}
-                        },
-                        "required": ["qrid"]
-                    }
-                },
-                {
-                    "name": "download_qr_code", 
-                    "title": "Download QR code image",
-                    "description": "Download QR code image",
-                    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "qrid": {"type": "string"},
-                            "params": {"type": "object"}
-                        },
-                        "required": ["qrid"]
-                    }
-                },
-                {
-                    "name": "activate_qr_code",
-                    "title": "Activate QR code",
-                    "description": "Activate a QR code", 
-                    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object",
-                        "properties": {
-                            "qrid": {"type": "string"}
-                        },
-                        "required": ["qrid"]
-                    }
-                },
-                {
-                    "name": "deactivate_qr_code",
-                    "title": "Deactivate QR code",
-                    "description": "Deactivate a QR code",
-                    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
-                    "inputSchema": {
-                        "type": "object", 
-                        "properties": {
-                            "qrid": {"type": "string"}
-                        },
-                        "required": ["qrid"]
-                    }
-                }
-            ]
-            
-            return JSONResponse({
-                "jsonrpc": "2.0",
-                "id": body.get("id"),
-                "result": {"tools": tools}
-            })
-            
-        elif method == "tools/call":
-            # Handle tool calls
-            params = body.get("params", {})
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-            
-            try:
-                if tool_name == "create_qr_code":
-                    result = create_qr_code(arguments.get("params"), api_key=api_key)
-                elif tool_name == "list_qr_codes":
-                    qr_params = {}
-                    if arguments.get("page"):
-                        qr_params["page"] = arguments.get("page")
-                    if arguments.get("limit"):
-                        qr_params["limit"] = arguments.get("limit")
-                    if arguments.get("search"):
-                        qr_params["search"] = arguments.get("search")
-                    result = list_qr_codes(qr_params if qr_params else None, api_key=api_key)
-                elif tool_name == "update_qr_code":
-                    result = update_qr_code(arguments.get("qrid"), arguments.get("params"), api_key=api_key)
-                elif tool_name == "retrieve_qr_code":
-                    result = retrieve_qr_code(arguments.get("qrid"), api_key=api_key)
-                elif tool_name == "download_qr_code":
-                    result = download_qr_code(arguments.get("qrid"), arguments.get("params"), api_key=api_key)
-                elif tool_name == "activate_qr_code":
-                    result = activate_qr_code(arguments.get("qrid"), api_key=api_key)
-                elif tool_name == "deactivate_qr_code":
-                    result = deactivate_qr_code(arguments.get("qrid"), api_key=api_key)
-                else:
-                    raise ValueError(f"Unknown tool: {tool_name}")
-                
-                return JSONResponse({
-                    "jsonrpc": "2.0",
-                    "id": body.get("id"),
-                    "result": {"content": [{"type": "text", "text": str(result)}]}
-                })
-                
-            except Exception as e:
-                log.error(f"Tool execution error: {str(e)}")
-                return JSONResponse({
+# Methods that don't require authentication
+PUBLIC_METHODS = ["initialize", "tools/list"]
+
+# JSON-RPC methods counted under their own name in mcp_requests_total; any
+# other method is counted as "other"
+COUNTED_METHODS = {"initialize", "notifications/initialized", "tools/list", "tools/call", "ping"}
+
+
+def initialize_result(protocol_version):
+    return {
+        "protocolVersion": protocol_version,
+        "capabilities": {
+            "tools": {}
+        },
+        "serverInfo": SERVER_INFO
+    }
+
+
+def negotiate_version(message):
+    """Return the protocol version an initialize request asks for if supported, else the newest."""
+    requested = message.params.get("protocolVersion")
+    return requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0]
+
+
+INITIALIZE_RESULT = initialize_result(PROTOCOL_VERSIONS[0])
+
+TOOLS_LIST_RESULT = {"tools": TOOLS}
+
+
+def encode_result(result):
+    """
+    Serialize a JSON-RPC result and derive its ETag.
+
+    Returns:
+        tuple: (encoded result bytes, quoted ETag string)
+    """
+    content = dumps(result)
+    return content, '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+# tools/list and initialize results never change while the process runs,
+# so they are serialized once and spliced into each response
+PRECOMPUTED_RESULTS = {
+    "tools/list": encode_result(TOOLS_LIST_RESULT),
+    "initialize": encode_result(INITIALIZE_RESULT),
+}
+
+# initialize results per negotiated protocol version
+INITIALIZE_RESULTS = {version: encode_result(initialize_result(version)) for version in PROTOCOL_VERSIONS}
+
+
+def precomputed_response(request, message, encoded=None, headers=None):
+    """
+    Answer tools/list or initialize from PRECOMPUTED_RESULTS, or with the
+    ``encode_result`` output ``encoded``.
+
+    The ETag identifies the result (not the request id), so a client can tell
+    the catalogue has not changed. Only a GET sending it back in If-None-Match
+    gets 304 Not Modified: a POST is answered in full, as HTTP caches do not
+    reuse POST responses and the JSON-RPC response must carry the request id.
+    """
+    result, etag = encoded or PRECOMPUTED_RESULTS[message.method]
+    headers = {**(headers or {}), "ETag": etag}
+    if request.method == "GET" and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    content = b'{"jsonrpc":"2.0","id":' + dumps(message.id) + b',"result":' + result + b'}'
+    return Response(content, media_type="application/json", headers=headers)
+
+# Streamable HTTP sessions, see sessions.py
+sessions = SessionStore() if MCP_SESSIONS_ENABLED else None
+
+# Validated API keys, see credentials.py
+credentials = CredentialCache() if AUTH_CACHE_ENABLED else None
+
+
+async def authenticate(api_key):
+    """
+    Check an API key against the credential cache and make its TenantSession
+    the current request's.
+
+    Returns:
+        bool: False if the key is known to be invalid.
+    """
+    if credentials is None:
+        return True
+    credential = await credentials.authenticate(get_client(), api_key)
+    if credential is None:
+        return False
+    current_tenant.set(credential.session)
+    return True
+
+
+def forget_revoked(method, path, status, elapsed, reused):
+    # Upstream call hook: a key rejected since it was validated is checked
+    # again on its next request
+    tenant = current_tenant.get()
+    if status == 401 and tenant is not None:
+        credentials.forget(tenant.key_hash)
+
+# Admission control for tools/call, see governor.py; each worker process
+# enforces its share of the server-wide limits
+governor = Governor.for_workers(WORKERS) if RATE_LIMIT_ENABLED else None
+
+# JSON-RPC error code (implementation-defined server error range) for calls
+# rejected by the governor; data carries retry_after in seconds
+RATE_LIMITED = -32000
+
+
+# Rejections are logged at most once per interval (seconds), with a count of
+# the ones not logged, so a client hammering a limit does not flood the log
+RATE_LIMIT_LOG_INTERVAL = 10.0
+_rate_limit_log = {"next": 0.0, "unlogged": 0}
+
+
+def admission(api_key, charge=True):
+    if governor is None:
+        return nullcontext()
+    return governor.admit(tenant_hash(api_key) if api_key else "", charge)
+
+
+def log_rate_limited(tool_name, e):
+    now = time.monotonic()
+    if now < _rate_limit_log["next"]:
+        _rate_limit_log["unlogged"] += 1
+        return
+    unlogged = _rate_limit_log["unlogged"]
+    _rate_limit_log["next"] = now + RATE_LIMIT_LOG_INTERVAL
+    _rate_limit_log["unlogged"] = 0
+    more = f" ({unlogged} more since the last report)" if unlogged else ""
+    log.warning(f"Rate limited tools/call {tool_name}: {str(e)}{more}")
+
+
+def rate_limited_error(e):
+    return {
+        "code": RATE_LIMITED,
+        "message": str(e),
+        "data": {"retry_after": round(e.retry_after, 3), "scope": e.scope, "limit": e.reason},
+    }
+
+# Per-API-key semaphores bounding how many tools/call entries of JSON-RPC batches
+# run at once; entries disappear when no batch for that key is in flight
+_batch_semaphores = weakref.WeakValueDictionary()
+
+
+def batch_semaphore(api_key):
+    key = tenant_hash(api_key) if api_key else ""
+    semaphore = _batch_semaphores.get(key)
+    if semaphore is None:
+        semaphore = _batch_semaphores[key] = asyncio.Semaphore(MCP_BATCH_CONCURRENCY)
+    return semaphore
+
+
+async def call_tool(message, api_key, charge=True):
+    """
+    Handle a tools/call request and record its metrics and trace span.
+
+    Args:
+        message (Message): The JSON-RPC tools/call request.
+        api_key (str): Scanova API key from the MCP client headers.
+        charge (bool): Whether the call takes a rate-limit token; False for
+            entries of a batch that was charged as a whole.
+
+    Returns:
+        dict: The JSON-RPC response.
+    """
+    params = message.params
+    tool_name = params.get("name")
+    arguments = params.get("arguments") or {}
+
+    handler = TOOL_HANDLERS.get(tool_name)
+    # Unknown names share one label so clients cannot grow the metric series
+    tool_label = tool_name if handler is not None else "unknown"
+    outcome = "error"
+    # Upstream time of this call is accumulated here by the Scanova client
+    timer = UpstreamTimer()
+    timer_token = upstream_timer.set(timer)
+    metrics.TOOLS_IN_FLIGHT.inc(tool_label)
+    started = time.perf_counter()
+    with tracing.span("mcp.tools/call") as span:
+        if span.recording:
+            span.set_attribute("mcp.tool.name", tool_label)
+            if isinstance(arguments, dict) and "qrid" in arguments:
+                span.set_attribute("scanova.qrid", str(arguments["qrid"]))
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown tool: {tool_name}")
+
+            errors = handler.validate(arguments)
+            if errors:
+                outcome = "invalid_params"
+                return {
                     "jsonrpc": "2.0",
-                    "id": body.get("id"),
+                    "id": message.id,
                     "error": {
-                        "code": -32603,
-                        "message": f"Tool execution error: {str(e)}"
+                        "code": -32602,
+                        "message": f"Invalid params: {'; '.join(errors)}"
                     }
-                })
-        
-        elif method == "initialize":
-            # MCP initialization
-            return JSONResponse({
+                }
+
+            # Rate and concurrency limits apply before any upstream call
+            with tracing.span("mcp.dispatch"):
+                async with admission(api_key, charge):
+                    result = await handler.call(get_client(), arguments, api_key)
+            outcome = "error" if isinstance(result, dict) and "error" in result else "ok"
+            with tracing.span("mcp.serialize"):
+                content = tool_result(result, arguments.get("fields"))
+            return {
                 "jsonrpc": "2.0",
-                "id": body.get("id"),
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {}
-                    },
-                    "serverInfo": {
-                        "name": "scanova-mcp",
-                        "version": "1.0.0"
-                    }
+                "id": message.id,
+                "result": content
+            }
+
+        except RateLimited as e:
+            outcome = "rate_limited"
+            log_rate_limited(tool_name, e)
+            return {
+                "jsonrpc": "2.0",
+                "id": message.id,
+                "error": rate_limited_error(e)
+            }
+
+        except Exception as e:
+            log.error(f"Tool execution error: {str(e)}")
+            return {
+                "jsonrpc": "2.0",
+                "id": message.id,
+                "error": {
+                    "code": -32603,
+                    "message": f"Tool execution error: {str(e)}"
                 }
-            })
-            
-        else:
-            # Unknown method
-            return JSONResponse({
+            }
+
+        finally:
+            upstream_timer.reset(timer_token)
+            metrics.TOOLS_IN_FLIGHT.dec(tool_label)
+            metrics.record_tool_call(tool_label, outcome, time.perf_counter() - started, timer.seconds)
+            span.set_attribute("mcp.outcome", outcome)
+            if outcome != "ok":
+                span.set_error(outcome)
+
+
+async def handle_message(message, api_key, charge=True):
+    """
+    Handle a single JSON-RPC message.
+
+    Args:
+        message (Message): The JSON-RPC request or notification, or None
+            for an entry that is not a valid request.
+        api_key (str): Scanova API key from the MCP client headers.
+        charge (bool): Whether a tools/call takes a rate-limit token.
+
+    Returns:
+        dict: The JSON-RPC response, or None if the message is a notification
+        (has no "id") and must not be answered.
+    """
+    if message is None:
+        return {"jsonrpc": "2.0", "id": None, "error": INVALID_REQUEST}
+
+    method = message.method
+    metrics.REQUESTS.inc(method if method in COUNTED_METHODS else "other")
+
+    # Handle basic MCP protocol methods
+    if method == "tools/list":
+        # Return available tools
+        response = {
+            "jsonrpc": "2.0",
+            "id": message.id,
+            "result": TOOLS_LIST_RESULT
+        }
+
+    elif method == "tools/call":
+        response = await call_tool(message, api_key, charge)
+
+    elif method == "initialize":
+        # MCP initialization
+        response = {
+            "jsonrpc": "2.0",
+            "id": message.id,
+            "result": initialize_result(negotiate_version(message))
+        }
+
+    else:
+        # Unknown method
+        response = {
+            "jsonrpc": "2.0",
+            "id": message.id,
+            "error": {
+                "code": -32601,
+                "message": f"Method not found: {method}"
+            }
+        }
+
+    # Notifications carry no id and get no response
+    if message.notification:
+        return None
+    return response
+
+
+async def handle_batch(messages, api_key):
+    """
+    Handle a JSON-RPC batch.
+
+    tools/call entries run concurrently, bounded per API key by
+    MCP_BATCH_CONCURRENCY; other entries are answered immediately. The batch
+    takes one rate-limit token, like a single call, rather than one per
+    entry; the entries still count against the concurrency limits. When that
+    token is refused, every tools/call entry is answered with the rejection.
+
+    Returns:
+        list: Responses in request order, without entries for notifications.
+    """
+    semaphore = batch_semaphore(api_key)
+    rejected = None
+    if governor is not None and any(message is not None and message.method == "tools/call" for message in messages):
+        try:
+            await governor.charge(tenant_hash(api_key) if api_key else "")
+        except RateLimited as e:
+            rejected = e
+            log_rate_limited("batch", e)
+
+    async def run(message):
+        try:
+            if message is not None and message.method == "tools/call":
+                if rejected is not None:
+                    return rate_limited_entry(message, rejected)
+                async with semaphore:
+                    return await handle_message(message, api_key, charge=False)
+            return await handle_message(message, api_key)
+        except Exception as e:
+            log.error(f"MCP batch entry error: {str(e)}")
+            return {
                 "jsonrpc": "2.0",
-                "id": body.get("id"),
+                "id": message.id if message is not None else None,
                 "error": {
-                    "code": -32601,
-                    "message": f"Method not found: {method}"
+                    "code": -32603,
+                    "message": f"Internal error: {str(e)}"
                 }
-            })
-            
+            }
+
+    responses = await asyncio.gather(*(run(message) for message in messages))
+    return [response for response in responses if response is not None]
+
+
+def rate_limited_entry(message, e):
+    """Answer a tools/call entry of a batch whose rate-limit token was refused."""
+    metrics.REQUESTS.inc("tools/call")
+    tool_name = message.params.get("name")
+    metrics.record_tool_call(tool_name if tool_name in TOOL_HANDLERS else "unknown", "rate_limited", 0.0, 0.0)
+    if message.notification:
+        return None
+    return {
+        "jsonrpc": "2.0",
+        "id": message.id,
+        "error": rate_limited_error(e)
+    }
+
+
+def wants_event_stream(request, message):
+    """Whether to answer with an SSE stream: a single tools/call asking for progress."""
+    return (
+        message.method == "tools/call" and not message.notification
+        and progress_token(message.params) is not None
+        and "text/event-stream" in request.headers.get("accept", "")
+    )
+
+
+def sse_event(message):
+    return b"event: message\ndata: " + dumps(message) + b"\n\n"
+
+
+# Streamed tool calls still running; a call whose client went away runs to
+# completion, since it may already have changed QR codes
+_streamed_calls = set()
+
+
+def stream_tool_call(message, api_key):
+    """
+    Run a tools/call and answer with a text/event-stream: a
+    ``notifications/progress`` event whenever the call reports progress, then
+    the JSON-RPC response, after which the stream ends.
+    """
+    queue = asyncio.Queue()
+    reporter = ProgressReporter(progress_token(message.params), lambda notification: queue.put_nowait((False, notification)))
+
+    async def run():
+        token = progress_reporter.set(reporter)
+        response = {"jsonrpc": "2.0", "id": message.id, "error": {"code": -32603, "message": "Internal error"}}
+        try:
+            response = await handle_message(message, api_key)
+        finally:
+            progress_reporter.reset(token)
+            queue.put_nowait((True, response))
+
+    task = asyncio.ensure_future(run())
+    _streamed_calls.add(task)
+    task.add_done_callback(_streamed_calls.discard)
+
+    async def events():
+        while True:
+            try:
+                final, message = await asyncio.wait_for(queue.get(), MCP_SSE_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                # SSE comment, ignored by clients
+                yield b": ping\n\n"
+                continue
+            yield sse_event(message)
+            if final:
+                return
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# MCP JSON-RPC endpoint. Registered as a plain Starlette route: it takes
+# the request as is, so FastAPI's parameter and response handling is skipped
+async def mcp_endpoint(request: Request):
+    metrics.HTTP_IN_FLIGHT.inc()
+    try:
+        with tracing.start_trace("POST /mcp", request.headers.get("traceparent")) as span:
+            response = await handle_mcp_request(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            if isinstance(response, StreamingResponse):
+                # The trace ends with the stream, so the spans of the tool call are kept
+                span.defer()
+                response.body_iterator = finish_span_after(response.body_iterator, span)
+            return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+
+
+async def finish_span_after(body, span):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        span.finish()
+
+app.add_route("/mcp", mcp_endpoint, methods=["POST"])
+
+
+async def read_body(request, limit=MCP_MAX_BODY_BYTES):
+    """
+    Read a request body of at most ``limit`` bytes.
+
+    Returns:
+        bytes: The body, or None if it is larger than ``limit``.
+    """
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        return None
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def handle_mcp_request(request):
+    message = None
+    try:
+        # Get the JSON-RPC request body first to check the method(s)
+        with tracing.span("mcp.parse") as span:
+            data = await read_body(request)
+            if data is None:
+                return encoded_response(jsonrpc.BODY_TOO_LARGE_RESPONSE, 413)
+            span.set_attribute("http.request.body.size", len(data))
+            try:
+                messages, batch = jsonrpc.decode(data)
+            except ValueError:
+                return encoded_response(jsonrpc.PARSE_ERROR_RESPONSE, 400)
+        if not batch:
+            message = messages[0]
+
+        # Extract API key from headers; within a session it may be left out
+        with tracing.span("mcp.auth"):
+            api_key = extract_api_key(request)
+            session_id = request.headers.get("mcp-session-id")
+            if sessions is not None and session_id:
+                session = sessions.get(session_id)
+                if session is None or not session.accepts(api_key):
+                    return encoded_response(jsonrpc.SESSION_NOT_FOUND_RESPONSE, 404)
+                api_key = api_key or session.api_key
+            else:
+                session = None
+
+        # Check authentication once for every protected method in the request
+        # The token will be passed along as the Scanova API key for backend requests
+        authenticated = False
+        for entry in messages:
+            method = entry.method if entry is not None else None
+            if method not in PUBLIC_METHODS:
+                if not api_key:
+                    log.warning(f"Unauthorized access attempt to method: {method}")
+                    return unauthorized_response()
+                with tracing.span("mcp.auth.validate"):
+                    if not await authenticate(api_key):
+                        return unauthorized_response()
+                authenticated = True
+                break
+        if authenticated and session is not None and session.key_hash is None:
+            # An anonymous session joins the authenticated ones with its first validated key
+            sessions.bind(session, api_key)
+
+        if batch:
+            if not messages or len(messages) > MCP_MAX_BATCH_SIZE:
+                return encoded_response(jsonrpc.INVALID_REQUEST_RESPONSE)
+            responses = await handle_batch(messages, api_key)
+        elif message is None:
+            return encoded_response(jsonrpc.INVALID_REQUEST_RESPONSE)
+        elif message.method == "initialize" and not message.notification:
+            metrics.REQUESTS.inc("initialize")
+            version = negotiate_version(message)
+            headers = None
+            if sessions is not None:
+                client_info = message.params.get("clientInfo")
+                client_name = client_info.get("name") if isinstance(client_info, dict) else None
+                # Only a key that passes validation earns a place among the authenticated sessions
+                if api_key and not authenticated:
+                    with tracing.span("mcp.auth.validate"):
+                        authenticated = await authenticate(api_key)
+                session = sessions.create(api_key if authenticated else None, version, str(client_name)[:100] if client_name else None)
+                headers = {"Mcp-Session-Id": session.id}
+            return precomputed_response(request, message, INITIALIZE_RESULTS[version], headers)
+        elif message.method in PRECOMPUTED_RESULTS and not message.notification:
+            metrics.REQUESTS.inc(message.method)
+            return precomputed_response(request, message)
+        elif wants_event_stream(request, message):
+            return stream_tool_call(message, api_key)
+        else:
+            responses = await handle_message(message, api_key)
+
+        # Only notifications were sent: acknowledge without a body
+        if not responses:
+            return Response(status_code=202)
+        error = responses.get("error") if isinstance(responses, dict) else None
+        headers = None
+        if error and error.get("code") == RATE_LIMITED:
+            headers = {"Retry-After": str(math.ceil(error["data"]["retry_after"]))}
+        with tracing.span("mcp.encode") as span:
+            response = FastJSONResponse(responses, headers=headers)
+            span.set_attribute("http.response.body.size", len(response.body))
+        return response
+
     except Exception as e:
         log.error(f"MCP endpoint error: {str(e)}")
-        return JSONResponse({
-            "jsonrpc": "2.0", 
-            "id": body.get("id") if 'body' in locals() else None,
+        return FastJSONResponse({
+            "jsonrpc": "2.0",
+            "id": message.id if message is not None else None,
             "error": {
                 "code": -32603,
                 "message": f"Internal error: {str(e)}"
             }
         }, status_code=500)
 
+# Ends a streamable HTTP session at the client's request
+@app.delete("/mcp")
+async def mcp_delete_session(request: Request):
+    if sessions is None:
+        return Response(status_code=405)
+    session_id = request.headers.get("mcp-session-id")
+    if not session_id or not sessions.close(session_id):
+        return Response(status_code=404)
+    return Response(status_code=204)
+
+# Streaming QR code download, for exports too large to return inline from download_qr_code
+@app.get("/download/{qrid}")
+async def download_endpoint(qrid: str, request: Request):
+    api_key = extract_api_key(request)
+    if not api_key or not await authenticate(api_key):
+        return unauthorized_response()
+
+    client = get_client()
+    params = dict(request.query_params)
+    try:
+        stem = await client.image_stem(qrid, params, api_key=api_key)
+        path = client.images.get(stem) if stem else None
+        if path is not None:
+            # Served from the on-disk cache without going through Python buffers
+            return FileResponse(path, media_type=content_type_for(path))
+        upstream = await client.stream_qr_code(qrid, params, api_key=api_key)
+    except Exception as e:
+        log.error(f"Download error: {str(e)}")
+        return JSONResponse({"error": f"API request failed: {str(e)}"}, status_code=502)
+
+    if upstream.status_code != 200:
+        try:
+            await upstream.aread()
+        finally:
+            await upstream.aclose()
+        return Response(upstream.content, status_code=upstream.status_code, media_type=upstream.headers.get("content-type"))
+
+    length = int(upstream.headers.get("content-length", 0))
+    if length > DOWNLOAD_MAX_BYTES:
+        await upstream.aclose()
+        return JSONResponse({"error": f"QR code export exceeds {DOWNLOAD_MAX_BYTES} bytes"}, status_code=413)
+
+    content_type = upstream.headers.get("content-type")
+
+    async def body():
+        sent = 0
+        # The image is written to the cache as it streams and kept only if complete
+        writer = None
+        if stem:
+            try:
+                writer = client.images.writer(stem, content_type)
+            except OSError as e:
+                log.warning(f"Image cache unavailable: {str(e)}")
+        try:
+            async for chunk in upstream.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                sent += len(chunk)
+                if sent > DOWNLOAD_MAX_BYTES:
+                    # Headers are already sent, so the cap can only cut the transfer short
+                    log.warning(f"Download of {qrid} stopped after {DOWNLOAD_MAX_BYTES} bytes")
+                    break
+                if writer is not None:
+                    try:
+                        writer.write(chunk)
+                    except OSError:
+                        writer.abort()
+                        writer = None
+                yield chunk
+            else:
+                if writer is not None:
+                    writer.commit()
+                    writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+            await upstream.aclose()
+
+    headers = {"Content-Length": str(length)} if length else {}
+    if "content-disposition" in upstream.headers:
+        headers["Content-Disposition"] = upstream.headers["content-disposition"]
+    return StreamingResponse(body(), media_type=content_type, headers=headers)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -369,7 +872,9 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "mcp": "/mcp",
-            "health": "/health"
+            "download": "/download/{qrid}",
+            "health": "/health",
+            "metrics": "/metrics"
         },
         "authentication": {
             "required": "Scanova API Key",
@@ -385,7 +890,9 @@ async def rootPost(request: Request):
         "version": "1.0.0",
         "endpoints": {
             "mcp": "/mcp",
-            "health": "/health"
+            "download": "/download/{qrid}",
+            "health": "/health",
+            "metrics": "/metrics"
         },
         "authentication": {
             "required": "Scanova API Key",
@@ -403,6 +910,16 @@ if __name__ == "__main__":
     log.info(f"📡 MCP Endpoint: http://{host}:{port}/mcp")
     log.info(f"❤️  Health Check: http://{host}:{port}/health")
     log.info(f"🔑 Authentication: Configure your Scanova API key in MCP client headers")
-    log.error(f"test error log")
-    
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    log.info(f"⚙️  Workers: {WORKERS}")
+
+    # Several workers need the app as an import string so each process
+    # imports it; the supervisor restarts them one by one on SIGHUP
+    uvicorn.run(
+        "cloud_server:app" if WORKERS > 1 else app,
+        host=host,
+        port=port,
+        workers=WORKERS,
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEP_ALIVE,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+    )
\ No newline at end of file
@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 
 # Base URL for Scanova API
-SCANOVA_BASE_URL = "https://management.scanova.io/"
+SCANOVA_BASE_URL = os.getenv("SCANOVA_BASE_URL", "https://management.scanova.io/")
 
 # Optional: Access token for MCP server authentication (if needed)
 MCP_ACCESS_TOKEN = os.getenv("MCP_ACCESS_TOKEN")
@@ -13,4 +13,172 @@ OAUTH_SERVER_URL = os.getenv("OAUTH_SERVER_URL", "https://qcg-api.scanova.io")
 # Resource URL for lazy authentication 401 header
 MCP_RESOURCE_URL = os.getenv("MCP_RESOURCE_URL", "https://mcp.scanova.io")
 
-OPENAI_APPS_CHALLENGE = os.getenv("OPENAI_APPS_CHALLENGE")
\ No newline at end of file
+OPENAI_APPS_CHALLENGE = os.getenv("OPENAI_APPS_CHALLENGE")
+
+# Scanova API key used by the stdio server, whose MCP client sends no headers
+SCANOVA_API_KEY = os.getenv("SCANOVA_API_KEY")
+
+# Upstream connection pool shared by all Scanova API calls
+SCANOVA_MAX_CONNECTIONS = int(os.getenv("SCANOVA_MAX_CONNECTIONS", "100"))
+SCANOVA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SCANOVA_MAX_KEEPALIVE_CONNECTIONS", "20"))
+SCANOVA_KEEPALIVE_EXPIRY = float(os.getenv("SCANOVA_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 is only used when the optional 'h2' package is installed
+SCANOVA_HTTP2 = os.getenv("SCANOVA_HTTP2", "true").lower() in ("1", "true", "yes")
+# Maximum number of per-API-key sessions (prepared headers) kept in memory
+SCANOVA_MAX_TENANT_SESSIONS = int(os.getenv("SCANOVA_MAX_TENANT_SESSIONS", "1024"))
+
+# Largest /mcp request body in bytes; larger requests get 413
+MCP_MAX_BODY_BYTES = int(os.getenv("MCP_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+# JSON-RPC batches on /mcp: maximum entries per batch and concurrent tools/call entries per API key
+MCP_MAX_BATCH_SIZE = int(os.getenv("MCP_MAX_BATCH_SIZE", "100"))
+MCP_BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "8"))
+
+# Bulk QR tools: maximum items per call, concurrent upstream requests per call,
+# and retries per item after the Scanova API answers 429 Too Many Requests
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "5"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "3"))
+
+# Directory for local state (caches, indexes); created on first use
+DATA_DIR = Path(os.getenv("SCANOVA_DATA_DIR", Path.home() / ".cache" / "scanova-mcp"))
+
+# HTTP serving (cloud_server.py): uvicorn worker processes, listen backlog,
+# keep-alive and graceful shutdown timeouts in seconds. With more than one
+# worker each writes its metrics to METRICS_DIR every METRICS_SNAPSHOT_INTERVAL
+# seconds, and /metrics merges the files of all workers.
+WORKERS = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", "5"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+METRICS_DIR = Path(os.getenv("METRICS_DIR", DATA_DIR / "metrics"))
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+# Streamable HTTP sessions on /mcp: initialize returns an Mcp-Session-Id, at
+# most MCP_MAX_SESSIONS sessions with a validated API key and
+# MCP_MAX_ANONYMOUS_SESSIONS without one are kept, and a session is dropped
+# after MCP_SESSION_IDLE_TIMEOUT seconds without requests. Sessions live in
+# one worker process, so they are off by default with several workers.
+MCP_SESSIONS_ENABLED = os.getenv("MCP_SESSIONS_ENABLED", "true" if WORKERS == 1 else "false").lower() in ("1", "true", "yes")
+MCP_MAX_SESSIONS = int(os.getenv("MCP_MAX_SESSIONS", "10000"))
+MCP_MAX_ANONYMOUS_SESSIONS = int(os.getenv("MCP_MAX_ANONYMOUS_SESSIONS", "1000"))
+MCP_SESSION_IDLE_TIMEOUT = float(os.getenv("MCP_SESSION_IDLE_TIMEOUT", "1800"))
+# Progress notifications of long tools/call requests, streamed over SSE: at
+# most one per MCP_PROGRESS_INTERVAL seconds, and an SSE comment every
+# MCP_SSE_PING_INTERVAL seconds so idle connections are not closed by proxies
+MCP_PROGRESS_INTERVAL = float(os.getenv("MCP_PROGRESS_INTERVAL", "0.1"))
+MCP_SSE_PING_INTERVAL = float(os.getenv("MCP_SSE_PING_INTERVAL", "15"))
+
+# API keys sent to the HTTP server are checked once against the Scanova API
+# (or AUTH_VALIDATION_URL, e.g. a userinfo endpoint of the OAuth server) and
+# the outcome is cached per hashed key: AUTH_CACHE_TTL seconds for a valid
+# key, AUTH_NEGATIVE_TTL seconds for a rejected one, at most
+# AUTH_CACHE_MAX_ENTRIES keys. Keys that cannot be valid (shorter than
+# AUTH_KEY_MIN_LENGTH, longer than AUTH_KEY_MAX_LENGTH, or not printable
+# ASCII) are rejected without an upstream request.
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+AUTH_VALIDATION_URL = os.getenv("AUTH_VALIDATION_URL") or None
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_NEGATIVE_TTL = float(os.getenv("AUTH_NEGATIVE_TTL", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_KEY_MIN_LENGTH = int(os.getenv("AUTH_KEY_MIN_LENGTH", "8"))
+AUTH_KEY_MAX_LENGTH = int(os.getenv("AUTH_KEY_MAX_LENGTH", "512"))
+
+# Read-through cache for retrieve_qr_code / list_qr_codes: "memory", "sqlite" or "none".
+# Several workers share the SQLite file, so writes invalidate it for all of them
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "sqlite" if WORKERS > 1 else "memory").lower()
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_PATH = Path(os.getenv("RESPONSE_CACHE_PATH", DATA_DIR / "response_cache.sqlite3"))
+
+# Per-tool limits for tools/call: timeout in seconds, and how many bulk tool
+# calls may run at once in this process
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+BULK_TOOL_TIMEOUT = float(os.getenv("BULK_TOOL_TIMEOUT", "600"))
+BULK_TOOL_MAX_CONCURRENCY = int(os.getenv("BULK_TOOL_MAX_CONCURRENCY", "4"))
+
+# download_qr_code: images up to DOWNLOAD_INLINE_MAX_BYTES are returned inline (base64);
+# larger ones are streamed from GET /download/{qrid}, capped at DOWNLOAD_MAX_BYTES
+DOWNLOAD_INLINE_MAX_BYTES = int(os.getenv("DOWNLOAD_INLINE_MAX_BYTES", str(256 * 1024)))
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# On-disk cache of downloaded QR images, bounded by total size (LRU)
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", DATA_DIR / "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Local previews of preview_qr_code: QR matrices and rendered images kept in
+# memory (LRU, entries each), and the largest module size in pixels
+QR_PREVIEW_CACHE_SIZE = int(os.getenv("QR_PREVIEW_CACHE_SIZE", "256"))
+QR_PREVIEW_MAX_SCALE = int(os.getenv("QR_PREVIEW_MAX_SCALE", "20"))
+
+# list_all_qr_codes / summarize_qr_codes: page size and pages fetched concurrently
+# while paging through an account, a bound on pages per call, and the most
+# QR codes list_all_qr_codes returns
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+LIST_PREFETCH_PAGES = int(os.getenv("LIST_PREFETCH_PAGES", "4"))
+LIST_MAX_PAGES = int(os.getenv("LIST_MAX_PAGES", "1000"))
+LIST_ALL_MAX_ITEMS = int(os.getenv("LIST_ALL_MAX_ITEMS", "1000"))
+
+# Optional local full-text index of each tenant's QR codes for search_qr_codes,
+# refreshed in the background once older than SEARCH_INDEX_SYNC_INTERVAL seconds
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+SEARCH_INDEX_DIR = Path(os.getenv("SEARCH_INDEX_DIR", DATA_DIR / "search"))
+SEARCH_INDEX_SYNC_INTERVAL = float(os.getenv("SEARCH_INDEX_SYNC_INTERVAL", "300"))
+SEARCH_INDEX_MAX_OPEN = int(os.getenv("SEARCH_INDEX_MAX_OPEN", "64"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "100"))
+
+# Background jobs (start_job), kept in the SQLite file JOBS_PATH. Each process
+# runs up to JOB_WORKERS jobs, at most JOB_MAX_RUNNING_PER_TENANT per API key,
+# each with JOB_CONCURRENCY upstream requests in flight, and checkpoints
+# results every JOB_CHECKPOINT_ITEMS items. On shutdown, items in flight get
+# JOB_STOP_TIMEOUT seconds to finish and be recorded. A running job whose
+# process stops renewing its lease for JOB_LEASE_SECONDS is resumed from its
+# checkpoint; finished jobs are deleted after JOB_RETENTION_DAYS.
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOBS_PATH = Path(os.getenv("JOBS_PATH", DATA_DIR / "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_RUNNING_PER_TENANT = int(os.getenv("JOB_MAX_RUNNING_PER_TENANT", "1"))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_CHECKPOINT_ITEMS = int(os.getenv("JOB_CHECKPOINT_ITEMS", "25"))
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "10000"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_STOP_TIMEOUT = float(os.getenv("JOB_STOP_TIMEOUT", "10"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Upstream resilience: timeouts in seconds, retries of idempotent requests
+# with jittered exponential backoff (a longer Retry-After is not waited for),
+# and the per-host circuit breaker
+SCANOVA_CONNECT_TIMEOUT = float(os.getenv("SCANOVA_CONNECT_TIMEOUT", "5"))
+SCANOVA_READ_TIMEOUT = float(os.getenv("SCANOVA_READ_TIMEOUT", "30"))
+SCANOVA_WRITE_TIMEOUT = float(os.getenv("SCANOVA_WRITE_TIMEOUT", "30"))
+SCANOVA_POOL_TIMEOUT = float(os.getenv("SCANOVA_POOL_TIMEOUT", "10"))
+SCANOVA_MAX_RETRIES = int(os.getenv("SCANOVA_MAX_RETRIES", "2"))
+SCANOVA_RETRY_BASE_DELAY = float(os.getenv("SCANOVA_RETRY_BASE_DELAY", "0.2"))
+SCANOVA_RETRY_MAX_DELAY = float(os.getenv("SCANOVA_RETRY_MAX_DELAY", "5"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Admission control for tools/call on /mcp: token buckets (calls per second
+# and burst size) and concurrent calls, per API key and for the whole server.
+# With RATE_LIMIT_FAIR_QUEUE calls over a limit wait (round-robin across keys,
+# at most RATE_LIMIT_MAX_QUEUE_DELAY seconds) instead of being rejected.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_PER_KEY = float(os.getenv("RATE_LIMIT_PER_KEY", "10"))
+RATE_LIMIT_BURST_PER_KEY = int(os.getenv("RATE_LIMIT_BURST_PER_KEY", "20"))
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "200"))
+RATE_LIMIT_BURST_GLOBAL = int(os.getenv("RATE_LIMIT_BURST_GLOBAL", "400"))
+MAX_CONCURRENT_PER_KEY = int(os.getenv("MAX_CONCURRENT_PER_KEY", "8"))
+MAX_CONCURRENT_GLOBAL = int(os.getenv("MAX_CONCURRENT_GLOBAL", "64"))
+RATE_LIMIT_FAIR_QUEUE = os.getenv("RATE_LIMIT_FAIR_QUEUE", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_MAX_QUEUE_DELAY = float(os.getenv("RATE_LIMIT_MAX_QUEUE_DELAY", "5"))
+
+# Tracing of the /mcp request path. TRACING_EXPORTER is "none" (off),
+# "memory", "file" (JSON lines in TRACING_FILE) or "module:attribute" naming
+# a custom exporter. A share TRACING_SAMPLE_RATE of requests is traced, plus
+# every request slower than TRACING_SLOW_SECONDS when that is set.
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = Path(os.getenv("TRACING_FILE", DATA_DIR / "traces.jsonl"))
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.01"))
+TRACING_SLOW_SECONDS = float(os.getenv("TRACING_SLOW_SECONDS", "0"))
@@ -0,0 +1,143 @@
+"""
+Validated-credential cache of the HTTP server.
+
+Without it a wrong API key is only noticed when a tool call's upstream request
+comes back 401. Here each key is checked once with a small authenticated
+request and the outcome is kept per hashed key, so a rejected key gets 401
+from the server itself until AUTH_NEGATIVE_TTL runs out, and a valid key is
+not checked again for AUTH_CACHE_TTL seconds. Keys that cannot be valid are
+rejected without any request.
+
+An accepted key's Credential carries its TenantSession (hash and prepared
+headers), which the server sets as ``current_tenant`` for the request so the
+governor, batch limits and upstream calls do not hash the key again.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from config import (
+    AUTH_CACHE_MAX_ENTRIES,
+    AUTH_CACHE_TTL,
+    AUTH_KEY_MAX_LENGTH,
+    AUTH_KEY_MIN_LENGTH,
+    AUTH_NEGATIVE_TTL,
+    AUTH_VALIDATION_URL,
+)
+from scanova_client import hash_api_key
+from singleflight import SingleFlight
+
+log = logging.getLogger('mcp')
+
+
+class Credential:
+    """
+    Outcome of validating one API key.
+
+    ``valid`` is True or False, or None when the check could not be made
+    (such credentials are let through and not cached).
+    """
+
+    __slots__ = ("session", "valid", "expires")
+
+    def __init__(self, session, valid, expires):
+        self.session = session
+        self.valid = valid
+        self.expires = expires
+
+
+def well_formed(api_key, min_length=AUTH_KEY_MIN_LENGTH, max_length=AUTH_KEY_MAX_LENGTH):
+    """Whether ``api_key`` could be a key at all: printable ASCII of a plausible length."""
+    return min_length <= len(api_key) <= max_length and api_key.isascii() and api_key.isprintable()
+
+
+class CredentialCache:
+    """
+    Validation outcomes per hashed API key, in LRU order.
+
+    Concurrent first requests with the same key share one validation request.
+    """
+
+    def __init__(
+        self,
+        validation_url=AUTH_VALIDATION_URL,
+        ttl=AUTH_CACHE_TTL,
+        negative_ttl=AUTH_NEGATIVE_TTL,
+        max_entries=AUTH_CACHE_MAX_ENTRIES,
+    ):
+        self.validation_url = validation_url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.validations = 0
+        self.malformed = 0
+        self.rejected = 0
+        self.unverified = 0
+
+    async def authenticate(self, client, api_key):
+        """
+        Validate an API key, from the cache when possible.
+
+        Args:
+            client (ScanovaClient): Client used for the validation request.
+            api_key (str): Scanova API key from the MCP client headers.
+
+        Returns:
+            Credential: The key's credential, or None if the key is invalid.
+        """
+        if not well_formed(api_key):
+            self.malformed += 1
+            return None
+        key_hash = hash_api_key(api_key)
+        credential = self._entries.get(key_hash)
+        if credential is not None and credential.expires > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key_hash)
+        else:
+            credential = await self._validate(client, api_key, key_hash)
+        if credential.valid is False:
+            self.rejected += 1
+            return None
+        return credential
+
+    async def _validate(self, client, api_key, key_hash):
+        async def validate():
+            self.validations += 1
+            valid = await client.validate_api_key(api_key, self.validation_url)
+            if valid is False:
+                log.warning(f"Rejected API key {key_hash[:8]}")
+            return valid
+
+        valid = await self._flights.do(key_hash, validate)
+        session = client.session(api_key)
+        if valid is None:
+            # The check failed (upstream unavailable): let the call through and ask again next time
+            self.unverified += 1
+            return Credential(session, None, 0.0)
+        credential = Credential(session, valid, time.monotonic() + (self.ttl if valid else self.negative_ttl))
+        self._entries[key_hash] = credential
+        self._entries.move_to_end(key_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return credential
+
+    def forget(self, key_hash):
+        """Drop the cached outcome for a hashed key, e.g. after the Scanova API rejected it."""
+        self._entries.pop(key_hash, None)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cached keys and how requests were decided.
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "validations": self.validations,
+            "malformed": self.malformed,
+            "rejected": self.rejected,
+            "unverified": self.unverified,
+        }
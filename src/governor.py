@@ -0,0 +1,288 @@
+import asyncio
+import math
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from config import (
+    MAX_CONCURRENT_GLOBAL,
+    MAX_CONCURRENT_PER_KEY,
+    RATE_LIMIT_BURST_GLOBAL,
+    RATE_LIMIT_BURST_PER_KEY,
+    RATE_LIMIT_FAIR_QUEUE,
+    RATE_LIMIT_GLOBAL,
+    RATE_LIMIT_MAX_QUEUE_DELAY,
+    RATE_LIMIT_PER_KEY,
+    SCANOVA_MAX_TENANT_SESSIONS,
+)
+
+# Retry hint when a call is rejected because too many are already running
+CONCURRENCY_RETRY_AFTER = 1.0
+
+
+class RateLimited(Exception):
+    """
+    Raised when a call is not admitted.
+
+    Attributes:
+        scope (str): "key" for the caller's own limit, "global" for the server-wide one.
+        reason (str): "rate" or "concurrency".
+        retry_after (float): Seconds after which a retry is likely to be admitted.
+    """
+
+    def __init__(self, scope, reason, retry_after):
+        # Rounded up, so a hint just under a tenth of a second does not read "0.0"
+        super().__init__(f"Too many requests ({scope} {reason} limit), retry after {math.ceil(retry_after * 10) / 10:.1f} seconds")
+        self.scope = scope
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, holding at most ``burst``.
+
+    ``tokens`` may go negative when calls reserve future tokens (fair queue
+    mode); the deficit is the time those callers wait.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def full(self):
+        return self.tokens >= self.burst
+
+
+class FairSemaphore:
+    """
+    Concurrency limit whose waiters are admitted round-robin across tenants.
+
+    A tenant with many queued calls therefore cannot starve one with a single
+    queued call, as it could with a FIFO semaphore.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiters = OrderedDict()
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def try_acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self, tenant):
+        if self.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we gave up: hand the slot on
+                self.release()
+            else:
+                queue = self._waiters.get(tenant)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiters[tenant]
+            raise
+
+    def release(self):
+        while self._waiters:
+            tenant, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(tenant)
+            else:
+                del self._waiters[tenant]
+            if not future.done():
+                # The slot passes straight to the waiter; active is unchanged
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class Governor:
+    """
+    Admission control for tools/call: a token bucket and a concurrency limit
+    per API key (by hash), plus a global bucket and limit for the whole server.
+
+    By default a call over any limit is rejected with RateLimited. With
+    ``fair_queue`` it waits instead, up to ``max_queue_delay`` seconds: rate
+    limits by reserving a future token, the global concurrency limit in a
+    queue that admits tenants round-robin.
+    """
+
+    def __init__(
+        self,
+        rate_per_key=RATE_LIMIT_PER_KEY,
+        burst_per_key=RATE_LIMIT_BURST_PER_KEY,
+        rate_global=RATE_LIMIT_GLOBAL,
+        burst_global=RATE_LIMIT_BURST_GLOBAL,
+        concurrent_per_key=MAX_CONCURRENT_PER_KEY,
+        concurrent_global=MAX_CONCURRENT_GLOBAL,
+        fair_queue=RATE_LIMIT_FAIR_QUEUE,
+        max_queue_delay=RATE_LIMIT_MAX_QUEUE_DELAY,
+        max_tenants=SCANOVA_MAX_TENANT_SESSIONS,
+    ):
+        self.rate_per_key = rate_per_key
+        self.burst_per_key = burst_per_key
+        self.concurrent_per_key = concurrent_per_key
+        self.fair_queue = fair_queue
+        self.max_queue_delay = max_queue_delay
+        self.max_tenants = max_tenants
+        self.global_bucket = TokenBucket(rate_global, burst_global)
+        self.global_slots = FairSemaphore(concurrent_global)
+        self._buckets = OrderedDict()
+        # Entries disappear when no call of that key is in flight
+        self._key_slots = weakref.WeakValueDictionary()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {"key": 0, "global": 0}
+
+    @classmethod
+    def for_workers(cls, workers):
+        """
+        Build the Governor of one of ``workers`` server processes.
+
+        Each process admits calls on its own. The server-wide limits are split
+        evenly, since the kernel spreads connections over the processes. The
+        per-key limits are not: a client's keep-alive connection stays on one
+        process, and a split would cut a single-connection client to a fraction
+        of its quota. A key spreading calls over several connections may
+        therefore get up to ``workers`` times its per-key limits.
+        """
+        workers = max(workers, 1)
+        return cls(
+            rate_global=RATE_LIMIT_GLOBAL / workers,
+            burst_global=max(RATE_LIMIT_BURST_GLOBAL // workers, 1),
+            concurrent_global=max(MAX_CONCURRENT_GLOBAL // workers, 1),
+        )
+
+    def _bucket(self, tenant):
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(self.rate_per_key, self.burst_per_key)
+            if len(self._buckets) > self.max_tenants:
+                # Prefer dropping a full bucket, which is the same as a new one
+                for old, candidate in self._buckets.items():
+                    if candidate.full and old != tenant:
+                        del self._buckets[old]
+                        break
+                else:
+                    self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(tenant)
+        return bucket
+
+    def _reject(self, scope, reason, retry_after):
+        self.rejected[scope] += 1
+        raise RateLimited(scope, reason, retry_after)
+
+    async def charge(self, tenant):
+        """
+        Take one rate-limit token of ``tenant`` (and of the global bucket),
+        waiting for it in fair queue mode.
+
+        Raises:
+            RateLimited: If no token is available and the call cannot wait for it.
+        """
+        now = time.monotonic()
+        bucket = self._bucket(tenant)
+        key_delay = bucket.delay(now)
+        global_delay = self.global_bucket.delay(now)
+        delay = max(key_delay, global_delay)
+        scope = "key" if key_delay >= global_delay else "global"
+        if delay and (not self.fair_queue or delay > self.max_queue_delay):
+            self._reject(scope, "rate", delay)
+        bucket.take()
+        self.global_bucket.take()
+        if delay:
+            self.queued += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def admit(self, tenant, charge=True):
+        """
+        Hold one admission for a tools/call of ``tenant`` (a hashed API key).
+
+        Args:
+            tenant (str): Hashed API key of the caller.
+            charge (bool): Whether to take a rate-limit token; False when the
+                call's JSON-RPC batch already paid for it with ``charge()``.
+
+        Raises:
+            RateLimited: If a limit is exceeded and the call cannot wait for it.
+        """
+        if charge:
+            await self.charge(tenant)
+
+        key_slots = self._key_slots.get(tenant)
+        if key_slots is None:
+            key_slots = self._key_slots[tenant] = asyncio.Semaphore(self.concurrent_per_key)
+        # The caller's own slot is taken first so a waiting tenant never holds a global slot
+        if not key_slots.locked():
+            await key_slots.acquire()
+        elif not self.fair_queue:
+            self._reject("key", "concurrency", CONCURRENCY_RETRY_AFTER)
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(key_slots.acquire(), self.max_queue_delay)
+            except asyncio.TimeoutError:
+                self._reject("key", "concurrency", CONCURRENCY_RETRY_AFTER)
+        try:
+            if not self.global_slots.try_acquire():
+                if not self.fair_queue:
+                    self._reject("global", "concurrency", CONCURRENCY_RETRY_AFTER)
+                self.queued += 1
+                try:
+                    await asyncio.wait_for(self.global_slots.acquire(tenant), self.max_queue_delay)
+                except asyncio.TimeoutError:
+                    self._reject("global", "concurrency", CONCURRENCY_RETRY_AFTER)
+            try:
+                self.admitted += 1
+                yield
+            finally:
+                self.global_slots.release()
+        finally:
+            key_slots.release()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Admission counters and current global usage.
+        """
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "in_flight": self.global_slots.active,
+            "waiting": self.global_slots.waiting,
+            "tenants": len(self._buckets),
+        }
@@ -0,0 +1,243 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlencode
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_ENABLED, IMAGE_CACHE_MAX_BYTES
+
+# Content types whose extension mimetypes does not round-trip
+_EXTENSIONS = {"image/svg+xml": ".svg", "application/postscript": ".eps", "image/x-eps": ".eps"}
+
+# Extensions tried when looking for an image another process cached
+_PROBE_EXTENSIONS = (".png", ".svg", ".jpg", ".pdf", ".eps", ".bin")
+
+# Temporary files older than this (seconds) are left over from interrupted
+# downloads; younger ones may still be written by another worker process
+_STALE_TMP_SECONDS = 3600
+
+
+def _digest(text, length):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:length]
+
+
+def _extension(content_type):
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    return _EXTENSIONS.get(mime_type) or mimetypes.guess_extension(mime_type) or ".bin"
+
+
+def content_type_for(path):
+    """Return the content type of a cached image from its file extension."""
+    if path.suffix == ".eps":
+        return "application/postscript"
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+class ImageWriter:
+    """
+    Collects one downloaded image into a temporary file in the cache directory.
+
+    ``commit`` moves it into place with an atomic rename, so readers never see
+    a partial file; ``abort`` discards it.
+    """
+
+    def __init__(self, cache, stem, extension):
+        self.cache = cache
+        self.stem = stem
+        self.name = stem + extension
+        self.size = 0
+        fd, self._tmp = tempfile.mkstemp(dir=cache.directory, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp, self.cache.directory / self.name)
+        self.cache._add(self.stem, self.name, self.size)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp)
+        except FileNotFoundError:
+            pass
+
+
+class ImageCache:
+    """
+    On-disk cache of downloaded QR code images.
+
+    An entry is identified by the tenant, QR code ID, normalized download
+    params and the QR code's version (its update timestamp), so editing a QR
+    code naturally misses the old image. File names start with a digest of
+    tenant and QR code ID, which lets every entry of one QR code be dropped
+    at once. Total size is bounded with LRU eviction; recency survives
+    restarts through file modification times.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        files = []
+        now = time.time()
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.startswith(".tmp-"):
+                if now - stat.st_mtime > _STALE_TMP_SECONDS:
+                    # Left behind by a download interrupted before commit
+                    path.unlink(missing_ok=True)
+            elif path.is_file():
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name.split(".")[0]] = (name, size)
+            self._bytes += size
+
+    @staticmethod
+    def _prefix(tenant, qrid):
+        return _digest(f"{tenant}|{qrid}", 16)
+
+    @classmethod
+    def stem(cls, tenant, qrid, params=None, version=None):
+        """
+        Build the file name stem of an entry.
+
+        Params are sorted and stringified, as for ResponseCache keys.
+        """
+        query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None))
+        entry = _digest(f"{tenant}|{qrid}|{query}|{version or ''}", 32)
+        return f"{cls._prefix(tenant, qrid)}-{entry}"
+
+    def get(self, stem):
+        """
+        Return the path of the cached image for ``stem``, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(stem)
+            if entry is None:
+                entry = self._probe(stem)
+            if entry is not None:
+                path = self.directory / entry[0]
+                try:
+                    # Persists the LRU order for the next start
+                    os.utime(path)
+                except FileNotFoundError:
+                    self._remove(stem)
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(stem)
+            self.hits += 1
+            return path
+
+    def _probe(self, stem):
+        # Another worker process sharing the directory may have cached it
+        for extension in _PROBE_EXTENSIONS:
+            name = stem + extension
+            try:
+                size = (self.directory / name).stat().st_size
+            except FileNotFoundError:
+                continue
+            self._entries[stem] = (name, size)
+            self._bytes += size
+            return self._entries[stem]
+        return None
+
+    def writer(self, stem, content_type):
+        """
+        Start storing an image; see ImageWriter.
+        """
+        return ImageWriter(self, stem, _extension(content_type))
+
+    def put(self, stem, content_type, data):
+        """
+        Store a complete image. A failure to write is not an error for the
+        caller; the image is simply not cached.
+        """
+        try:
+            writer = self.writer(stem, content_type)
+        except OSError:
+            return
+        try:
+            writer.write(data)
+            writer.commit()
+        except OSError:
+            writer.abort()
+
+    def invalidate(self, tenant, qrid):
+        """Drop every cached image of one QR code, whatever its params or version."""
+        prefix = self._prefix(tenant, qrid) + "-"
+        with self._lock:
+            stems = [stem for stem in self._entries if stem.startswith(prefix)]
+            for stem in stems:
+                self._remove(stem, unlink=True)
+            self.invalidations += len(stems)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Entry count, total bytes and hit, miss, eviction and invalidation counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _add(self, stem, name, size):
+        with self._lock:
+            if stem in self._entries:
+                # Same stem with another extension is a different file
+                self._remove(stem, unlink=self._entries[stem][0] != name)
+            self._entries[stem] = (name, size)
+            self._bytes += size
+            while len(self._entries) > 1 and self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)), unlink=True)
+                self.evictions += 1
+
+    def _remove(self, stem, unlink=False):
+        name, size = self._entries.pop(stem)
+        self._bytes -= size
+        if unlink:
+            (self.directory / name).unlink(missing_ok=True)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    Return the process-wide ImageCache, or None when IMAGE_CACHE_ENABLED is off.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None and IMAGE_CACHE_ENABLED:
+            _default_cache = ImageCache()
+    return _default_cache
@@ -0,0 +1,292 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import JOBS_PATH
+
+# Statuses of a job; the last three are final
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+_JOB_COLUMNS = (
+    "id", "tenant", "kind", "status", "params", "total", "done", "succeeded", "failed",
+    "error", "created", "started", "finished", "owner", "cancel_requested",
+)
+
+
+class JobStore:
+    """
+    SQLite database of background jobs, shared by the processes on a host.
+
+    ``jobs`` holds one row per job with its parameters, the items it works
+    through (JSON, filled in when the job is planned), the checkpoint (``done``
+    items and their counts) and the lease of the process running it:
+    ``owner`` and ``heartbeat``. Per-item results go to ``job_results`` as
+    each checkpoint is written, so a resumed job keeps what it already did.
+    Items of jobs that must not be sent twice are noted in ``job_in_flight``
+    before they are sent, until their result is recorded.
+    """
+
+    def __init__(self, path=JOBS_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, tenant TEXT NOT NULL, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "params TEXT NOT NULL, items TEXT, total INTEGER, done INTEGER NOT NULL DEFAULT 0, "
+            "succeeded INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL, owner TEXT, heartbeat REAL, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_tenant ON jobs (tenant, created)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, success INTEGER NOT NULL, result TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, idx))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_in_flight (job_id TEXT NOT NULL, idx INTEGER NOT NULL, "
+            "PRIMARY KEY (job_id, idx))"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(zip(_JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def add(self, job_id, tenant, kind, params, items=None):
+        """Queue a job; ``items`` may be left for the job to plan when it starts."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, tenant, kind, status, params, items, total, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tenant, kind, QUEUED, json.dumps(params),
+                 json.dumps(items) if items is not None else None,
+                 len(items) if items is not None else None, time.time()),
+            )
+
+    def get(self, job_id, tenant=None):
+        """Return a job as a dict, or None; with ``tenant`` only that tenant's."""
+        query = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?"
+        args = (job_id,)
+        if tenant is not None:
+            query += " AND tenant = ?"
+            args += (tenant,)
+        with self._lock:
+            return self._job(self._db.execute(query, args).fetchone())
+
+    def recent(self, tenant, limit=20):
+        """Return a tenant's most recent jobs, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE tenant = ? ORDER BY created DESC LIMIT ?",
+                (tenant, limit),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def queued(self):
+        """Return (job id, tenant) of queued jobs, oldest first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, tenant FROM jobs WHERE status = ? ORDER BY created", (QUEUED,)
+            ).fetchall()
+
+    def running_per_tenant(self):
+        """Return how many jobs each tenant has running, across all processes."""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT tenant, COUNT(*) FROM jobs WHERE status = ? GROUP BY tenant", (RUNNING,)
+            ).fetchall())
+
+    def claim(self, job_id, owner):
+        """
+        Take a queued job for ``owner``.
+
+        Returns:
+            bool: False if another process claimed it first.
+        """
+        now = time.time()
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, started = COALESCE(started, ?) "
+                "WHERE id = ? AND status = ?",
+                (RUNNING, owner, now, now, job_id, QUEUED),
+            ).rowcount == 1
+
+    def items(self, job_id):
+        """Return the items of a job, or None if it was not planned yet."""
+        with self._lock:
+            row = self._db.execute("SELECT items FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def set_items(self, job_id, items):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET items = ?, total = ? WHERE id = ?", (json.dumps(items), len(items), job_id)
+            )
+
+    def checkpoint(self, job_id, owner, results):
+        """
+        Record the results of the next items of a running job.
+
+        Args:
+            job_id (str): The job.
+            owner (str): Process expected to hold the job's lease.
+            results (list): (item index, success, result) tuples.
+
+        Returns:
+            bool: False if the job is no longer running under ``owner`` (its
+            lease was taken over, or it was cancelled); nothing is recorded then.
+        """
+        succeeded = sum(1 for _, success, _ in results if success)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._db.execute(
+                    "UPDATE jobs SET done = done + ?, succeeded = succeeded + ?, failed = failed + ?, heartbeat = ? "
+                    "WHERE id = ? AND owner = ? AND status = ?",
+                    (len(results), succeeded, len(results) - succeeded, time.time(), job_id, owner, RUNNING),
+                ).rowcount
+                if updated:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO job_results (job_id, idx, success, result) VALUES (?, ?, ?, ?)",
+                        [(job_id, index, int(success), json.dumps(result, default=str)) for index, success, result in results],
+                    )
+                    self._db.executemany(
+                        "DELETE FROM job_in_flight WHERE job_id = ? AND idx = ?",
+                        [(job_id, index) for index, _, _ in results],
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return bool(updated)
+
+    def recorded(self, job_id):
+        """Return the indices of the items whose results are recorded."""
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT idx FROM job_results WHERE job_id = ?", (job_id,))}
+
+    def mark_in_flight(self, job_id, index):
+        """Note that an item is about to be sent; cleared when its result is recorded."""
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO job_in_flight (job_id, idx) VALUES (?, ?)", (job_id, index))
+
+    def in_flight(self, job_id):
+        """Return the indices of items that were sent but have no recorded result."""
+        with self._lock:
+            return sorted(row[0] for row in self._db.execute("SELECT idx FROM job_in_flight WHERE job_id = ?", (job_id,)))
+
+    def finish(self, job_id, owner, status, error=None):
+        """Mark a job running under ``owner`` as finished with ``status``."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, owner = NULL, heartbeat = NULL "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (status, error, time.time(), job_id, owner, RUNNING),
+            )
+
+    def request_cancel(self, job_id, tenant):
+        """
+        Cancel a queued job at once, or ask its runner to stop a running one
+        at the next checkpoint.
+
+        Returns:
+            dict: The job after the change, or None if it does not exist.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND tenant = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, tenant, QUEUED),
+            )
+            self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND tenant = ? AND status = ?",
+                (job_id, tenant, RUNNING),
+            )
+        return self.get(job_id, tenant)
+
+    def cancel_requested(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def renew(self, owner, job_ids):
+        """Extend the lease of ``owner`` on the jobs it is running."""
+        if not job_ids:
+            return
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET heartbeat = ? WHERE owner = ? AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), owner, *job_ids),
+            )
+
+    def release(self, owner):
+        """Put the running jobs of a stopping process back in the queue."""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, heartbeat = NULL WHERE owner = ? AND status = ?",
+                (QUEUED, owner, RUNNING),
+            ).rowcount
+
+    def requeue_stale(self, lease_seconds):
+        """
+        Put running jobs whose lease expired (their process died) back in the queue.
+
+        Returns:
+            int: Jobs requeued.
+        """
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, heartbeat = NULL WHERE status = ? AND heartbeat < ?",
+                (QUEUED, RUNNING, time.time() - lease_seconds),
+            ).rowcount
+
+    def results(self, job_id, offset=0, limit=100):
+        """Return per-item results of a job in item order."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, success, result FROM job_results WHERE job_id = ? ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        return [{"index": index, "success": bool(success), "result": json.loads(result)} for index, success, result in rows]
+
+    def prune(self, older_than):
+        """
+        Delete finished jobs older than ``older_than`` seconds with their results.
+
+        Returns:
+            int: Jobs deleted.
+        """
+        cutoff = time.time() - older_than
+        statuses = ", ".join("?" * len(FINAL_STATUSES))
+        with self._lock:
+            for table in ("job_results", "job_in_flight"):
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE job_id IN "
+                    f"(SELECT id FROM jobs WHERE status IN ({statuses}) AND finished < ?)",
+                    (*FINAL_STATUSES, cutoff),
+                )
+            return self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({statuses}) AND finished < ?", (*FINAL_STATUSES, cutoff)
+            ).rowcount
+
+    def counts(self):
+        """
+        Returns:
+            dict: Number of jobs per status.
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
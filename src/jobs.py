@@ -0,0 +1,512 @@
+"""
+Background jobs for bulk and export work too large for one tools/call.
+
+start_job stores a job in the JobStore and returns its id at once. A
+JobRunner in each server process takes queued jobs (a few at a time, at most
+JOB_MAX_RUNNING_PER_TENANT per API key, tenants served round-robin) and works
+through their items in chunks with run_bulk. Results of finished items are
+written after each chunk, and when the job is stopped or cancelled midway. On
+shutdown the items in flight may finish first (JOB_STOP_TIMEOUT) and no new
+ones start. A job resumes with the items that have no result, after a
+restart or in another process once the lease of the one running it lapses.
+Updates, activation and exports are simply sent again. Creates are not
+idempotent, so each is noted before it is sent, and one that was sent but
+never recorded (the process died) is reported as failed with an unknown
+outcome instead of being created a second time.
+
+API keys are never written to disk: a runner only starts the jobs of tenants
+whose key it has seen since it started, so after a restart a tenant's jobs
+continue on its next start_job, get_job_status or cancel_job call. A key is
+kept only while its tenant has queued or running jobs.
+"""
+import asyncio
+import logging
+import secrets
+import threading
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from urllib.parse import quote, urlencode
+
+import bulk
+from config import (
+    JOB_CHECKPOINT_ITEMS,
+    JOB_CONCURRENCY,
+    JOB_LEASE_SECONDS,
+    JOB_STOP_TIMEOUT,
+    JOB_MAX_ITEMS,
+    JOB_MAX_RUNNING_PER_TENANT,
+    JOB_RETENTION_DAYS,
+    JOB_WORKERS,
+    JOBS_ENABLED,
+    MCP_RESOURCE_URL,
+)
+from job_store import CANCELLED, COMPLETED, FAILED, RUNNING, JobStore
+from listing import ListingError, iter_qr_codes
+from scanova_client import API_KEY_REQUIRED, get_client, hash_api_key
+
+log = logging.getLogger('mcp')
+
+# Seconds between scheduling rounds; each round also renews the leases of
+# this process's running jobs
+POLL_INTERVAL = 1.0
+
+# Seconds between deletions of jobs older than JOB_RETENTION_DAYS
+PRUNE_INTERVAL = 3600.0
+
+# API keys of tenants without queued or running jobs are dropped when last
+# seen longer ago than this (seconds); checked as often
+CREDENTIALS_IDLE = 60.0
+
+# Result of an item that was sent to the Scanova API but never recorded
+UNKNOWN_OUTCOME = (
+    "Outcome unknown: the server stopped while this item was being sent; "
+    "check whether it was applied before retrying it"
+)
+
+# Returned instead of running an item once the runner is stopping
+_SKIPPED = object()
+
+
+class JobKind:
+    """
+    What a kind of job works through and what it does per item.
+
+    ``items_key`` names the list in the job params; ``operation(client,
+    params, api_key)`` returns the per-item coroutine function for run_bulk.
+    Kinds with ``plan`` may be started without items and list them when the
+    job first runs. Items of kinds that are not ``idempotent`` are never sent
+    twice.
+    """
+
+    __slots__ = ("items_key", "operation", "plan", "idempotent")
+
+    def __init__(self, items_key, operation, plan=None, idempotent=True):
+        self.items_key = items_key
+        self.operation = operation
+        self.plan = plan
+        self.idempotent = idempotent
+
+
+def _export_operation(client, params, api_key):
+    download_params = params.get("params") or None
+    query = f"?{urlencode(download_params)}" if download_params else ""
+
+    async def export(qrid):
+        # Streamed into the image cache, whatever its size; the job result only points to it
+        result = await client.cache_qr_code(str(qrid), download_params, api_key=api_key)
+        if isinstance(result, dict) and result.get("success"):
+            result["download_url"] = f"{MCP_RESOURCE_URL}/download/{quote(str(qrid), safe='')}{query}"
+        return result
+
+    return export
+
+
+async def _plan_export(client, params, api_key):
+    """Every qrid of the account, for an export job started without qrids."""
+    qrids = []
+    async with aclosing(iter_qr_codes(client, api_key=api_key)) as items:
+        async for item in items:
+            if item.get("qrid") is not None:
+                qrids.append(str(item["qrid"]))
+            if len(qrids) >= JOB_MAX_ITEMS:
+                break
+    return qrids
+
+
+JOB_KINDS = {
+    "bulk_create_qr_codes": JobKind(
+        "items", lambda client, params, api_key: bulk.create_operation(client, api_key), idempotent=False
+    ),
+    "bulk_update_qr_codes": JobKind(
+        "items", lambda client, params, api_key: bulk.update_operation(client, api_key)
+    ),
+    "bulk_set_qr_active": JobKind(
+        "qrids", lambda client, params, api_key: bulk.set_active_operation(client, params.get("is_active", True), api_key)
+    ),
+    "export_qr_images": JobKind("qrids", _export_operation, plan=_plan_export),
+}
+
+
+class JobRunner:
+    """
+    Runs queued jobs in the current process with bounded concurrency.
+    """
+
+    def __init__(
+        self,
+        store,
+        workers=JOB_WORKERS,
+        per_tenant=JOB_MAX_RUNNING_PER_TENANT,
+        concurrency=JOB_CONCURRENCY,
+        checkpoint_items=JOB_CHECKPOINT_ITEMS,
+        lease_seconds=JOB_LEASE_SECONDS,
+    ):
+        self.store = store
+        self.workers = workers
+        self.per_tenant = per_tenant
+        self.concurrency = concurrency
+        self.checkpoint_items = checkpoint_items
+        self.lease_seconds = lease_seconds
+        # Identifies this process's leases in the shared store
+        self.owner = secrets.token_hex(8)
+        # API keys by tenant hash, in memory only, and when each was last seen
+        self.credentials = {}
+        self._seen = {}
+        # Running jobs of this process: job id -> task
+        self.running = {}
+        self._dispatcher = None
+        self._wake = None
+        self._last_tenant = None
+        self._pruned = 0.0
+        self._forgotten = 0.0
+        self._stopping = False
+
+    def remember(self, api_key):
+        """
+        Note the API key of a tenant so its jobs can run.
+
+        Returns:
+            str: The tenant's key hash.
+        """
+        tenant = hash_api_key(api_key)
+        self.credentials[tenant] = api_key
+        self._seen[tenant] = time.monotonic()
+        return tenant
+
+    def _forget_idle(self):
+        # A key is needed only while its tenant has jobs to start or take
+        # over; the grace period covers a start_job between remember and add
+        active = {tenant for _, tenant in self.store.queued()}
+        active.update(self.store.running_per_tenant())
+        cutoff = time.monotonic() - CREDENTIALS_IDLE
+        for tenant in [tenant for tenant, seen in self._seen.items() if seen < cutoff and tenant not in active]:
+            self.credentials.pop(tenant, None)
+            self._seen.pop(tenant, None)
+
+    def start(self):
+        """Start scheduling in the running event loop, unless already started."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    def wake(self):
+        """Schedule now rather than at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self, timeout=JOB_STOP_TIMEOUT):
+        """
+        Stop scheduling and running; this process's running jobs go back to the queue.
+
+        No new items start; items in flight get ``timeout`` seconds to finish
+        and have their results recorded before their jobs are cancelled.
+        """
+        self._stopping = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        running = list(self.running.values())
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        tasks = [task for task in (self._dispatcher, *running) if task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        released = self.store.release(self.owner)
+        if released:
+            log.info(f"Returned {released} running job(s) to the queue")
+
+    async def _dispatch(self):
+        while True:
+            try:
+                self.store.renew(self.owner, list(self.running))
+                self.store.requeue_stale(self.lease_seconds)
+                self._schedule()
+                if time.monotonic() - self._pruned > PRUNE_INTERVAL:
+                    self._pruned = time.monotonic()
+                    self.store.prune(JOB_RETENTION_DAYS * 86400)
+                if time.monotonic() - self._forgotten > CREDENTIALS_IDLE:
+                    self._forgotten = time.monotonic()
+                    self._forget_idle()
+            except Exception as e:
+                log.error(f"Job scheduling error: {str(e)}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _schedule(self):
+        free = self.workers - len(self.running)
+        if free <= 0:
+            return
+        queues = {}
+        for job_id, tenant in self.store.queued():
+            if tenant in self.credentials:
+                queues.setdefault(tenant, []).append(job_id)
+        if not queues:
+            return
+        running = self.store.running_per_tenant()
+        # Round-robin: start with the tenant after the one served last
+        tenants = list(queues)
+        if self._last_tenant in tenants:
+            start = tenants.index(self._last_tenant) + 1
+            tenants = tenants[start:] + tenants[:start]
+        progress = True
+        while free > 0 and progress:
+            progress = False
+            for tenant in tenants:
+                if free <= 0:
+                    break
+                if not queues[tenant] or running.get(tenant, 0) >= self.per_tenant:
+                    continue
+                job_id = queues[tenant].pop(0)
+                if not self.store.claim(job_id, self.owner):
+                    continue
+                running[tenant] = running.get(tenant, 0) + 1
+                free -= 1
+                progress = True
+                self._last_tenant = tenant
+                task = asyncio.ensure_future(self._run(job_id, tenant))
+                self.running[job_id] = task
+                task.add_done_callback(lambda _, job_id=job_id: self._finished(job_id))
+
+    def _finished(self, job_id):
+        self.running.pop(job_id, None)
+        self.wake()
+
+    async def _run(self, job_id, tenant):
+        api_key = self.credentials[tenant]
+        job = self.store.get(job_id)
+        kind = JOB_KINDS[job["kind"]]
+        client = get_client()
+        status, error = COMPLETED, None
+        chunk = []
+        finished = []
+
+        def record(outcome):
+            if outcome["result"] is not _SKIPPED:
+                finished.append((chunk[outcome["index"]], outcome["success"], outcome["result"]))
+
+        def flush():
+            results = finished[:]
+            finished.clear()
+            return not results or self.store.checkpoint(job_id, self.owner, results)
+
+        try:
+            items = self.store.items(job_id)
+            if items is None:
+                try:
+                    items = await kind.plan(client, job["params"], api_key)
+                except ListingError as e:
+                    raise RuntimeError(e.result.get("error")) from e
+                self.store.set_items(job_id, items)
+            operation = kind.operation(client, job["params"], api_key)
+
+            recorded = self.store.recorded(job_id)
+            if not kind.idempotent:
+                # Sent before the job was interrupted, but the outcome was never recorded
+                unknown = [index for index in self.store.in_flight(job_id) if index not in recorded]
+                if unknown:
+                    finished.extend((index, False, {"error": UNKNOWN_OUTCOME}) for index in unknown)
+                    if not flush():
+                        return
+                    recorded.update(unknown)
+            pending = [index for index in range(len(items)) if index not in recorded]
+
+            async def run_item(index):
+                if self._stopping:
+                    return _SKIPPED
+                if not kind.idempotent:
+                    self.store.mark_in_flight(job_id, index)
+                return await operation(items[index])
+
+            for start in range(0, len(pending), self.checkpoint_items):
+                if self._stopping:
+                    # Left running; stop() puts the job back in the queue
+                    return
+                if self.store.cancel_requested(job_id):
+                    status = CANCELLED
+                    break
+                chunk = pending[start:start + self.checkpoint_items]
+                try:
+                    await bulk.run_bulk(chunk, run_item, concurrency=self.concurrency, on_result=record)
+                finally:
+                    # Also on cancellation, so finished items are not sent again
+                    kept = flush()
+                if not kept:
+                    log.warning(f"Job {job_id} is no longer held by this process, stopping")
+                    return
+            if self._stopping:
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Job {job_id} failed: {str(e)}")
+            status, error = FAILED, str(e)
+        self.store.finish(job_id, self.owner, status, error)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Jobs per status in the store and jobs running in this process.
+        """
+        return {**self.store.counts(), "running_here": len(self.running)}
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """
+    Return the process-wide JobRunner, opening the job store on first use.
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(JobStore())
+    return _runner
+
+
+def _time(value):
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+
+def job_summary(job):
+    """
+    Returns:
+        dict: The status fields of a job as returned by the job tools.
+    """
+    summary = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "total": job["total"],
+        "done": job["done"],
+        "succeeded": job["succeeded"],
+        "failed": job["failed"],
+        "progress": round(job["done"] / job["total"], 4) if job["total"] else None,
+        "created_at": _time(job["created"]),
+        "started_at": _time(job["started"]),
+        "finished_at": _time(job["finished"]),
+    }
+    if job["status"] == RUNNING and job["cancel_requested"]:
+        summary["cancel_requested"] = True
+    if job["error"]:
+        summary["error"] = job["error"]
+    return summary
+
+
+def _runner_for(api_key):
+    """Return (runner, tenant) for a job tool call, or (None, error dict)."""
+    if not api_key:
+        return None, {"error": API_KEY_REQUIRED}
+    if not JOBS_ENABLED:
+        return None, {"error": "Background jobs are disabled on this server"}
+    runner = get_job_runner()
+    tenant = runner.remember(api_key)
+    runner.start()
+    return runner, tenant
+
+
+async def start_job(client, kind=None, params=None, api_key=None):
+    """
+    Queue a background job.
+
+    Args:
+        client (ScanovaClient): Client of the calling server (jobs use the
+            process-wide client when they run).
+        kind (str): One of JOB_KINDS.
+        params (dict): Job input: "items" for bulk_create_qr_codes and
+            bulk_update_qr_codes (as for the bulk tools), "qrids" and
+            "is_active" for bulk_set_qr_active, and optional "qrids" (default:
+            every QR code) and download "params" for export_qr_images.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: The job id and status, or error.
+    """
+    runner, tenant = _runner_for(api_key)
+    if runner is None:
+        return tenant
+    spec = JOB_KINDS.get(kind)
+    if spec is None:
+        return {"error": f"Unknown job kind {kind!r}, expected one of {', '.join(JOB_KINDS)}"}
+    params = params or {}
+    if not isinstance(params, dict):
+        return {"error": "params must be an object"}
+    items = params.get(spec.items_key)
+    if items is not None or spec.plan is None:
+        if not isinstance(items, list) or not items:
+            return {"error": f"params.{spec.items_key} must be a non-empty list"}
+        if len(items) > JOB_MAX_ITEMS:
+            return {"error": f"Too many {spec.items_key}: at most {JOB_MAX_ITEMS} per job"}
+
+    job_id = secrets.token_hex(8)
+    job_params = {key: value for key, value in params.items() if key != spec.items_key}
+    runner.store.add(job_id, tenant, kind, job_params, items)
+    runner.wake()
+    return {
+        "success": True,
+        "message": "Job queued; follow it with get_job_status",
+        **job_summary(runner.store.get(job_id)),
+    }
+
+
+async def get_job_status(client, job_id=None, include_results=False, offset=0, limit=100, api_key=None):
+    """
+    Report a job's progress, or list the caller's recent jobs.
+
+    Args:
+        client (ScanovaClient): Unused; jobs are local.
+        job_id (str, optional): The job; without it the 20 most recent jobs are listed.
+        include_results (bool): Add per-item results, ``limit`` from ``offset``.
+        offset (int): First item result to return.
+        limit (int): Most item results to return (at most 1000).
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Job status (and results), the list of jobs, or error.
+    """
+    runner, tenant = _runner_for(api_key)
+    if runner is None:
+        return tenant
+    if not job_id:
+        return {"jobs": [job_summary(job) for job in runner.store.recent(tenant)]}
+    job = runner.store.get(job_id, tenant)
+    if job is None:
+        return {"error": f"Job {job_id} not found"}
+    summary = job_summary(job)
+    if include_results:
+        offset = max(offset or 0, 0)
+        summary["offset"] = offset
+        summary["results"] = runner.store.results(job_id, offset, min(max(limit or 100, 1), 1000))
+    return summary
+
+
+async def cancel_job(client, job_id=None, api_key=None):
+    """
+    Cancel a job: a queued job at once, a running one after its current chunk.
+
+    Args:
+        client (ScanovaClient): Unused; jobs are local.
+        job_id (str): The job.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: The job status, or error.
+    """
+    runner, tenant = _runner_for(api_key)
+    if runner is None:
+        return tenant
+    job = runner.store.request_cancel(job_id, tenant)
+    if job is None:
+        return {"error": f"Job {job_id} not found"}
+    if job["status"] not in (CANCELLED, RUNNING):
+        return {"error": f"Job {job_id} already finished ({job['status']})", **job_summary(job)}
+    runner.wake()
+    return {"success": True, **job_summary(job)}
+
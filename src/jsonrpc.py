@@ -0,0 +1,85 @@
+"""
+JSON-RPC messages of the /mcp endpoint.
+
+Request bodies are decoded with ``serialization.loads`` (orjson when it is
+installed) and every message is checked for shape once, into a Message, so
+the handlers read attributes instead of probing dicts. Error responses that
+never vary are encoded once at import.
+"""
+from serialization import dumps, loads
+
+PARSE_ERROR = {"code": -32700, "message": "Parse error"}
+INVALID_REQUEST = {"code": -32600, "message": "Invalid Request"}
+BODY_TOO_LARGE = {"code": -32600, "message": "Request body too large"}
+
+# Answer to requests naming a session that expired, was evicted or was closed;
+# the client then initializes a new one
+SESSION_NOT_FOUND = {"code": -32001, "message": "Session not found, initialize a new session"}
+
+
+class Message:
+    """
+    A JSON-RPC request, or a notification when it has no id.
+
+    ``params`` is always a dict (empty when the message had none).
+    """
+
+    __slots__ = ("id", "method", "params", "notification")
+
+    def __init__(self, method, params=None, id=None, notification=False):
+        self.id = id
+        self.method = method
+        self.params = params if params is not None else {}
+        self.notification = notification
+
+    @classmethod
+    def parse(cls, obj):
+        """
+        Returns:
+            Message: The message for a decoded JSON value, or None if it is not
+            a valid request: no string method, params that are not an object,
+            or an id that is not a string, integer or null.
+        """
+        if not isinstance(obj, dict):
+            return None
+        method = obj.get("method")
+        params = obj.get("params")
+        if not isinstance(method, str) or not (params is None or isinstance(params, dict)):
+            return None
+        if "id" not in obj:
+            return cls(method, params, None, True)
+        id = obj["id"]
+        if not (id is None or isinstance(id, str) or (isinstance(id, int) and not isinstance(id, bool))):
+            return None
+        return cls(method, params, id)
+
+
+def decode(data):
+    """
+    Decode a request body.
+
+    Args:
+        data (bytes): The body of a POST /mcp.
+
+    Returns:
+        tuple: (messages, batch): a Message for each entry, None for entries
+        that are not valid requests, and whether the body was a batch.
+
+    Raises:
+        ValueError: If the body is not JSON.
+    """
+    body = loads(data)
+    if isinstance(body, list):
+        return [Message.parse(entry) for entry in body], True
+    return [Message.parse(body)], False
+
+
+def encode_error(error, id=None):
+    """Encode a JSON-RPC error response."""
+    return dumps({"jsonrpc": "2.0", "id": id, "error": error})
+
+
+PARSE_ERROR_RESPONSE = encode_error(PARSE_ERROR)
+INVALID_REQUEST_RESPONSE = encode_error(INVALID_REQUEST)
+BODY_TOO_LARGE_RESPONSE = encode_error(BODY_TOO_LARGE)
+SESSION_NOT_FOUND_RESPONSE = encode_error(SESSION_NOT_FOUND)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import math
+from collections import deque
+from contextlib import aclosing
+
+from config import LIST_ALL_MAX_ITEMS, LIST_MAX_PAGES, LIST_PAGE_SIZE, LIST_PREFETCH_PAGES
+from progress import report_progress
+from scanova_client import API_KEY_REQUIRED
+from serialization import project
+
+# Fields summarize_qr_codes groups by when the caller does not choose any
+DEFAULT_GROUP_BY = ["qr_type", "is_active", "category"]
+
+
+class ListingError(Exception):
+    """
+    Raised by iter_qr_codes when a page cannot be fetched; ``result`` holds
+    the ``{"error": ...}`` dict to return to the caller.
+    """
+
+    def __init__(self, result):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+async def iter_qr_codes(client, params=None, api_key=None, page_size=LIST_PAGE_SIZE, prefetch=LIST_PREFETCH_PAGES):
+    """
+    Iterate over every QR code of an account, page by page.
+
+    The first page gives the total count; the following pages are then
+    requested up to ``prefetch`` at a time while earlier ones are consumed,
+    so at most ``prefetch`` pages are held in memory. Use with
+    ``contextlib.aclosing`` when stopping early so pending requests are cancelled.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        params (dict, optional): Extra list parameters, e.g. {"search": "menu"}.
+        api_key (str): Scanova API key from the MCP client
+        page_size (int): QR codes requested per page.
+        prefetch (int): Pages requested concurrently.
+
+    Yields:
+        dict: QR codes in listing order.
+
+    Raises:
+        ListingError: If a page request fails.
+    """
+    params = {**(params or {}), "limit": page_size}
+
+    async def fetch(page):
+        result = await client.list_qr_codes({**params, "page": page}, api_key=api_key)
+        if not isinstance(result, dict) or not isinstance(result.get("results"), list):
+            if isinstance(result, dict) and "error" in result:
+                raise ListingError(result)
+            raise ListingError({"error": f"Unexpected response for page {page} of the QR code list", "response": result})
+        return result
+
+    first = await fetch(1)
+    count = first.get("count")
+    last_page = max(min(math.ceil(count / page_size), LIST_MAX_PAGES), 1) if isinstance(count, int) else None
+    report_progress(1, last_page, "Fetched page 1")
+    for item in first["results"]:
+        yield item
+
+    if not isinstance(count, int):
+        # No total to plan with: follow the pages one at a time
+        page, result = 1, first
+        while result.get("next") and result["results"] and page < LIST_MAX_PAGES:
+            page += 1
+            result = await fetch(page)
+            report_progress(page, None, f"Fetched page {page}")
+            for item in result["results"]:
+                yield item
+        return
+
+    pending = deque()
+    next_page = 2
+    try:
+        while next_page <= last_page or pending:
+            while next_page <= last_page and len(pending) < prefetch:
+                pending.append(asyncio.ensure_future(fetch(next_page)))
+                next_page += 1
+            result = await pending.popleft()
+            page = next_page - len(pending) - 1
+            report_progress(page, last_page, f"Fetched page {page} of {last_page}")
+            if not result["results"]:
+                # The account shrank while paging
+                break
+            for item in result["results"]:
+                yield item
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def field_value(item, path):
+    """Return the value at a dotted ``path`` of a QR code, or None."""
+    for part in path.split("."):
+        item = item.get(part) if isinstance(item, dict) else None
+    return item
+
+
+def matches(item, filters):
+    """Return True if every ``filters`` path of the QR code equals the given value."""
+    return all(field_value(item, path) == value for path, value in (filters or {}).items())
+
+
+def _list_params(search):
+    return {"search": search} if search else None
+
+
+async def list_all_qr_codes(client, filters=None, search=None, fields=None, max_items=LIST_ALL_MAX_ITEMS, api_key=None):
+    """
+    List every QR code matching ``filters``, following all pages.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        filters (dict, optional): Field paths and the values they must equal,
+            e.g. {"is_active": False, "qr_type": "dy"}.
+        search (str, optional): Search term passed to the Scanova API.
+        fields (list, optional): Fields to keep for each QR code (see serialization.project).
+        max_items (int): Stop after this many matches; capped by LIST_ALL_MAX_ITEMS.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: {"count": ..., "truncated": ..., "results": [...]}, or an error dict.
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    max_items = min(max_items or LIST_ALL_MAX_ITEMS, LIST_ALL_MAX_ITEMS)
+    results = []
+    truncated = False
+    try:
+        async with aclosing(iter_qr_codes(client, _list_params(search), api_key=api_key)) as items:
+            async for item in items:
+                if not matches(item, filters):
+                    continue
+                if len(results) == max_items:
+                    truncated = True
+                    break
+                # Projecting as we go keeps only the requested fields in memory
+                results.append(project(item, fields))
+    except ListingError as e:
+        return e.result
+    return {"count": len(results), "truncated": truncated, "results": results}
+
+
+def _group_key(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+async def summarize_qr_codes(client, filters=None, search=None, group_by=None, api_key=None):
+    """
+    Count the QR codes matching ``filters`` and group the counts by field.
+
+    Only the counters are kept, so memory use does not grow with the account.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        filters (dict, optional): Field paths and the values they must equal.
+        search (str, optional): Search term passed to the Scanova API.
+        group_by (list, optional): Field paths to group by; defaults to
+            qr_type, is_active and category.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: e.g. {"total": 12, "groups": {"is_active": {"true": 9, "false": 3}, ...}},
+            or an error dict.
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    group_by = group_by or DEFAULT_GROUP_BY
+    groups = {path: {} for path in group_by}
+    total = 0
+    try:
+        async with aclosing(iter_qr_codes(client, _list_params(search), api_key=api_key)) as items:
+            async for item in items:
+                if not matches(item, filters):
+                    continue
+                total += 1
+                for path, counts in groups.items():
+                    key = _group_key(field_value(item, path))
+                    counts[key] = counts.get(key, 0) + 1
+    except ListingError as e:
+        return e.result
+    return {"total": total, "groups": groups}
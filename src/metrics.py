@@ -0,0 +1,264 @@
+"""
+Minimal Prometheus instrumentation without the prometheus_client dependency.
+
+Counters, gauges and histograms keep plain numbers keyed by label values, so
+recording is a dict lookup and an addition and can stay on in the hot path.
+Values owned by other components (cache, pool, circuit breakers) are read
+only when /metrics is scraped, through collector callbacks.
+
+With several worker processes each one periodically writes its rendered
+metrics to a shared directory, and a scrape merges the files of all live
+workers with a ``worker`` label on every series.
+"""
+import os
+import time
+from bisect import bisect_left
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for values, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # Per-bucket counts (not cumulative) plus +Inf, then sum
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = self.header()
+        for values, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Holds metrics and scrape-time collectors and renders the text exposition format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector):
+        """
+        Register ``collector()``, called on every scrape and returning an
+        iterable of Metric objects built from current component state.
+        """
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        self.collectors.remove(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "mcp_requests_total", "JSON-RPC messages received on /mcp, by method.", ["method"]
+)
+TOOL_CALLS = REGISTRY.counter(
+    "mcp_tool_calls_total", "tools/call requests by tool and outcome.", ["tool", "outcome"]
+)
+TOOL_DURATION = REGISTRY.histogram(
+    "mcp_tool_duration_seconds", "Total time to answer a tools/call, by tool.", ["tool"]
+)
+TOOL_UPSTREAM = REGISTRY.histogram(
+    "mcp_tool_upstream_seconds", "Part of a tools/call spent waiting on the Scanova API, by tool.", ["tool"]
+)
+TOOL_OVERHEAD = REGISTRY.histogram(
+    "mcp_tool_overhead_seconds", "Part of a tools/call spent in this server (total minus upstream), by tool.", ["tool"]
+)
+TOOLS_IN_FLIGHT = REGISTRY.gauge(
+    "mcp_tool_calls_in_flight", "tools/call requests currently running, by tool.", ["tool"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "mcp_http_requests_in_flight", "HTTP requests to /mcp currently being handled."
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "scanova_upstream_requests_total", "Requests sent to the Scanova API, by HTTP method and status.", ["method", "status"]
+)
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "scanova_upstream_request_duration_seconds", "Duration of single requests to the Scanova API, by HTTP method.", ["method"]
+)
+
+
+def record_upstream(method, path, status, elapsed, reused):
+    """ScanovaClient stats hook feeding the upstream request metrics."""
+    UPSTREAM_REQUESTS.inc(method, status if status is not None else "error")
+    UPSTREAM_DURATION.observe(elapsed, method)
+
+
+def record_tool_call(tool, outcome, elapsed, upstream):
+    TOOL_CALLS.inc(tool, outcome)
+    TOOL_DURATION.observe(elapsed, tool)
+    TOOL_UPSTREAM.observe(upstream, tool)
+    TOOL_OVERHEAD.observe(max(elapsed - upstream, 0.0), tool)
+
+
+def stats_gauges(prefix, help, stats, labels=None):
+    """
+    Turn the numeric values of a component ``stats()`` dict into gauges named
+    ``{prefix}_{key}``; other values are skipped.
+    """
+    label_names = tuple(labels or ())
+    label_values = tuple((labels or {}).values())
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        gauge = Gauge(f"{prefix}_{key}", f"{help} ({key}).", label_names)
+        gauge.set(value, *label_values)
+        yield gauge
+
+
+def write_snapshot(directory, registry=REGISTRY):
+    """
+    Write this process's metrics to ``{directory}/{pid}.prom``, atomically
+    so a merging scrape never reads a partial file.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{os.getpid()}.prom"
+    tmp = directory / f".{os.getpid()}.tmp"
+    tmp.write_text(registry.render())
+    os.replace(tmp, path)
+
+
+def remove_snapshot(directory):
+    (directory / f"{os.getpid()}.prom").unlink(missing_ok=True)
+
+
+def _with_worker(line, worker):
+    name, brace, rest = line.partition("{")
+    if brace:
+        return f'{name}{{worker="{worker}",{rest}'
+    name, _, value = line.partition(" ")
+    return f'{name}{{worker="{worker}"}} {value}'
+
+
+def merge_snapshots(directory, max_age):
+    """
+    Render the snapshots of all workers as one exposition.
+
+    Each metric family is written once, with the samples of every worker
+    labelled ``worker="<pid>"``. Snapshots older than ``max_age`` seconds
+    belong to workers that exited and are deleted.
+    """
+    families = {}
+    now = time.time()
+    for path in sorted(directory.glob("*.prom")):
+        try:
+            if now - path.stat().st_mtime > max_age:
+                path.unlink(missing_ok=True)
+                continue
+            text = path.read_text()
+        except FileNotFoundError:
+            continue
+        worker = path.stem
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                family = families.setdefault(line.split(" ", 3)[2], ([], []))
+                if not family[0]:
+                    family[0].append(line)
+            elif line.startswith("# TYPE "):
+                if len(family[0]) < 2:
+                    family[0].append(line)
+            elif line and family is not None:
+                family[1].append(_with_worker(line, worker))
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,75 @@
+"""
+Progress notifications for long-running tool calls.
+
+A transport that can deliver notifications while a call runs (the SSE stream
+of a /mcp tools/call, or the stdio server) sets a ProgressReporter in
+``progress_reporter`` around the call. Bulk runs and paged listings call
+``report_progress``, which costs one ContextVar lookup when nobody listens.
+"""
+import contextvars
+import time
+
+from config import MCP_PROGRESS_INTERVAL
+
+# ProgressReporter of the current tool call, if its client asked for progress
+progress_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+
+class ProgressReporter:
+    """
+    Turns progress reports into ``notifications/progress`` messages for one
+    progress token.
+
+    Reports closer together than ``interval`` seconds are dropped, except the
+    one completing the work, so a bulk run of thousands of items sends a
+    handful of notifications.
+    """
+
+    __slots__ = ("token", "send", "interval", "last")
+
+    def __init__(self, token, send, interval=MCP_PROGRESS_INTERVAL):
+        """
+        Args:
+            token: The progressToken from the request's ``_meta``.
+            send (callable): Called with each notification dict.
+            interval (float): Minimum seconds between notifications.
+        """
+        self.token = token
+        self.send = send
+        self.interval = interval
+        self.last = 0.0
+
+    def report(self, progress, total=None, message=None):
+        now = time.monotonic()
+        if (total is None or progress < total) and now - self.last < self.interval:
+            return
+        self.last = now
+        params = {"progressToken": self.token, "progress": progress}
+        if total is not None:
+            params["total"] = total
+        if message:
+            params["message"] = message
+        self.send({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+
+
+def progress_token(params):
+    """
+    Returns:
+        The progressToken of a tools/call ``params``, or None.
+    """
+    meta = params.get("_meta") if isinstance(params, dict) else None
+    return meta.get("progressToken") if isinstance(meta, dict) else None
+
+
+def report_progress(progress, total=None, message=None):
+    """
+    Report progress of the current tool call, if its client asked for it.
+
+    Args:
+        progress (int): Units of work done so far.
+        total (int, optional): Units of work in all, when known.
+        message (str, optional): Human-readable status.
+    """
+    reporter = progress_reporter.get()
+    if reporter is not None:
+        reporter.report(progress, total, message)
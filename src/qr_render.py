@@ -0,0 +1,466 @@
+"""
+Local QR code encoder and renderer for preview_qr_code.
+
+Encodes text in byte mode (ISO/IEC 18004, versions 1-40, error correction
+L/M/Q/H) and renders the matrix as a 1-bit PNG or an SVG path, without
+calling the Scanova API. Previews are plain black on white; branded images
+still come from download_qr_code.
+
+Each matrix row is a Python int used as a bitset (bit x is column x), so
+masking and most of the penalty scoring work on whole rows at once rather
+than module by module. Matrices and rendered images are kept in LRU caches,
+so repeating a preview is a dictionary lookup.
+"""
+import re
+import struct
+import zlib
+from functools import lru_cache
+
+from config import QR_PREVIEW_CACHE_SIZE
+
+ERROR_CORRECTION_LEVELS = ("L", "M", "Q", "H")
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Error correction level as encoded in the format information
+_FORMAT_LEVEL_BITS = {"L": 1, "M": 0, "Q": 3, "H": 2}
+
+# Error correction codewords per block and number of blocks, per level and
+# indexed by version (index 0 unused)
+_ECC_CODEWORDS_PER_BLOCK = {
+    "L": (0, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28,
+          28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    "M": (0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+          26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    "Q": (0, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30,
+          28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    "H": (0, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28,
+          30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+}
+_NUM_BLOCKS = {
+    "L": (0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8,
+          8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    "M": (0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+          17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    "Q": (0, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20,
+          23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    "H": (0, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25,
+          25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+}
+
+# Data mask conditions on column x and row y; a module is inverted where true
+_MASK_CONDITIONS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+# GF(256) exponent and logarithm tables for Reed-Solomon (polynomial 0x11D)
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _EXP[_i] = _EXP[_i + 255] = _value
+    _LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+
+# Penalty patterns: runs of five or more equal modules, and the 1:1:3:1:1
+# finder pattern with four light modules on either side
+_RUN = re.compile(r"0{5,}|1{5,}")
+_FINDER_LIKE = re.compile(r"(?=10111010000|00001011101)")
+
+
+class QRMatrix:
+    """
+    An encoded QR code: ``rows[y]`` has bit x set where module (x, y) is dark.
+    """
+
+    __slots__ = ("version", "level", "mask", "rows")
+
+    def __init__(self, version, level, mask, rows):
+        self.version = version
+        self.level = level
+        self.mask = mask
+        self.rows = rows
+
+    @property
+    def size(self):
+        return len(self.rows)
+
+    def is_dark(self, x, y):
+        return bool(self.rows[y] >> x & 1)
+
+
+def _raw_data_modules(version):
+    """Modules available for data and error correction in ``version``."""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        count = version // 7 + 2
+        result -= (25 * count - 10) * count - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _data_codewords(version, level):
+    return (
+        _raw_data_modules(version) // 8
+        - _ECC_CODEWORDS_PER_BLOCK[level][version] * _NUM_BLOCKS[level][version]
+    )
+
+
+def _count_bits(version):
+    """Width of the byte mode character count."""
+    return 8 if version < 10 else 16
+
+
+def max_bytes(level="M"):
+    """Most bytes a QR code can hold at error correction ``level``."""
+    return (_data_codewords(40, level) * 8 - 4 - _count_bits(40)) // 8
+
+
+@lru_cache(maxsize=None)
+def _generator(degree):
+    """Reed-Solomon generator polynomial of ``degree``, highest coefficient dropped."""
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _EXP[_LOG[result[j]] + _LOG[root]] if result[j] else 0
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _EXP[_LOG[root] + 1]
+    return tuple(_LOG[coefficient] for coefficient in result)
+
+
+def _ecc(data, degree):
+    """Reed-Solomon error correction codewords of the block ``data``."""
+    generator = _generator(degree)
+    result = [0] * degree
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        if factor:
+            log = _LOG[factor]
+            for i, coefficient in enumerate(generator):
+                result[i] ^= _EXP[coefficient + log]
+    return result
+
+
+def _codewords(data, version, level):
+    """
+    Data codewords with terminator and padding, split into blocks, followed
+    by each block's error correction, interleaved as they are placed.
+    """
+    capacity = _data_codewords(version, level)
+    count_bits = _count_bits(version)
+    bits = ((0b0100 << count_bits | len(data)) << 8 * len(data)) | int.from_bytes(data, "big")
+    length = 4 + count_bits + 8 * len(data)
+    terminator = min(4, capacity * 8 - length)
+    bits <<= terminator + (-(length + terminator) % 8)
+    length += terminator + (-(length + terminator) % 8)
+    codewords = list(bits.to_bytes(length // 8, "big"))
+    codewords += [0xEC, 0x11] * ((capacity - len(codewords)) // 2) + [0xEC] * ((capacity - len(codewords)) % 2)
+
+    num_blocks = _NUM_BLOCKS[level][version]
+    ecc_length = _ECC_CODEWORDS_PER_BLOCK[level][version]
+    raw = _raw_data_modules(version) // 8
+    short_blocks = num_blocks - raw % num_blocks
+    short_length = raw // num_blocks - ecc_length
+    blocks = []
+    start = 0
+    for i in range(num_blocks):
+        length = short_length + (i >= short_blocks)
+        block = codewords[start:start + length]
+        start += length
+        # Short blocks get a placeholder so all blocks interleave by index
+        blocks.append(block + [0] * (i < short_blocks) + _ecc(block, ecc_length))
+
+    return [
+        block[i]
+        for i in range(len(blocks[0]))
+        for j, block in enumerate(blocks)
+        if i != short_length or j >= short_blocks
+    ]
+
+
+def _alignment_positions(version):
+    if version == 1:
+        return []
+    count = version // 7 + 2
+    step = 26 if version == 32 else (version * 4 + count * 2 + 1) // (count * 2 - 2) * 2
+    size = version * 4 + 17
+    return [6] + [size - 7 - i * step for i in range(count - 1)][::-1]
+
+
+class _Builder:
+    """Draws a matrix: ``rows`` are the modules, ``function`` marks non-data modules."""
+
+    def __init__(self, version):
+        self.version = version
+        self.size = version * 4 + 17
+        self.rows = [0] * self.size
+        self.function = [0] * self.size
+
+    def set(self, x, y, dark):
+        bit = 1 << x
+        if dark:
+            self.rows[y] |= bit
+        else:
+            self.rows[y] &= ~bit
+        self.function[y] |= bit
+
+    def draw_function_patterns(self, level):
+        size = self.size
+        for i in range(size):
+            self.set(6, i, i % 2 == 0)
+            self.set(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self.set(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = _alignment_positions(self.version)
+        last = len(positions) - 1
+        for i, cy in enumerate(positions):
+            for j, cx in enumerate(positions):
+                # The three corners are taken by finder patterns
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        self.draw_format(level, 0)
+        self.draw_version()
+
+    def draw_format(self, level, mask):
+        data = _FORMAT_LEVEL_BITS[level] << 3 | mask
+        remainder = data
+        for _ in range(10):
+            remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+        bits = (data << 10 | remainder) ^ 0x5412
+        size = self.size
+        for i in range(6):
+            self.set(8, i, bits >> i & 1)
+        self.set(8, 7, bits >> 6 & 1)
+        self.set(8, 8, bits >> 7 & 1)
+        self.set(7, 8, bits >> 8 & 1)
+        for i in range(9, 15):
+            self.set(14 - i, 8, bits >> i & 1)
+        for i in range(8):
+            self.set(size - 1 - i, 8, bits >> i & 1)
+        for i in range(8, 15):
+            self.set(8, size - 15 + i, bits >> i & 1)
+        self.set(8, size - 8, True)
+
+    def draw_version(self):
+        if self.version < 7:
+            return
+        remainder = self.version
+        for _ in range(12):
+            remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+        bits = self.version << 12 | remainder
+        for i in range(18):
+            a, b = self.size - 11 + i % 3, i // 3
+            self.set(a, b, bits >> i & 1)
+            self.set(b, a, bits >> i & 1)
+
+    def draw_codewords(self, codewords):
+        """Place the codeword bits in the two-column zigzag, skipping function modules."""
+        bits = int.from_bytes(bytes(codewords), "big")
+        total = len(codewords) * 8
+        size, rows, function = self.size, self.rows, self.function
+        i = 0
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                # Skip the vertical timing pattern
+                right = 5
+            upward = (right + 1) & 2 == 0
+            for vertical in range(size):
+                y = size - 1 - vertical if upward else vertical
+                for x in (right, right - 1):
+                    if not function[y] >> x & 1 and i < total:
+                        if bits >> (total - 1 - i) & 1:
+                            rows[y] |= 1 << x
+                        i += 1
+            right -= 2
+
+
+@lru_cache(maxsize=64)
+def _mask_rows(size, mask):
+    """Row bitsets of the modules mask ``mask`` inverts, for a ``size`` matrix."""
+    condition = _MASK_CONDITIONS[mask]
+    return tuple(
+        sum(1 << x for x in range(size) if condition(x, y))
+        for y in range(size)
+    )
+
+
+def _penalty(rows, size):
+    """Penalty score of a masked matrix; the mask with the lowest is used."""
+    lines = [format(row, f"0{size}b") for row in rows]
+    lines += ["".join(column) for column in zip(*lines)]
+    score = 0
+    for line in lines:
+        for run in _RUN.finditer(line):
+            score += len(run.group()) - 2
+        score += 40 * len(_FINDER_LIKE.findall(f"0000{line}0000"))
+    # 2x2 blocks of one colour: both rows agree in columns x and x + 1, and
+    # the upper row has the same colour in both
+    within = (1 << (size - 1)) - 1
+    for upper, lower in zip(rows, rows[1:]):
+        agree = ~(upper ^ lower)
+        score += 3 * (agree & agree >> 1 & ~(upper ^ upper >> 1) & within).bit_count()
+    # Distance of the dark share from 50%, in steps of 5%
+    dark = sum(row.bit_count() for row in rows)
+    total = size * size
+    score += 10 * ((abs(dark * 20 - total * 10) + total - 1) // total - 1)
+    return score
+
+
+@lru_cache(maxsize=QR_PREVIEW_CACHE_SIZE)
+def encode(text, level="M"):
+    """
+    Encode ``text`` as UTF-8 in the smallest QR code version that fits.
+
+    Args:
+        text (str): Text or URL to encode.
+        level (str): Error correction level, one of L, M, Q, H.
+
+    Returns:
+        QRMatrix: The encoded matrix.
+
+    Raises:
+        ValueError: If the level is unknown or the text does not fit.
+    """
+    if level not in ERROR_CORRECTION_LEVELS:
+        raise ValueError(f"Unknown error correction level {level!r}, expected one of {', '.join(ERROR_CORRECTION_LEVELS)}")
+    data = text.encode("utf-8")
+    for version in range(1, 41):
+        if 4 + _count_bits(version) + 8 * len(data) <= _data_codewords(version, level) * 8:
+            break
+    else:
+        raise ValueError(f"Data too long for a QR code: {len(data)} bytes, at most {max_bytes(level)} at error correction {level}")
+
+    builder = _Builder(version)
+    builder.draw_function_patterns(level)
+    builder.draw_codewords(_codewords(data, version, level))
+
+    best = None
+    for mask in range(len(_MASK_CONDITIONS)):
+        masked = _Builder(version)
+        masked.function = builder.function
+        masked.rows = [
+            row ^ (mask_row & ~function_row)
+            for row, mask_row, function_row in zip(builder.rows, _mask_rows(builder.size, mask), builder.function)
+        ]
+        masked.draw_format(level, mask)
+        score = _penalty(masked.rows, masked.size)
+        if best is None or score < best[0]:
+            best = (score, mask, masked.rows)
+    return QRMatrix(version, level, best[1], tuple(best[2]))
+
+
+def _light_line(matrix, row, border, scale):
+    """PNG bit string of one module row: '1' is light, column 0 first, scaled."""
+    size = matrix.size
+    line = format(~row & ((1 << size) - 1), f"0{size}b")[::-1]
+    quiet = "1" * border
+    return "".join(module * scale for module in quiet + line + quiet)
+
+
+def _png_chunk(kind, body):
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def to_png(matrix, scale=4, border=4):
+    """
+    Render ``matrix`` as a 1-bit grayscale PNG.
+
+    Args:
+        matrix (QRMatrix): The QR code.
+        scale (int): Pixels per module.
+        border (int): Quiet zone width in modules.
+
+    Returns:
+        bytes: The PNG file.
+    """
+    width = (matrix.size + 2 * border) * scale
+    padding = "1" * (-width % 8)
+
+    def scanline(bits):
+        # Filter type 0, then the packed pixels, repeated ``scale`` times
+        return (b"\x00" + int(bits + padding, 2).to_bytes((width + 7) // 8, "big")) * scale
+
+    quiet = scanline("1" * width) * border
+    image = quiet + b"".join(scanline(_light_line(matrix, row, border, scale)) for row in matrix.rows) + quiet
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, width, 1, 0, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(image, 9))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def to_svg(matrix, scale=4, border=4):
+    """
+    Render ``matrix`` as an SVG with one path of horizontal runs of dark modules.
+
+    Args:
+        matrix (QRMatrix): The QR code.
+        scale (int): Displayed pixels per module; the SVG itself scales freely.
+        border (int): Quiet zone width in modules.
+
+    Returns:
+        bytes: The SVG document.
+    """
+    size = matrix.size
+    view = size + 2 * border
+    path = []
+    for y, row in enumerate(matrix.rows):
+        for run in re.finditer("1+", format(row, f"0{size}b")[::-1]):
+            length = run.end() - run.start()
+            path.append(f"M{run.start() + border} {y + border}h{length}v1h-{length}z")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {view} {view}" '
+        f'width="{view * scale}" height="{view * scale}" shape-rendering="crispEdges">'
+        f'<rect width="{view}" height="{view}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    ).encode("utf-8")
+
+
+@lru_cache(maxsize=QR_PREVIEW_CACHE_SIZE)
+def render(text, format="png", level="M", scale=4, border=4):
+    """
+    Encode and render ``text``; see ``encode``, ``to_png`` and ``to_svg``.
+
+    Returns:
+        bytes: The image in ``format`` ("png" or "svg").
+    """
+    matrix = encode(text, level)
+    if format == "svg":
+        return to_svg(matrix, scale, border)
+    return to_png(matrix, scale, border)
+
+
+def cache_stats():
+    """
+    Returns:
+        dict: Hits, misses and entries of the matrix and image caches.
+    """
+    stats = {}
+    for name, cached in (("matrix", encode), ("image", render)):
+        info = cached.cache_info()
+        stats[f"{name}_hits"] = info.hits
+        stats[f"{name}_misses"] = info.misses
+        stats[f"{name}_entries"] = info.currsize
+    return stats
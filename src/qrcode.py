@@ -1,6 +1,10 @@
 import json
-import requests
-from config import SCANOVA_BASE_URL
+import bulk
+import jobs
+import listing
+import search
+from scanova_client import run_sync
+from tools import preview_qr_code_handler
 
 
 def get_url_from_user():
@@ -60,20 +64,7 @@ def create_qr_code(params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API containing the created QR code details.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    # Get URL and name from user if not provided in params
-    if params is None or 'info' not in params:
-        # For MCP server, we need params to be provided
-        return {"error": "Parameters with 'info' field are required for QR code creation"}
-    
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.post(f"{SCANOVA_BASE_URL}/qrcode/", headers=headers, json=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("create_qr_code", params, api_key=api_key)
 
 def get_qr_id_from_user():
     """
@@ -114,15 +105,7 @@ def list_qr_codes(params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API containing the list of QR codes.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.get(f"{SCANOVA_BASE_URL}/qrcode/", headers=headers, params=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("list_qr_codes", params, api_key=api_key)
 
 def update_qr_code(qrid=None, params=None, api_key=None):
     """
@@ -136,21 +119,7 @@ def update_qr_code(qrid=None, params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API containing the updated QR code details.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    if not qrid:
-        return {"error": "QR code ID is required for update operation"}
-    
-    if not params:
-        return {"error": "Parameters are required for QR code update"}
-    
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.put(f"{SCANOVA_BASE_URL}/qrcode/{qrid}/", headers=headers, json=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("update_qr_code", qrid, params, api_key=api_key)
 
 def retrieve_qr_code(qrid=None, params=None, api_key=None):
     """
@@ -164,18 +133,7 @@ def retrieve_qr_code(qrid=None, params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API containing the QR code details.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    if not qrid:
-        return {"error": "QR code ID is required for retrieve operation"}
-
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.get(f"{SCANOVA_BASE_URL}/qrcode/{qrid}/", headers=headers, params=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("retrieve_qr_code", qrid, params, api_key=api_key)
 
 def download_qr_code(qrid=None, params=None, api_key=None):
     """
@@ -189,21 +147,24 @@ def download_qr_code(qrid=None, params=None, api_key=None):
     Returns:
         dict: Response containing download information or error.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    if not qrid:
-        return {"error": "QR code ID is required for download operation"}
-
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.get(f"{SCANOVA_BASE_URL}/qrcode/{qrid}/download", headers=headers, params=params)
-        if resp.status_code == 200:
-            return {"success": True, "message": "QR code download successful", "content_type": resp.headers.get('content-type')}
-        else:
-            return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("download_qr_code", qrid, params, api_key=api_key)
+
+def preview_qr_code(data=None, format="png", error_correction="M", scale=4, border=4):
+    """
+    Render a plain QR code locally, without calling the Scanova API.
+
+    Args:
+        data (str): URL or text to encode.
+        format (str): "png" or "svg".
+        error_correction (str): Error correction level, one of L, M, Q, H.
+        scale (int): Pixels per module.
+        border (int): Quiet zone width in modules.
+
+    Returns:
+        dict: The base64 image with its content type and QR version, or error.
+    """
+    arguments = {"data": data, "format": format, "error_correction": error_correction, "scale": scale, "border": border}
+    return preview_qr_code_handler(None, arguments, None)
 
 def activate_qr_code(qrid=None, params=None, api_key=None):
     """
@@ -217,21 +178,7 @@ def activate_qr_code(qrid=None, params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    if not qrid:
-        return {"error": "QR code ID is required for activate operation"}
-
-    if params is None:
-        params = {"is_active": True}
-    
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.patch(f"{SCANOVA_BASE_URL}/qrcode/{qrid}/", headers=headers, json=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+    return run_sync("activate_qr_code", qrid, params, api_key=api_key)
 
 def deactivate_qr_code(qrid=None, params=None, api_key=None):
     """
@@ -245,18 +192,134 @@ def deactivate_qr_code(qrid=None, params=None, api_key=None):
     Returns:
         dict: JSON response from the Scanova API.
     """
-    if not api_key:
-        return {"error": "API key is required. Please configure your Scanova API key in your MCP client."}
-    
-    if not qrid:
-        return {"error": "QR code ID is required for deactivate operation"}
+    return run_sync("deactivate_qr_code", qrid, params, api_key=api_key)
 
-    if params is None:
-        params = {"is_active": False}
-    
-    headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
-    try:
-        resp = requests.patch(f"{SCANOVA_BASE_URL}/qrcode/{qrid}/", headers=headers, json=params)
-        return resp.json()
-    except requests.RequestException as e:
-        return {"error": f"API request failed: {str(e)}"}
+def bulk_create_qr_codes(items=None, api_key=None):
+    """
+    Create many QR codes with bounded concurrency.
+
+    Args:
+        items (list): QR code parameters for each QR code, as for create_qr_code.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results, including partial failures.
+    """
+    return run_sync(bulk.bulk_create_qr_codes, items, api_key=api_key)
+
+def bulk_update_qr_codes(items=None, api_key=None):
+    """
+    Update many QR codes with bounded concurrency.
+
+    Args:
+        items (list): Dicts with the "qrid" of the QR code and the "params" to update.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results, including partial failures.
+    """
+    return run_sync(bulk.bulk_update_qr_codes, items, api_key=api_key)
+
+def bulk_set_qr_active(qrids=None, is_active=True, api_key=None):
+    """
+    Activate or deactivate many QR codes with bounded concurrency.
+
+    Args:
+        qrids (list): IDs of the QR codes to change.
+        is_active (bool): True to activate, False to deactivate.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Totals and per-item results, including partial failures.
+    """
+    return run_sync(bulk.bulk_set_qr_active, qrids, is_active, api_key=api_key)
+
+def list_all_qr_codes(filters=None, search=None, fields=None, max_items=None, api_key=None):
+    """
+    List every QR code matching the filters, following all pages.
+
+    Args:
+        filters (dict, optional): Field paths and the values they must equal.
+        search (str, optional): Search term passed to the Scanova API.
+        fields (list, optional): Fields to keep for each QR code.
+        max_items (int, optional): Maximum number of QR codes to return.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Matching QR codes with a count and whether the list was truncated.
+    """
+    return run_sync(listing.list_all_qr_codes, filters, search, fields, max_items, api_key=api_key)
+
+def summarize_qr_codes(filters=None, search=None, group_by=None, api_key=None):
+    """
+    Count the QR codes matching the filters, grouped by field.
+
+    Args:
+        filters (dict, optional): Field paths and the values they must equal.
+        search (str, optional): Search term passed to the Scanova API.
+        group_by (list, optional): Field paths to group the counts by.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Total count and per-field group counts.
+    """
+    return run_sync(listing.summarize_qr_codes, filters, search, group_by, api_key=api_key)
+
+def search_qr_codes(query=None, filters=None, fields=None, limit=None, api_key=None):
+    """
+    Search QR codes in the local index of the account.
+
+    Args:
+        query (str, optional): Words to find; "name:menu" searches one field.
+        filters (dict, optional): Field paths and the values they must equal.
+        fields (list, optional): Fields to keep for each QR code.
+        limit (int, optional): Maximum number of results.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Matching QR codes and how stale the index is.
+    """
+    return run_sync(search.search_qr_codes, query, filters, fields, limit, api_key=api_key)
+
+def start_job(kind=None, params=None, api_key=None):
+    """
+    Queue a background job for bulk or export work.
+
+    Args:
+        kind (str): bulk_create_qr_codes, bulk_update_qr_codes, bulk_set_qr_active or export_qr_images.
+        params (dict): Job input, e.g. {"items": [...]} or {"qrids": [...], "is_active": False}.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: The job id and status, or error.
+    """
+    return run_sync(jobs.start_job, kind, params, api_key=api_key)
+
+def get_job_status(job_id=None, include_results=False, offset=0, limit=100, api_key=None):
+    """
+    Report a background job's progress, or list recent jobs.
+
+    Args:
+        job_id (str, optional): The job; without it recent jobs are listed.
+        include_results (bool): Add per-item results.
+        offset (int): First item result to return.
+        limit (int): Most item results to return.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Job status, the list of jobs, or error.
+    """
+    return run_sync(jobs.get_job_status, job_id, include_results, offset, limit, api_key=api_key)
+
+def cancel_job(job_id=None, api_key=None):
+    """
+    Cancel a background job.
+
+    Args:
+        job_id (str): The job.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: The job status, or error.
+    """
+    return run_sync(jobs.cancel_job, job_id, api_key=api_key)
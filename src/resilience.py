@@ -0,0 +1,135 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    SCANOVA_MAX_RETRIES,
+    SCANOVA_RETRY_BASE_DELAY,
+    SCANOVA_RETRY_MAX_DELAY,
+)
+
+# Methods safe to send twice: GET reads, PUT replaces, and the PATCH used by
+# activate/deactivate sets a flag to a fixed value
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+
+# Responses worth retrying after a pause
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Failures that happen before the request reaches the server, so even a POST
+# can be retried
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """
+    Raised instead of sending a request while a host's circuit is open.
+
+    Subclasses httpx.TransportError so callers handling httpx.HTTPError
+    report it like any other failed request.
+    """
+
+
+def parse_retry_after(resp):
+    """
+    Return the delay requested by a Retry-After header in seconds, or None.
+
+    Both forms are accepted: a number of seconds and an HTTP date.
+    """
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for upstream retries.
+    """
+
+    def __init__(self, max_retries=SCANOVA_MAX_RETRIES, base_delay=SCANOVA_RETRY_BASE_DELAY, max_delay=SCANOVA_RETRY_MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Return a random delay in [0, base_delay * 2**attempt], capped at max_delay."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a host keeps failing.
+
+    After ``failure_threshold`` consecutive failures (transport errors or 5xx
+    responses) the circuit opens and requests are rejected for
+    ``reset_timeout`` seconds. Then a single probe request is let through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_request(self, host):
+        """
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a probe in flight.
+        """
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return
+        self.rejected += 1
+        retry_in = max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+        raise CircuitOpenError(f"Scanova API at {host} is unavailable; not retrying for {retry_in:.0f} seconds")
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.opened += 1
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Current state, consecutive failures and how often the circuit opened.
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,863 @@
+import asyncio
+import atexit
+import base64
+import contextvars
+import copy
+import hashlib
+import importlib.util
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import httpx
+from cache import get_response_cache
+from image_cache import content_type_for, get_image_cache
+from search_index import get_search_index
+from singleflight import SingleFlight
+import tracing
+from config import (
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_INLINE_MAX_BYTES,
+    DOWNLOAD_MAX_BYTES,
+    SCANOVA_BASE_URL,
+    SCANOVA_CONNECT_TIMEOUT,
+    SCANOVA_HTTP2,
+    SCANOVA_KEEPALIVE_EXPIRY,
+    SCANOVA_MAX_CONNECTIONS,
+    SCANOVA_MAX_KEEPALIVE_CONNECTIONS,
+    SCANOVA_MAX_TENANT_SESSIONS,
+    SCANOVA_POOL_TIMEOUT,
+    SCANOVA_READ_TIMEOUT,
+    SCANOVA_WRITE_TIMEOUT,
+)
+from resilience import IDEMPOTENT_METHODS, NOT_SENT_ERRORS, RETRY_STATUSES, CircuitBreaker, RetryPolicy, parse_retry_after
+
+API_KEY_REQUIRED = "API key is required. Please configure your Scanova API key in your MCP client."
+
+# The most recent upstream httpx.Response seen by the current task (None if the
+# request failed without a response). Lets callers such as bulk.py inspect the
+# status code and headers behind the dict an operation returned.
+last_response = contextvars.ContextVar("last_response", default=None)
+
+
+class UpstreamTimer:
+    """
+    Measures how long at least one Scanova API call was in flight.
+
+    Set one in ``upstream_timer`` around a unit of work (e.g. a tool call);
+    every upstream request made while it is set enters it. Overlapping
+    requests are counted once, so ``seconds`` never exceeds the wall time.
+    """
+
+    __slots__ = ("active", "started", "seconds")
+
+    def __init__(self):
+        self.active = 0
+        self.started = 0.0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        if not self.active:
+            self.started = time.perf_counter()
+        self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.active -= 1
+        if not self.active:
+            self.seconds += time.perf_counter() - self.started
+
+
+# UpstreamTimer of the current task, if its upstream time is being measured
+upstream_timer = contextvars.ContextVar("upstream_timer", default=None)
+
+# TenantSession of the API key the current request authenticated with, set by
+# the HTTP server so per-key state is found without hashing the key again
+current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+
+def hash_api_key(api_key):
+    """
+    Return a stable, non-reversible identifier for an API key.
+
+    Used wherever per-tenant state is keyed so raw keys are never stored as
+    dictionary keys, cache keys or metric labels.
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def tenant_hash(api_key):
+    """
+    hash_api_key, taken from the current request's TenantSession when it is
+    for the same key.
+    """
+    tenant = current_tenant.get()
+    if tenant is not None and tenant.api_key == api_key:
+        return tenant.key_hash
+    return hash_api_key(api_key)
+
+
+def response_result(resp):
+    """
+    Return the result dict for a Scanova API response.
+
+    Successful responses and client errors return the JSON body, as the API
+    sent it. Rate limiting, server errors and bodies that are not JSON become
+    ``{"error": ...}`` dicts carrying the HTTP status.
+    """
+    if resp.status_code == 429:
+        result = {"error": "Scanova API rate limit exceeded, try again later", "status": 429}
+        retry_after = parse_retry_after(resp)
+        if retry_after is not None:
+            result["retry_after"] = retry_after
+        return result
+    try:
+        body = resp.json()
+    except ValueError:
+        if resp.is_success:
+            return {"error": "API request failed: Scanova API returned a response that is not JSON", "status": resp.status_code}
+        body = resp.text[:500] or None
+    if resp.status_code >= 500:
+        return {"error": f"Scanova API error (HTTP {resp.status_code})", "status": resp.status_code, "detail": body}
+    if not resp.is_success and not isinstance(body, dict):
+        return {"error": f"Scanova API request failed (HTTP {resp.status_code})", "status": resp.status_code, "detail": body}
+    return body
+
+
+class TenantSession:
+    """
+    Per-API-key state reused across upstream calls.
+
+    Holds the key's hash and the prepared request headers for one tenant so
+    they are computed once instead of on every tool call. All tenants share the
+    client's connection pool.
+    """
+
+    __slots__ = ("api_key", "key_hash", "headers")
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.key_hash = hash_api_key(api_key)
+        self.headers = {"Authorization": f"{api_key}", "Content-Type": "application/json"}
+
+
+class PoolStats:
+    """
+    Counters for upstream calls made through a ScanovaClient.
+
+    A call counts as reused when httpcore served it from an already open
+    connection, i.e. no TCP connect happened for it.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.hooks = []
+
+    def record(self, method, path, status, elapsed, reused):
+        self.requests += 1
+        self.total_seconds += elapsed
+        if not reused:
+            self.new_connections += 1
+        if status is None:
+            self.errors += 1
+        for hook in self.hooks:
+            hook(method, path, status, elapsed, reused)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Request count, connection reuse ratio and average latency.
+        """
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "reused_connections": reused,
+            "new_connections": self.new_connections,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "errors": self.errors,
+            "avg_latency_ms": self.total_seconds / self.requests * 1000 if self.requests else 0.0,
+        }
+
+
+def _share_json(shared):
+    # Followers of a shared GET get their own copy of the parsed JSON; the
+    # response, only read for its status and headers, is not copied
+    result, resp = shared
+    return copy.deepcopy(result), resp
+
+
+class ScanovaClient:
+    """
+    Async client for the Scanova management API.
+
+    Mirrors the seven operations in ``qrcode.py`` but awaits the upstream
+    calls on a pooled ``httpx.AsyncClient`` so a slow Scanova response never
+    blocks the event loop serving other MCP clients.
+
+    All operations and all tenants share one keep-alive connection pool
+    (HTTP/2 when the optional ``h2`` package is installed); each API key gets
+    a TenantSession holding its Authorization header.
+
+    Every method returns the same dict shapes as the ``qrcode.py`` functions,
+    including ``{"error": ...}`` dicts for missing arguments or failed requests.
+    """
+
+    def __init__(
+        self,
+        base_url=SCANOVA_BASE_URL,
+        transport=None,
+        max_connections=SCANOVA_MAX_CONNECTIONS,
+        max_keepalive_connections=SCANOVA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=SCANOVA_KEEPALIVE_EXPIRY,
+        http2=SCANOVA_HTTP2,
+        max_tenant_sessions=SCANOVA_MAX_TENANT_SESSIONS,
+        cache=None,
+        images=None,
+        index=None,
+        retry=None,
+    ):
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        http2 = http2 and importlib.util.find_spec("h2") is not None
+        timeout = httpx.Timeout(
+            connect=SCANOVA_CONNECT_TIMEOUT,
+            read=SCANOVA_READ_TIMEOUT,
+            write=SCANOVA_WRITE_TIMEOUT,
+            pool=SCANOVA_POOL_TIMEOUT,
+        )
+        self._http = httpx.AsyncClient(
+            base_url=base_url, transport=transport, limits=limits, http2=http2, timeout=timeout
+        )
+        self.retry = retry or RetryPolicy()
+        self.breakers = {}
+        self.flights = SingleFlight()
+        self._sessions = OrderedDict()
+        self._max_sessions = max_tenant_sessions
+        self.stats = PoolStats()
+        self.cache = cache if cache is not None else get_response_cache()
+        self.images = images if images is not None else get_image_cache()
+        self.index = index if index is not None else get_search_index()
+        # Invalidations are numbered in order; _invalidated_at keeps the number
+        # of each tenant's last one (bounded like the tenant sessions) and
+        # _forgotten_at the highest number dropped from it
+        self._invalidations = 0
+        self._invalidated_at = OrderedDict()
+        self._forgotten_at = 0
+
+    async def aclose(self):
+        """Close the underlying connection pool."""
+        self._sessions.clear()
+        await self._http.aclose()
+
+    def add_stats_hook(self, hook):
+        """
+        Register a callback invoked after every upstream call.
+
+        Args:
+            hook (callable): Called as ``hook(method, path, status, elapsed, reused)``;
+                ``status`` is None when the request failed without a response.
+        """
+        self.stats.hooks.append(hook)
+
+    def session(self, api_key):
+        """
+        Return the TenantSession for an API key, creating it on first use.
+
+        Sessions are kept in LRU order and bounded by ``max_tenant_sessions``.
+        """
+        tenant = current_tenant.get()
+        if tenant is not None and tenant.api_key == api_key:
+            return tenant
+        key_hash = hash_api_key(api_key)
+        session = self._sessions.get(key_hash)
+        if session is None:
+            session = self._sessions[key_hash] = TenantSession(api_key)
+            if len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key_hash)
+        return session
+
+    def breaker(self, host):
+        """Return the CircuitBreaker of an upstream host, creating it on first use."""
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker()
+        return breaker
+
+    async def _request(self, method, path, api_key, params=None, json=None, stream=False):
+        timer = upstream_timer.get()
+        if timer is None:
+            return await self._request_with_retries(method, path, api_key, params, json, stream)
+        with timer:
+            return await self._request_with_retries(method, path, api_key, params, json, stream)
+
+    async def _request_with_retries(self, method, path, api_key, params, json, stream):
+        # Idempotent requests are retried after transient failures (connection
+        # errors, timeouts, 429 and 502-504), any request after failing to connect.
+        # With stream=True the body is not read; the caller must close the response.
+        request = self._http.build_request(
+            method, path,
+            headers=self.session(api_key).headers,
+            params=params,
+            json=json,
+        )
+        breaker = self.breaker(request.url.host)
+        retries = self.retry.max_retries
+        last_response.set(None)
+        for attempt in range(retries + 1):
+            breaker.before_request(request.url.host)
+            try:
+                resp = await self._send(request, stream)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt == retries or not (method in IDEMPOTENT_METHODS or isinstance(e, NOT_SENT_ERRORS)):
+                    raise
+                await asyncio.sleep(self.retry.backoff(attempt))
+                continue
+
+            if resp.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if attempt == retries or resp.status_code not in RETRY_STATUSES or method not in IDEMPOTENT_METHODS:
+                return resp
+            delay = parse_retry_after(resp)
+            if delay is None:
+                delay = self.retry.backoff(attempt)
+            elif delay > self.retry.max_delay:
+                # Longer than we are willing to hold the caller; let it decide
+                return resp
+            await resp.aclose()
+            await asyncio.sleep(delay)
+        return resp
+
+    async def _send(self, request, stream):
+        connected = False
+
+        async def trace(event, info):
+            nonlocal connected
+            if event == "connection.connect_tcp.started":
+                connected = True
+
+        request.extensions["trace"] = trace
+        status = None
+        started = time.perf_counter()
+        with tracing.span(f"scanova {request.method}") as span:
+            if span.recording:
+                span.set_attribute("http.request.method", request.method)
+                span.set_attribute("url.path", request.url.path)
+                # Lets the Scanova side join the caller's trace
+                request.headers["traceparent"] = span.traceparent
+            try:
+                resp = await self._http.send(request, stream=stream)
+                status = resp.status_code
+                last_response.set(resp)
+                if span.recording:
+                    span.set_attribute("http.response.status_code", status)
+                    size = resp.headers.get("content-length") if stream else len(resp.content)
+                    if size is not None:
+                        span.set_attribute("http.response.body.size", int(size))
+                    if status >= 500:
+                        span.set_error(f"HTTP {status}")
+                return resp
+            finally:
+                self.stats.record(request.method, request.url.path, status, time.perf_counter() - started, not connected)
+
+    async def _json(self, method, path, api_key, params=None, json=None):
+        try:
+            resp = await self._request(method, path, api_key, params=params, json=json)
+        except httpx.HTTPError as e:
+            return {"error": f"API request failed: {str(e)}"}
+        return response_result(resp)
+
+    async def _shared_json(self, path, api_key, params=None):
+        # Identical GETs of one tenant in flight at the same time share one upstream call
+        tenant = self.session(api_key).key_hash
+        query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None))
+
+        async def fetch():
+            result = await self._json("GET", path, api_key, params=params)
+            return result, last_response.get()
+
+        key = f"{tenant}|GET|{path}|{query}"
+        timer = upstream_timer.get()
+        if timer is None:
+            result, resp = await self.flights.do(key, fetch, _share_json)
+        else:
+            # A coalesced caller spends this time waiting on the shared upstream call
+            with timer:
+                result, resp = await self.flights.do(key, fetch, _share_json)
+        last_response.set(resp)
+        return result
+
+    async def _cached_json(self, path, api_key, params=None):
+        # Read-through GET: serve from the response cache, store successful responses
+        if self.cache is None:
+            return await self._shared_json(path, api_key, params=params)
+
+        tenant = self.session(api_key).key_hash
+        key = self.cache.key(tenant, path, params)
+        result = self.cache.get(key)
+        if result is None:
+            started = self._invalidations
+            result = await self._shared_json(path, api_key, params=params)
+            resp = last_response.get()
+            if (
+                resp is not None and resp.is_success and not (isinstance(result, dict) and "error" in result)
+                # A write that invalidated the tenant meanwhile may have made the result stale
+                and not self._invalidated_since(tenant, started)
+            ):
+                self.cache.set(key, result)
+        return result
+
+    def _invalidated_since(self, tenant, number):
+        return max(self._invalidated_at.get(tenant, 0), self._forgotten_at) > number
+
+    def _invalidate(self, api_key, qrid=None):
+        # Writes drop the tenant's cached listings and, for an existing QR code, its
+        # details, and keep reads already in flight from storing what they fetched
+        tenant = self.session(api_key).key_hash
+        self._invalidations += 1
+        self._invalidated_at[tenant] = self._invalidations
+        self._invalidated_at.move_to_end(tenant)
+        if len(self._invalidated_at) > self._max_sessions:
+            _, self._forgotten_at = self._invalidated_at.popitem(last=False)
+        self.flights.forget(f"{tenant}|")
+        if self.cache is None:
+            return
+        self.cache.invalidate(tenant, "qrcode/")
+        if qrid:
+            self.cache.invalidate(tenant, f"qrcode/{qrid}/")
+
+    def _written(self, api_key, result, qrid=None, changes=None):
+        # Writes drop stale cached reads and update the local search index in place
+        self._invalidate(api_key, qrid)
+        resp = last_response.get()
+        if (
+            self.index is None or resp is None or not resp.is_success
+            or not isinstance(result, dict) or "error" in result
+        ):
+            return
+        self.index.record_write(self.session(api_key).key_hash, result, qrid, changes)
+
+    async def create_qr_code(self, params=None, api_key=None):
+        """
+        Create a new QR code.
+
+        Args:
+            params (dict): QR code parameters, must include an 'info' field.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API containing the created QR code details.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if params is None or 'info' not in params:
+            return {"error": "Parameters with 'info' field are required for QR code creation"}
+
+        result = await self._json("POST", "qrcode/", api_key, json=params)
+        self._written(api_key, result)
+        return result
+
+    async def validate_api_key(self, api_key, url=None):
+        """
+        Check an API key with one small authenticated request, bypassing the caches.
+
+        Args:
+            api_key (str): Scanova API key to check.
+            url (str, optional): Absolute URL to check it against instead of
+                the QR code list, e.g. a userinfo endpoint of the OAuth server.
+
+        Returns:
+            bool | None: True if the key was accepted, False if it was rejected
+            (401 or 403), None if that could not be told (connection error,
+            rate limiting, server error).
+        """
+        try:
+            resp = await self._request("GET", url or "qrcode/", api_key, params=None if url else {"limit": 1})
+        except httpx.HTTPError:
+            return None
+        if resp.status_code in (401, 403):
+            return False
+        return True if resp.is_success else None
+
+    async def list_qr_codes(self, params=None, api_key=None):
+        """
+        Retrieve a list of QR codes.
+
+        Args:
+            params (dict): Query parameters for filtering and pagination.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API containing the list of QR codes.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        return await self._cached_json("qrcode/", api_key, params=params)
+
+    async def update_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Update an existing QR code with new parameters.
+
+        Args:
+            qrid (str): The ID of the QR code to update.
+            params (dict): Parameters for QR code update.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API containing the updated QR code details.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for update operation"}
+
+        if not params:
+            return {"error": "Parameters are required for QR code update"}
+
+        result = await self._json("PUT", f"qrcode/{qrid}/", api_key, json=params)
+        self._written(api_key, result, qrid, params)
+        if self.images is not None:
+            self.images.invalidate(self.session(api_key).key_hash, qrid)
+        return result
+
+    async def retrieve_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Retrieve a single QR code.
+
+        Args:
+            qrid (str): The ID of the QR code to retrieve.
+            params (dict, optional): Additional parameters.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API containing the QR code details.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for retrieve operation"}
+
+        return await self._cached_json(f"qrcode/{qrid}/", api_key, params=params)
+
+    async def download_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Download a QR code image.
+
+        Args:
+            qrid (str): The ID of the QR code to download.
+            params (dict, optional): Download parameters (size, format, etc.).
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: Response containing download information or error. Images up to
+            DOWNLOAD_INLINE_MAX_BYTES include their bytes base64-encoded in "data";
+            for larger ones the transfer is stopped early and "data" is omitted.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for download operation"}
+
+        stem = await self.image_stem(qrid, params, api_key=api_key)
+        path = self.images.get(stem) if stem else None
+        if path is not None:
+            return self._cached_download(path)
+
+        try:
+            resp = await self.stream_qr_code(qrid, params, api_key=api_key)
+        except httpx.HTTPError as e:
+            return {"error": f"API request failed: {str(e)}"}
+
+        try:
+            if resp.status_code != 200:
+                await resp.aread()
+                return response_result(resp)
+
+            content_type = resp.headers.get('content-type')
+            too_large = {
+                "success": True,
+                "message": "QR code image is too large to return inline",
+                "content_type": content_type,
+                "size": int(resp.headers.get("content-length", 0)) or None,
+            }
+            if (too_large["size"] or 0) > DOWNLOAD_INLINE_MAX_BYTES:
+                return too_large
+
+            data = bytearray()
+            async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                data += chunk
+                if len(data) > DOWNLOAD_INLINE_MAX_BYTES:
+                    return too_large
+            if stem:
+                self.images.put(stem, content_type, data)
+            return {
+                "success": True,
+                "message": "QR code download successful",
+                "content_type": content_type,
+                "size": len(data),
+                "data": base64.b64encode(data).decode("ascii"),
+            }
+        except (httpx.HTTPError, ValueError) as e:
+            return {"error": f"API request failed: {str(e)}"}
+        finally:
+            await resp.aclose()
+
+    def _cached_download(self, path):
+        size = path.stat().st_size
+        result = {
+            "success": True,
+            "message": "QR code download successful",
+            "content_type": content_type_for(path),
+            "size": size,
+        }
+        if size > DOWNLOAD_INLINE_MAX_BYTES:
+            result["message"] = "QR code image is too large to return inline"
+        else:
+            result["data"] = base64.b64encode(path.read_bytes()).decode("ascii")
+        return result
+
+    async def cache_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Download a QR code image straight into the image cache.
+
+        Unlike download_qr_code, the image is streamed to disk whatever its
+        size (up to DOWNLOAD_MAX_BYTES) and never held in memory or
+        base64-encoded; it is then served by GET /download/{qrid}.
+
+        Args:
+            qrid (str): The ID of the QR code to download.
+            params (dict, optional): Download parameters (size, format, etc.).
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: "content_type", "size" and whether the image is "cached"
+            (False when the image cache is disabled, in which case nothing is
+            downloaded), or an error.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for download operation"}
+
+        if self.images is None:
+            return {"success": True, "message": "Image cache disabled, image not downloaded", "cached": False}
+
+        qr = await self.retrieve_qr_code(qrid, api_key=api_key)
+        if not isinstance(qr, dict) or "error" in qr:
+            return qr if isinstance(qr, dict) else {"error": f"QR code {qrid} not found"}
+        stem = self.images.stem(self.session(api_key).key_hash, qrid, params, qr.get("updated"))
+        path = self.images.get(stem)
+        if path is not None:
+            return {
+                "success": True,
+                "message": "QR code image cached",
+                "content_type": content_type_for(path),
+                "size": path.stat().st_size,
+                "cached": True,
+            }
+
+        try:
+            resp = await self.stream_qr_code(qrid, params, api_key=api_key)
+        except httpx.HTTPError as e:
+            return {"error": f"API request failed: {str(e)}"}
+
+        writer = None
+        try:
+            if resp.status_code != 200:
+                await resp.aread()
+                return response_result(resp)
+
+            content_type = resp.headers.get('content-type')
+            if int(resp.headers.get("content-length", 0)) > DOWNLOAD_MAX_BYTES:
+                return {"error": f"QR code export exceeds {DOWNLOAD_MAX_BYTES} bytes"}
+            writer = self.images.writer(stem, content_type)
+            async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                if writer.size + len(chunk) > DOWNLOAD_MAX_BYTES:
+                    return {"error": f"QR code export exceeds {DOWNLOAD_MAX_BYTES} bytes"}
+                writer.write(chunk)
+            writer.commit()
+            size, writer = writer.size, None
+            return {
+                "success": True,
+                "message": "QR code image cached",
+                "content_type": content_type,
+                "size": size,
+                "cached": True,
+            }
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            return {"error": f"API request failed: {str(e)}"}
+        finally:
+            if writer is not None:
+                writer.abort()
+            await resp.aclose()
+
+    async def image_stem(self, qrid, params=None, api_key=None):
+        """
+        Return the image cache entry name for a download, or None when the
+        image cache is disabled or the QR code's version cannot be looked up.
+
+        The version is the QR code's ``updated`` timestamp from
+        retrieve_qr_code, so an image is never served for an older revision.
+        """
+        if self.images is None:
+            return None
+        qr = await self.retrieve_qr_code(qrid, api_key=api_key)
+        if not isinstance(qr, dict) or "error" in qr:
+            return None
+        return self.images.stem(self.session(api_key).key_hash, qrid, params, qr.get("updated"))
+
+    async def stream_qr_code(self, qrid, params=None, api_key=None):
+        """
+        Start downloading a QR code image without reading its body.
+
+        Args:
+            qrid (str): The ID of the QR code to download.
+            params (dict, optional): Download parameters (size, format, etc.).
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            httpx.Response: The open upstream response; iterate ``aiter_bytes()``
+            and always ``aclose()`` it.
+
+        Raises:
+            httpx.HTTPError: If the request fails before a response arrives.
+        """
+        return await self._request("GET", f"qrcode/{qrid}/download", api_key, params=params, stream=True)
+
+    async def activate_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Activate a QR code.
+
+        Args:
+            qrid (str): The ID of the QR code to activate.
+            params (dict, optional): Additional parameters.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for activate operation"}
+
+        if params is None:
+            params = {"is_active": True}
+
+        result = await self._json("PATCH", f"qrcode/{qrid}/", api_key, json=params)
+        self._written(api_key, result, qrid, params)
+        return result
+
+    async def deactivate_qr_code(self, qrid=None, params=None, api_key=None):
+        """
+        Deactivate a QR code.
+
+        Args:
+            qrid (str): The ID of the QR code to deactivate.
+            params (dict, optional): Additional parameters.
+            api_key (str): Scanova API key from the MCP client
+
+        Returns:
+            dict: JSON response from the Scanova API.
+        """
+        if not api_key:
+            return {"error": API_KEY_REQUIRED}
+
+        if not qrid:
+            return {"error": "QR code ID is required for deactivate operation"}
+
+        if params is None:
+            params = {"is_active": False}
+
+        result = await self._json("PATCH", f"qrcode/{qrid}/", api_key, json=params)
+        self._written(api_key, result, qrid, params)
+        return result
+
+
+# One client per event loop: httpx connection pools cannot be shared across loops,
+# and the sync wrappers run on their own loop (see run_sync).
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """
+    Return the ScanovaClient bound to the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = ScanovaClient()
+    return client
+
+
+async def close_client():
+    """
+    Close the ScanovaClient bound to the running event loop, if any.
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+_runner_loop = None
+_runner_lock = threading.Lock()
+
+
+def _get_runner_loop():
+    global _runner_loop
+    with _runner_lock:
+        if _runner_loop is None:
+            _runner_loop = asyncio.new_event_loop()
+            threading.Thread(target=_runner_loop.run_forever, name="scanova-client", daemon=True).start()
+            atexit.register(_close_runner_loop)
+    return _runner_loop
+
+
+def _close_runner_loop():
+    asyncio.run_coroutine_threadsafe(close_client(), _runner_loop).result(timeout=5)
+    _runner_loop.call_soon_threadsafe(_runner_loop.stop)
+
+
+def run_sync(operation, *args, **kwargs):
+    """
+    Run a ScanovaClient operation from synchronous code.
+
+    The coroutine is executed on a dedicated background event loop, so this is
+    safe to call both from plain threads and from inside another running loop
+    (e.g. FastMCP sync tools).
+
+    Args:
+        operation (str | callable): Name of the ScanovaClient method, e.g. "list_qr_codes",
+            or a coroutine function taking the client as its first argument.
+        *args: Positional arguments for the operation.
+        **kwargs: Keyword arguments for the operation.
+
+    Returns:
+        dict: The operation's result.
+    """
+    async def call():
+        client = get_client()
+        if isinstance(operation, str):
+            return await getattr(client, operation)(*args, **kwargs)
+        return await operation(client, *args, **kwargs)
+
+    return asyncio.run_coroutine_threadsafe(call(), _get_runner_loop()).result()
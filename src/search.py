@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+
+from config import LIST_PAGE_SIZE, SEARCH_INDEX_SYNC_INTERVAL, SEARCH_MAX_RESULTS
+from listing import ListingError, iter_qr_codes, matches
+from scanova_client import API_KEY_REQUIRED
+from serialization import project
+
+log = logging.getLogger('mcp')
+
+# Running index syncs by tenant, so a tenant never has two at once
+_syncs = {}
+
+
+async def sync_search_index(client, api_key=None):
+    """
+    Bring a tenant's local search index up to date with the Scanova API.
+
+    Pages through the account with iter_qr_codes; only QR codes that changed
+    since the last sync are rewritten, and QR codes that no longer exist
+    upstream are dropped once the whole account was seen.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: Number of QR codes seen and changed, or an error dict.
+    """
+    tenant_index = client.index.tenant(client.session(api_key).key_hash)
+    started = time.time()
+    seen = changed = 0
+    batch = []
+    try:
+        async with aclosing(iter_qr_codes(client, api_key=api_key)) as items:
+            async for item in items:
+                batch.append(item)
+                if len(batch) >= LIST_PAGE_SIZE:
+                    changed += tenant_index.upsert_many(batch)
+                    seen += len(batch)
+                    batch = []
+        changed += tenant_index.upsert_many(batch)
+        seen += len(batch)
+    except ListingError as e:
+        tenant_index.finish_sync(started, error=str(e.result.get("error")))
+        return e.result
+    tenant_index.finish_sync(started)
+    return {"seen": seen, "changed": changed, "seconds": time.time() - started}
+
+
+def start_sync(client, api_key):
+    """
+    Start a background sync of the caller's index unless one is running.
+
+    Returns:
+        asyncio.Task: The running sync.
+    """
+    tenant = client.session(api_key).key_hash
+    task = _syncs.get(tenant)
+    if task is None:
+        task = _syncs[tenant] = asyncio.ensure_future(_run_sync(client, api_key))
+        task.add_done_callback(lambda _: _syncs.pop(tenant, None))
+    return task
+
+
+async def _run_sync(client, api_key):
+    try:
+        return await sync_search_index(client, api_key=api_key)
+    except Exception as e:
+        log.error(f"Search index sync failed: {str(e)}")
+        return {"error": f"Search index sync failed: {str(e)}"}
+
+
+def _staleness(state, syncing):
+    synced_at = state["synced_at"]
+    return {
+        "count": state["count"],
+        "synced_at": datetime.fromtimestamp(synced_at, timezone.utc).isoformat() if synced_at else None,
+        "age_seconds": round(time.time() - synced_at, 1) if synced_at else None,
+        "syncing": syncing,
+        "last_error": state["error"],
+    }
+
+
+async def search_qr_codes(client, query=None, filters=None, fields=None, limit=None, api_key=None):
+    """
+    Search the caller's QR codes in the local index.
+
+    The first search of a tenant waits for a full sync; afterwards searches
+    answer from the index immediately and a background sync is started when
+    it is older than SEARCH_INDEX_SYNC_INTERVAL. When the index is disabled
+    the query is forwarded to the Scanova list endpoint instead.
+
+    Args:
+        client (ScanovaClient): Client used for the upstream calls.
+        query (str, optional): Words to find, matched as prefixes in any field;
+            "name:menu" searches one field (name, url, category, qr_type, text).
+        filters (dict, optional): Field paths and the values they must equal.
+        fields (list, optional): Fields to keep for each QR code.
+        limit (int, optional): Maximum number of results (1 to SEARCH_MAX_RESULTS).
+        api_key (str): Scanova API key from the MCP client
+
+    Returns:
+        dict: {"count": ..., "results": [...], "index": {...staleness...}}, or an error dict.
+    """
+    if not api_key:
+        return {"error": API_KEY_REQUIRED}
+
+    # Clamped to 1..SEARCH_MAX_RESULTS: a negative LIMIT means no limit to SQLite
+    limit = max(1, min(limit or SEARCH_MAX_RESULTS, SEARCH_MAX_RESULTS))
+    if client.index is None:
+        params = {"limit": limit}
+        if query:
+            params["search"] = query
+        result = await client.list_qr_codes(params, api_key=api_key)
+        if not isinstance(result, dict) or not isinstance(result.get("results"), list):
+            return result
+        results = [project(item, fields) for item in result["results"] if matches(item, filters)]
+        return {"count": len(results), "results": results, "index": None}
+
+    tenant_index = client.index.tenant(client.session(api_key).key_hash)
+    state = tenant_index.state()
+    if state["synced_at"] is None:
+        # Shielded so a caller timing out does not cancel the shared sync
+        result = await asyncio.shield(start_sync(client, api_key))
+        if "error" in result:
+            return result
+        state = tenant_index.state()
+    elif time.time() - state["synced_at"] > SEARCH_INDEX_SYNC_INTERVAL:
+        start_sync(client, api_key)
+
+    results = [project(item, fields) for item in tenant_index.search(query, filters, limit)]
+    return {
+        "count": len(results),
+        "results": results,
+        "index": _staleness(state, client.session(api_key).key_hash in _syncs),
+    }
@@ -0,0 +1,252 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from config import SEARCH_INDEX_DIR, SEARCH_INDEX_ENABLED, SEARCH_INDEX_MAX_OPEN
+
+# Full-text columns; queries may target one with "column:term"
+FTS_COLUMNS = ("name", "url", "category", "qr_type", "text")
+
+_TERM = re.compile(r"(?:(\w+):)?(\w+)")
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def _document(qr):
+    info = qr.get("info") if isinstance(qr.get("info"), dict) else {}
+    return (
+        str(qr.get("name") or ""),
+        str(info.get("url") or ""),
+        str(qr.get("category") or ""),
+        str(qr.get("qr_type") or ""),
+        " ".join(_strings(qr)),
+    )
+
+
+def fts_query(query):
+    """
+    Translate a free-text query into an FTS5 MATCH expression.
+
+    Every word must match as a prefix (``men`` finds "menu"); ``name:menu``
+    restricts a word to one column. Other FTS syntax is not passed through.
+    """
+    terms = []
+    for column, word in _TERM.findall(query or ""):
+        term = f'"{word}"*'
+        terms.append(f"{column}:{term}" if column in FTS_COLUMNS else term)
+    return " ".join(terms)
+
+
+class TenantIndex:
+    """
+    SQLite database holding one tenant's QR codes and their FTS5 index.
+
+    QR codes are stored as JSON in ``qrcodes``; ``qrcodes_fts`` shares its
+    rowids. ``indexed_at`` lets a sync drop QR codes it did not see without
+    removing ones written by this server while it was running.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS qrcodes ("
+            "id INTEGER PRIMARY KEY, qrid TEXT UNIQUE NOT NULL, data TEXT NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        self._db.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS qrcodes_fts USING fts5({', '.join(FTS_COLUMNS)})")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), synced_at REAL, error TEXT)"
+        )
+        self._lock = threading.Lock()
+
+    def _put(self, qrid, data, now):
+        row = self._db.execute("SELECT id, data FROM qrcodes WHERE qrid = ?", (qrid,)).fetchone()
+        if row is not None and row[1] == data:
+            self._db.execute("UPDATE qrcodes SET indexed_at = ? WHERE id = ?", (now, row[0]))
+            return False
+        if row is None:
+            rowid = self._db.execute(
+                "INSERT INTO qrcodes (qrid, data, indexed_at) VALUES (?, ?, ?)", (qrid, data, now)
+            ).lastrowid
+        else:
+            rowid = row[0]
+            self._db.execute("UPDATE qrcodes SET data = ?, indexed_at = ? WHERE id = ?", (data, now, rowid))
+            self._db.execute("DELETE FROM qrcodes_fts WHERE rowid = ?", (rowid,))
+        self._db.execute(
+            f"INSERT INTO qrcodes_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, *_document(json.loads(data))),
+        )
+        return True
+
+    def upsert_many(self, items, now=None):
+        """
+        Store QR codes from a listing page; unchanged ones are only marked as seen.
+
+        Returns:
+            int: Number of QR codes added or changed.
+        """
+        now = now or time.time()
+        changed = 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for item in items:
+                    if isinstance(item, dict) and item.get("qrid") is not None:
+                        changed += self._put(str(item["qrid"]), json.dumps(item, sort_keys=True), now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return changed
+
+    def merge(self, qrid, fields):
+        """Apply a partial change to a stored QR code; unknown QR codes are added."""
+        with self._lock:
+            row = self._db.execute("SELECT data FROM qrcodes WHERE qrid = ?", (qrid,)).fetchone()
+            data = {**(json.loads(row[0]) if row else {"qrid": qrid}), **fields}
+            self._put(qrid, json.dumps(data, sort_keys=True), time.time())
+
+    def finish_sync(self, started, error=None):
+        """
+        Record the end of a sync. A complete sync also drops QR codes that no
+        longer exist upstream, i.e. every row not written since it started.
+        """
+        with self._lock:
+            if error is None:
+                stale = "SELECT id FROM qrcodes WHERE indexed_at < ?"
+                self._db.execute(f"DELETE FROM qrcodes_fts WHERE rowid IN ({stale})", (started,))
+                self._db.execute("DELETE FROM qrcodes WHERE indexed_at < ?", (started,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sync_state (id, synced_at, error) VALUES (1, ?, NULL)", (started,)
+                )
+            else:
+                self._db.execute(
+                    "INSERT INTO sync_state (id, synced_at, error) VALUES (1, NULL, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET error = excluded.error",
+                    (error,),
+                )
+
+    def state(self):
+        """
+        Returns:
+            dict: QR code count, time of the last complete sync and last sync error.
+        """
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM qrcodes").fetchone()[0]
+            row = self._db.execute("SELECT synced_at, error FROM sync_state WHERE id = 1").fetchone()
+        synced_at, error = row if row else (None, None)
+        return {"count": count, "synced_at": synced_at, "error": error}
+
+    def search(self, query=None, filters=None, limit=50):
+        """
+        Return stored QR codes matching ``query`` (see fts_query) and
+        ``filters`` (field paths and the scalar values they must equal), best
+        match first; without a query QR codes come in index order.
+        """
+        where, args = [], []
+        match = fts_query(query)
+        if match:
+            where.append("qrcodes_fts MATCH ?")
+            args.append(match)
+        for path, value in (filters or {}).items():
+            if value is None:
+                where.append("json_extract(q.data, ?) IS NULL")
+                args.append(f"$.{path}")
+            elif isinstance(value, (dict, list)):
+                where.append("json_extract(q.data, ?) = json(?)")
+                args.extend((f"$.{path}", json.dumps(value, sort_keys=True)))
+            else:
+                # JSON booleans come back from json_extract as 1 and 0
+                where.append("json_extract(q.data, ?) = ?")
+                args.extend((f"$.{path}", int(value) if isinstance(value, bool) else value))
+        sql = "SELECT q.data FROM qrcodes q"
+        if match:
+            sql += " JOIN qrcodes_fts ON qrcodes_fts.rowid = q.id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rank LIMIT ?" if match else " ORDER BY q.id LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, (*args, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SearchIndex:
+    """
+    Per-tenant local search indexes, one SQLite file per hashed API key
+    under SEARCH_INDEX_DIR. At most ``max_open`` databases stay open.
+    """
+
+    def __init__(self, directory=SEARCH_INDEX_DIR, max_open=SEARCH_INDEX_MAX_OPEN):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, tenant):
+        return self.directory / f"{tenant}.sqlite3"
+
+    def tenant(self, tenant, create=True):
+        """
+        Return the TenantIndex of ``tenant``, or None if it has none and
+        ``create`` is False.
+        """
+        with self._lock:
+            index = self._open.get(tenant)
+            if index is not None:
+                self._open.move_to_end(tenant)
+                return index
+            if not create and not self._path(tenant).exists():
+                return None
+            index = self._open[tenant] = TenantIndex(self._path(tenant))
+            while len(self._open) > self.max_open:
+                _, old = self._open.popitem(last=False)
+                old.close()
+            return index
+
+    def record_write(self, tenant, result, qrid=None, changes=None):
+        """
+        Update a tenant's index after a successful create, update, activate or
+        deactivate call. Tenants that never searched have no index and are skipped.
+        """
+        index = self.tenant(tenant, create=False)
+        if index is None:
+            return
+        if result.get("qrid") is not None:
+            index.merge(str(result["qrid"]), result)
+        elif qrid and changes:
+            index.merge(str(qrid), changes)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    Return the process-wide SearchIndex, or None when SEARCH_INDEX_ENABLED is off.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None and SEARCH_INDEX_ENABLED:
+            _default_index = SearchIndex()
+    return _default_index
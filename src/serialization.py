@@ -0,0 +1,119 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def dumps(obj):
+    """
+    Serialize ``obj`` to compact UTF-8 JSON bytes, using orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """
+    Parse JSON from bytes or str, using orjson when it is installed.
+
+    Raises:
+        ValueError: If ``data`` is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _pick(item, paths):
+    if not isinstance(item, dict):
+        return item
+    picked = {}
+    for path in paths:
+        *parents, leaf = path.split(".")
+        # A parent that is selected as a whole already includes this path
+        if any(".".join(parents[:depth]) in paths for depth in range(1, len(parents) + 1)):
+            continue
+        source = item
+        for part in parents:
+            source = source.get(part) if isinstance(source, dict) else None
+        if isinstance(source, dict) and leaf in source:
+            target = picked
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = source[leaf]
+    return picked
+
+
+def project(result, fields):
+    """
+    Keep only ``fields`` of a Scanova result.
+
+    Fields are top-level keys or dotted paths (``info.url``). For paginated
+    listings the projection applies to every entry of ``results`` while the
+    pagination keys are kept; error results are returned unchanged.
+
+    Args:
+        result (dict | list): Result returned by a tool.
+        fields (list): Field names or dotted paths to keep.
+
+    Returns:
+        dict | list: The projected result.
+    """
+    if not fields or (isinstance(result, dict) and "error" in result):
+        return result
+    fields = set(fields)
+    if isinstance(result, list):
+        return [_pick(item, fields) for item in result]
+    if isinstance(result, dict) and isinstance(result.get("results"), list):
+        return {**result, "results": [_pick(item, fields) for item in result["results"]]}
+    return _pick(result, fields)
+
+
+def tool_result(result, fields=None):
+    """
+    Build the MCP tools/call result for a tool's return value.
+
+    The value is returned both as JSON text content and as ``structuredContent``
+    (wrapped in ``{"result": ...}`` when it is not an object, as MCP requires).
+    ``{"error": ...}`` results are flagged with ``isError``. A downloaded image
+    (``data`` plus ``content_type``) is added as image or resource content.
+
+    Args:
+        result: The tool's return value.
+        fields (list, optional): Fields to keep, see ``project``.
+
+    Returns:
+        dict: The tools/call result.
+    """
+    result = project(result, fields)
+    content = []
+    if isinstance(result, dict) and "data" in result and result.get("content_type"):
+        # Downloaded image: the bytes go in their own content item, metadata stays JSON
+        content.append(media_content(result["data"], result["content_type"]))
+        result = {key: value for key, value in result.items() if key != "data"}
+    structured = result if isinstance(result, dict) else {"result": result}
+    content.insert(0, {"type": "text", "text": dumps(result).decode("utf-8")})
+    return {
+        "content": content,
+        "structuredContent": structured,
+        "isError": isinstance(result, dict) and "error" in result,
+    }
+
+
+def media_content(data, content_type):
+    """
+    Build the MCP content item for base64 ``data`` of type ``content_type``.
+
+    Raster images become ``image`` content; other formats (SVG, PDF, EPS) are
+    returned as an embedded resource blob, which clients save rather than render.
+    """
+    mime_type = content_type.split(";")[0].strip()
+    if mime_type.startswith("image/") and mime_type != "image/svg+xml":
+        return {"type": "image", "data": data, "mimeType": mime_type}
+    return {
+        "type": "resource",
+        "resource": {"uri": "scanova://qrcode/download", "mimeType": mime_type, "blob": data},
+    }
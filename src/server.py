@@ -1,6 +1,13 @@
 from mcp.server.fastmcp import FastMCP
 import json
-from qrcode import create_qr_code, list_qr_codes, update_qr_code, retrieve_qr_code, download_qr_code, activate_qr_code, deactivate_qr_code
+from qrcode import create_qr_code, list_qr_codes, update_qr_code, retrieve_qr_code, download_qr_code, preview_qr_code, activate_qr_code, deactivate_qr_code
+from qrcode import bulk_create_qr_codes, bulk_update_qr_codes, bulk_set_qr_active
+from qrcode import list_all_qr_codes, summarize_qr_codes, search_qr_codes
+from qrcode import start_job, get_job_status, cancel_job
+from tools import catalogue_tool
+from serialization import project, tool_result
+from mcp.types import ContentBlock
+from pydantic import TypeAdapter
 
 server = FastMCP()
 
@@ -8,36 +15,79 @@ server = FastMCP()
 def get_scanova_data(query: str) -> str:
     return "This is a test response"
 
-@server.tool("create_qr_code", description="Create a new QR code. Can be called with: create qr, make qr code, generate qr, new qr code, add qr code")
+@catalogue_tool(server, "create_qr_code")
 def create_qr_code_tool(params: dict = None):
     return create_qr_code(params)
 
-@server.tool("list_qr_codes", description="List QR codes. Can be called with: list qr codes, fetch qr list, get qr codes, show qr codes, display qr codes, last 5 qr codes, recent qr codes")
-def list_qr_codes_tool(page: int = 1, limit: int = 10, search: str = None):
+@catalogue_tool(server, "list_qr_codes")
+def list_qr_codes_tool(page: int = 1, limit: int = 10, search: str = None, fields: list[str] = None):
     params = {
         "page": page,
         "limit": limit
     }
     if search:
         params["search"] = search
-    return list_qr_codes(params)
+    return project(list_qr_codes(params), fields)
 
-@server.tool("update_qr_code", description="Update an existing QR code. Can be called with: update qr, modify qr code, edit qr code, change qr code")
+@catalogue_tool(server, "update_qr_code")
 def update_qr_code_tool(qrid: str = None, params: dict = None):
     return update_qr_code(qrid, params)
 
-@server.tool("retrieve_qr_code", description="Get details of a specific QR code. Can be called with: get qr details, fetch qr code, show qr info, qr code info")
-def retrieve_qr_code_tool(qrid: str = None):
-    return retrieve_qr_code(qrid)
+@catalogue_tool(server, "retrieve_qr_code")
+def retrieve_qr_code_tool(qrid: str = None, fields: list[str] = None):
+    return project(retrieve_qr_code(qrid), fields)
 
-@server.tool("download_qr_code", description="Download QR code image. Can be called with: download qr, get qr image, save qr code, export qr code")
-def download_qr_code_tool(qrid: str = None):
-    return download_qr_code(qrid)
+@catalogue_tool(server, "download_qr_code")
+def download_qr_code_tool(qrid: str = None, params: dict = None):
+    # Return the image as MCP image/resource content rather than JSON text
+    content = tool_result(download_qr_code(qrid, params))["content"]
+    return TypeAdapter(list[ContentBlock]).validate_python(content)
 
-@server.tool("activate_qr_code", description="Activate a QR code. Can be called with: activate qr, enable qr code, turn on qr code, make qr active")
+@catalogue_tool(server, "preview_qr_code")
+def preview_qr_code_tool(data: str, format: str = "png", error_correction: str = "M", scale: int = 4, border: int = 4):
+    content = tool_result(preview_qr_code(data, format, error_correction, scale, border))["content"]
+    return TypeAdapter(list[ContentBlock]).validate_python(content)
+
+@catalogue_tool(server, "activate_qr_code")
 def activate_qr_code_tool(qrid: str = None):
     return activate_qr_code(qrid)
 
-@server.tool("deactivate_qr_code", description="Deactivate a QR code. Can be called with: deactivate qr, disable qr code, turn off qr code, make qr inactive")
+@catalogue_tool(server, "deactivate_qr_code")
 def deactivate_qr_code_tool(qrid: str = None):
     return deactivate_qr_code(qrid)
+
+@catalogue_tool(server, "bulk_create_qr_codes")
+def bulk_create_qr_codes_tool(items: list[dict]):
+    return bulk_create_qr_codes(items)
+
+@catalogue_tool(server, "bulk_update_qr_codes")
+def bulk_update_qr_codes_tool(items: list[dict]):
+    return bulk_update_qr_codes(items)
+
+@catalogue_tool(server, "bulk_set_qr_active")
+def bulk_set_qr_active_tool(qrids: list[str], is_active: bool = True):
+    return bulk_set_qr_active(qrids, is_active)
+
+@catalogue_tool(server, "list_all_qr_codes")
+def list_all_qr_codes_tool(filters: dict = None, search: str = None, fields: list[str] = None, max_items: int = None):
+    return list_all_qr_codes(filters, search, fields, max_items)
+
+@catalogue_tool(server, "summarize_qr_codes")
+def summarize_qr_codes_tool(filters: dict = None, search: str = None, group_by: list[str] = None):
+    return summarize_qr_codes(filters, search, group_by)
+
+@catalogue_tool(server, "search_qr_codes")
+def search_qr_codes_tool(query: str = None, filters: dict = None, fields: list[str] = None, limit: int = None):
+    return search_qr_codes(query, filters, fields, limit)
+
+@catalogue_tool(server, "start_job")
+def start_job_tool(kind: str, params: dict = None):
+    return start_job(kind, params)
+
+@catalogue_tool(server, "get_job_status")
+def get_job_status_tool(job_id: str = None, include_results: bool = False, offset: int = 0, limit: int = 100):
+    return get_job_status(job_id, include_results, offset, limit)
+
+@catalogue_tool(server, "cancel_job")
+def cancel_job_tool(job_id: str):
+    return cancel_job(job_id)
@@ -0,0 +1,166 @@
+"""
+Streamable HTTP sessions of the /mcp endpoint.
+
+``initialize`` creates a session and its id is returned in the
+``Mcp-Session-Id`` header; the client sends it back on every later request.
+A session keeps what was settled at initialization: the API key the client
+authenticated with (later requests may omit it), the negotiated protocol
+version and the client's name. Sessions are kept in LRU order, bounded by
+count and dropped after an idle timeout; a request for a session that is gone
+gets 404, after which the client initializes again.
+
+initialize needs no credentials, so sessions without a validated API key are
+kept apart under a smaller bound: a flood of anonymous initializes evicts
+other anonymous sessions, never those of authenticated clients.
+"""
+import secrets
+import time
+from collections import OrderedDict
+
+from config import MCP_MAX_ANONYMOUS_SESSIONS, MCP_MAX_SESSIONS, MCP_SESSION_IDLE_TIMEOUT
+from scanova_client import hash_api_key
+
+
+class McpSession:
+    """
+    State of one MCP client session.
+    """
+
+    __slots__ = ("id", "api_key", "key_hash", "protocol_version", "client_name", "created", "last_seen", "requests")
+
+    def __init__(self, session_id, api_key, protocol_version, client_name):
+        self.id = session_id
+        self.api_key = None
+        self.key_hash = None
+        self.protocol_version = protocol_version
+        self.client_name = client_name
+        self.created = self.last_seen = time.monotonic()
+        self.requests = 0
+        if api_key:
+            self.bind(api_key)
+
+    def bind(self, api_key):
+        """Attach the credentials of a session initialized without them."""
+        self.api_key = api_key
+        self.key_hash = hash_api_key(api_key)
+
+    def accepts(self, api_key):
+        """Whether a request with ``api_key`` (or none) may use this session."""
+        return not api_key or self.key_hash is None or hash_api_key(api_key) == self.key_hash
+
+
+class SessionStore:
+    """
+    In-memory sessions in least-recently-used order.
+
+    Sessions with a validated API key and anonymous ones are bounded
+    separately, by ``max_sessions`` and ``max_anonymous``; the oldest session
+    of a pool is dropped when its bound is exceeded. Sessions idle for
+    ``idle_timeout`` seconds are dropped when the store is next used. Each
+    session takes a few hundred bytes.
+    """
+
+    def __init__(self, max_sessions=MCP_MAX_SESSIONS, idle_timeout=MCP_SESSION_IDLE_TIMEOUT, max_anonymous=MCP_MAX_ANONYMOUS_SESSIONS):
+        self.max_sessions = max_sessions
+        self.max_anonymous = max_anonymous
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._anonymous = OrderedDict()
+        self.created = 0
+        self.closed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions) + len(self._anonymous)
+
+    def _expire(self, now):
+        # Least recently used first, so the scan stops at the first live session
+        for pool in (self._sessions, self._anonymous):
+            while pool:
+                session = next(iter(pool.values()))
+                if now - session.last_seen < self.idle_timeout:
+                    break
+                pool.popitem(last=False)
+                self.expired += 1
+
+    def _add(self, session):
+        pool, bound = (self._sessions, self.max_sessions) if session.key_hash else (self._anonymous, self.max_anonymous)
+        pool[session.id] = session
+        while len(pool) > bound:
+            pool.popitem(last=False)
+            self.evicted += 1
+
+    def create(self, api_key=None, protocol_version=None, client_name=None):
+        """
+        Start a session.
+
+        Args:
+            api_key (str, optional): Validated Scanova API key sent with
+                initialize; without one the session is anonymous.
+            protocol_version (str, optional): Negotiated MCP protocol version.
+            client_name (str, optional): ``clientInfo.name`` of the client.
+
+        Returns:
+            McpSession: The new session; its ``id`` goes in Mcp-Session-Id.
+        """
+        self._expire(time.monotonic())
+        session = McpSession(secrets.token_hex(16), api_key, protocol_version, client_name)
+        self._add(session)
+        self.created += 1
+        return session
+
+    def get(self, session_id):
+        """
+        Return the live session with ``session_id`` and mark it used, or None.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        for pool in (self._sessions, self._anonymous):
+            session = pool.get(session_id)
+            if session is not None:
+                session.last_seen = now
+                session.requests += 1
+                pool.move_to_end(session_id)
+                return session
+        return None
+
+    def bind(self, session, api_key):
+        """
+        Attach a validated API key to an anonymous session, moving it to the
+        authenticated sessions.
+        """
+        if self._anonymous.pop(session.id, None) is None:
+            return
+        session.bind(api_key)
+        self._add(session)
+
+    def close(self, session_id):
+        """
+        End a session at the client's request.
+
+        Returns:
+            bool: Whether the session existed.
+        """
+        if self._sessions.pop(session_id, None) is None and self._anonymous.pop(session_id, None) is None:
+            return False
+        self.closed += 1
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            dict: Live sessions (anonymous ones also on their own) and how many
+            were created, closed, expired and evicted.
+        """
+        self._expire(time.monotonic())
+        return {
+            "active": len(self),
+            "anonymous": len(self._anonymous),
+            "max_sessions": self.max_sessions,
+            "max_anonymous": self.max_anonymous,
+            "created": self.created,
+            "closed": self.closed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
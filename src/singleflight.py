@@ -0,0 +1,66 @@
+import asyncio
+import copy
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one.
+
+    The first caller for a key (the leader) starts the call; callers arriving
+    with the same key while it runs (followers) wait for it and get their own
+    copy of its result (a deep copy unless the caller says how) instead of
+    making their own call. The call runs as a separate task, so a caller that
+    is cancelled does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, fn, share=copy.deepcopy):
+        """
+        Run ``fn()`` for ``key`` unless an identical call is already in flight.
+
+        Args:
+            key (str): Identity of the call.
+            fn (callable): Coroutine function taking no arguments.
+            share (callable): Makes a follower's copy of the result; only the
+                parts a caller may modify need copying.
+
+        Returns:
+            The result of the shared call.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.followers += 1
+            return share(await asyncio.shield(task))
+
+        self.leaders += 1
+        task = self._calls[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda _: self._calls.get(key) is task and self._calls.pop(key))
+        return await asyncio.shield(task)
+
+    def forget(self, prefix):
+        """
+        Stop sharing in-flight calls whose key starts with ``prefix``; later
+        callers start a new call. Used after writes so no caller joins a read
+        that started before the write. The forgotten calls still run to the
+        end and return their result to those already waiting; keeping that
+        result out of any cache is up to the caller.
+        """
+        for key in [key for key in self._calls if key.startswith(prefix)]:
+            del self._calls[key]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Calls made, calls coalesced into another and the share coalesced.
+        """
+        total = self.leaders + self.followers
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_ratio": self.followers / total if total else 0.0,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,176 @@
+"""
+Lightweight MCP server over stdio, for IDEs that start one process per session.
+
+Speaks newline-delimited JSON-RPC on stdin/stdout like FastMCP's stdio
+transport, but answers initialize and tools/list from the tool catalogue
+alone: the HTTP client and the tool implementations (with httpx, SQLite and
+the caches behind them) are imported on the first tools/call, and the MCP
+SDK, FastAPI and uvicorn are not imported at all. The Scanova API key is
+read from SCANOVA_API_KEY.
+
+Run with:
+    SCANOVA_API_KEY=... python src/stdio_server.py
+"""
+import asyncio
+import json
+import logging
+import sys
+
+from config import SCANOVA_API_KEY
+from progress import ProgressReporter, progress_reporter, progress_token
+from serialization import dumps, tool_result
+from tools import PROTOCOL_VERSIONS, SERVER_INFO, TOOLS, TOOL_HANDLERS
+
+log = logging.getLogger('mcp')
+
+TOOLS_LIST_RESULT = {"tools": TOOLS}
+
+
+def initialize_result(params):
+    requested = params.get("protocolVersion")
+    return {
+        "protocolVersion": requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0],
+        "capabilities": {"tools": {}},
+        "serverInfo": SERVER_INFO,
+    }
+
+
+def error_response(id, code, message):
+    return {"jsonrpc": "2.0", "id": id, "error": {"code": code, "message": message}}
+
+
+async def call_tool(id, params, notify=None):
+    """
+    Run a tools/call; the Scanova client is created on the first one.
+
+    Args:
+        id: The JSON-RPC request id.
+        params (dict): The tools/call params.
+        notify (callable, optional): Writes a notification to the client,
+            used for progress when the request carries a progressToken.
+
+    Returns:
+        dict: The JSON-RPC response.
+    """
+    from scanova_client import get_client
+
+    tool_name = params.get("name")
+    arguments = params.get("arguments") or {}
+    handler = TOOL_HANDLERS.get(tool_name) if isinstance(tool_name, str) else None
+    if handler is None:
+        return error_response(id, -32602, f"Unknown tool: {tool_name}")
+    errors = handler.validate(arguments)
+    if errors:
+        return error_response(id, -32602, f"Invalid params: {'; '.join(errors)}")
+    token = progress_token(params)
+    reporter = progress_reporter.set(ProgressReporter(token, notify) if token is not None and notify else None)
+    try:
+        result = await handler.call(get_client(), arguments, SCANOVA_API_KEY)
+    except Exception as e:
+        log.error(f"Tool execution error: {str(e)}")
+        return error_response(id, -32603, f"Tool execution error: {str(e)}")
+    finally:
+        progress_reporter.reset(reporter)
+    return {"jsonrpc": "2.0", "id": id, "result": tool_result(result, arguments.get("fields"))}
+
+
+async def handle_message(message, notify=None):
+    """
+    Handle a single JSON-RPC message; ``notify`` is passed on to call_tool.
+
+    Returns:
+        dict: The JSON-RPC response, or None for notifications.
+    """
+    if not isinstance(message, dict):
+        return error_response(None, -32600, "Invalid Request")
+    if "id" not in message:
+        # Notifications (initialized, cancelled, ...) need no answer
+        return None
+
+    id = message["id"]
+    method = message.get("method")
+    params = message.get("params")
+    if not isinstance(method, str):
+        return error_response(id, -32600, "Invalid Request")
+    if params is None:
+        params = {}
+    elif not isinstance(params, dict):
+        return error_response(id, -32602, "Invalid params: params must be an object")
+    if method == "initialize":
+        return {"jsonrpc": "2.0", "id": id, "result": initialize_result(params)}
+    if method == "ping":
+        return {"jsonrpc": "2.0", "id": id, "result": {}}
+    if method == "tools/list":
+        return {"jsonrpc": "2.0", "id": id, "result": TOOLS_LIST_RESULT}
+    if method == "tools/call":
+        return await call_tool(id, params, notify)
+    return error_response(id, -32601, f"Method not found: {method}")
+
+
+async def serve(stdin=None, stdout=None):
+    """
+    Answer JSON-RPC messages from ``stdin`` on ``stdout`` until stdin closes.
+
+    tools/call requests run concurrently, so a long bulk call does not hold
+    up other requests; everything else is answered in order.
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    loop = asyncio.get_running_loop()
+    running = set()
+
+    def write(response):
+        stdout.write(dumps(response) + b"\n")
+        stdout.flush()
+
+    async def handle(message):
+        # A failing message gets an error response instead of ending the server
+        try:
+            return await handle_message(message, write)
+        except Exception as e:
+            log.error(f"MCP message error: {str(e)}")
+            id = message.get("id") if isinstance(message, dict) else None
+            return error_response(id, -32603, f"Internal error: {str(e)}")
+
+    async def answer(message):
+        if message == []:
+            # An empty batch is answered with a single error, not an empty array
+            write(error_response(None, -32600, "Invalid Request"))
+            return
+        if isinstance(message, list):
+            responses = [r for r in await asyncio.gather(*(handle(m) for m in message)) if r is not None]
+        else:
+            responses = await handle(message)
+        if responses:
+            write(responses)
+
+    while True:
+        # A thread read works for pipes on every platform
+        line = await loop.run_in_executor(None, stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        try:
+            message = json.loads(line)
+        except ValueError:
+            write(error_response(None, -32700, "Parse error"))
+            continue
+        if isinstance(message, dict) and message.get("method") != "tools/call":
+            await answer(message)
+        else:
+            task = asyncio.ensure_future(answer(message))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.gather(*running)
+    if "jobs" in sys.modules:
+        # Running jobs go back to the queue and resume in the next session
+        await sys.modules["jobs"].get_job_runner().stop()
+    if "scanova_client" in sys.modules:
+        await sys.modules["scanova_client"].close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
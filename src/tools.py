@@ -0,0 +1,657 @@
+import asyncio
+import base64
+import time
+from contextlib import nullcontext
+from urllib.parse import quote, urlencode
+
+from config import BULK_TOOL_MAX_CONCURRENCY, BULK_TOOL_TIMEOUT, LIST_ALL_MAX_ITEMS, MCP_RESOURCE_URL, QR_PREVIEW_MAX_SCALE, SEARCH_MAX_RESULTS, TOOL_TIMEOUT
+
+# Bulk, listing, search, preview and job implementations are imported inside
+# their handlers, so loading the catalogue does not load the HTTP client (stdio cold start)
+
+# MCP protocol versions both servers speak, newest first; a client asking for
+# another version is answered with the newest
+PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+
+SERVER_INFO = {"name": "scanova-mcp", "version": "1.0.0"}
+
+READ_ONLY_TOOL_ANNOTATIONS_JSON = {
+    "readOnlyHint": True, "openWorldHint": True, "destructiveHint": False
+}
+WRITE_TOOL_ANNOTATIONS_JSON = {
+    "readOnlyHint": False, "openWorldHint": True, "destructiveHint": False
+}
+LOCAL_TOOL_ANNOTATIONS_JSON = {
+    "readOnlyHint": True, "openWorldHint": False, "destructiveHint": False
+}
+LOCAL_WRITE_TOOL_ANNOTATIONS_JSON = {
+    "readOnlyHint": False, "openWorldHint": False, "destructiveHint": False
+}
+
+# Optional projection argument of the read tools, applied by serialization.project
+FIELDS_PROPERTY = {
+    "type": "array",
+    "items": {"type": "string"},
+    "description": "Only return these fields of each QR code, e.g. [\"qrid\", \"name\", \"info.url\"]"
+}
+
+_JSON_TYPES = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+}
+
+
+def compile_schema(schema):
+    """
+    Compile the subset of JSON Schema used in tool inputSchemas into a validator.
+
+    Supports ``type``, ``enum``, ``properties``, ``required``, ``items`` and
+    ``additionalProperties: false``, which the catalogue sets on every
+    argument object so a misspelt argument is reported instead of silently
+    ignored. Other keywords (``default``, ``description``) are ignored. Null
+    values count as absent, matching how the tools treat missing arguments.
+
+    Returns:
+        callable: ``validate(value, path)`` returning a list of error strings.
+    """
+    expected = schema.get("type")
+    type_check = _JSON_TYPES.get(expected)
+    properties = {name: compile_schema(sub) for name, sub in schema.get("properties", {}).items()}
+    required = tuple(schema.get("required", ()))
+    items = compile_schema(schema["items"]) if "items" in schema else None
+    closed = schema.get("additionalProperties") is False
+    allowed = schema.get("enum")
+
+    def validate(value, path="arguments"):
+        if type_check is not None and not type_check(value):
+            return [f"{path} must be of type {expected}"]
+        if allowed is not None and value not in allowed:
+            return [f"{path} must be one of {', '.join(map(str, allowed))}"]
+        errors = []
+        if isinstance(value, dict):
+            if closed:
+                errors.extend(f"{path}.{name} is not a known property" for name in value if name not in properties)
+            for name in required:
+                if value.get(name) is None:
+                    errors.append(f"{path}.{name} is required")
+            for name, check in properties.items():
+                if value.get(name) is not None:
+                    errors.extend(check(value[name], f"{path}.{name}"))
+        elif items is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                errors.extend(items(item, f"{path}[{index}]"))
+        return errors
+
+    return validate
+
+
+class ToolHandler:
+    """
+    A catalogue tool bound to the function implementing it for tools/call.
+
+    The handler carries the tool definition, a validator precompiled from its
+    inputSchema, its limits (timeout, concurrent calls) and timing counters.
+    Implementations are called as ``fn(client, arguments, api_key)``.
+    """
+
+    def __init__(self, definition, fn, timeout=TOOL_TIMEOUT, max_concurrency=None):
+        self.name = definition["name"]
+        self.definition = definition
+        self.fn = fn
+        self.is_async = asyncio.iscoroutinefunction(fn)
+        self.validate = compile_schema(definition["inputSchema"])
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def call(self, client, arguments, api_key):
+        """
+        Run the tool within its limits and record its timing.
+
+        Results that are ``{"error": ...}`` dicts count as errors, as do exceptions.
+        A call exceeding the tool's timeout is cancelled and returns an error dict.
+        """
+        started = time.perf_counter()
+        failed = True
+        try:
+            async with self._semaphore or nullcontext():
+                if self.is_async:
+                    try:
+                        result = await asyncio.wait_for(self.fn(client, arguments, api_key), self.timeout)
+                    except asyncio.TimeoutError:
+                        result = {"error": f"Tool {self.name} timed out after {self.timeout:g} seconds"}
+                else:
+                    result = self.fn(client, arguments, api_key)
+            failed = isinstance(result, dict) and "error" in result
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            self.calls += 1
+            self.errors += failed
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Call and error counts with average and maximum latency.
+        """
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+# Tool registry: name -> ToolHandler, in catalogue order
+TOOL_HANDLERS = {}
+
+
+def tool(definition, timeout=TOOL_TIMEOUT, max_concurrency=None):
+    """
+    Decorator registering a tools/call implementation together with its catalogue definition.
+
+    Adding a tool only takes this registration: the catalogue (TOOLS), both
+    servers' tool lists and the /mcp dispatcher all derive from TOOL_HANDLERS.
+
+    Args:
+        definition (dict): MCP tool definition (name, title, description, annotations, inputSchema).
+        timeout (float): Seconds before an async call is cancelled.
+        max_concurrency (int, optional): Maximum calls of this tool running at once.
+    """
+    def decorator(fn):
+        TOOL_HANDLERS[definition["name"]] = ToolHandler(definition, fn, timeout=timeout, max_concurrency=max_concurrency)
+        return fn
+
+    return decorator
+
+
+@tool({
+    "name": "create_qr_code",
+    "title": "Create QR code",
+    "description": "Create a new QR code. Can be called with: create qr, make qr code, generate qr, new qr code, add qr code",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "params": {
+                "type": "object",
+                "description": "QR code parameters including qr_type, category, info, and name"
+            }
+        },
+        "required": ["params"],
+        "additionalProperties": False
+    }
+})
+async def create_qr_code_handler(client, arguments, api_key):
+    return await client.create_qr_code(arguments.get("params"), api_key=api_key)
+
+
+@tool({
+    "name": "list_qr_codes",
+    "title": "List QR codes",
+    "description": "List QR codes. Can be called with: list qr codes, fetch qr list, get qr codes, show qr codes, display qr codes, last 5 qr codes, recent qr codes",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "page": {"type": "integer", "default": 1},
+            "limit": {"type": "integer", "default": 10},
+            "search": {"type": "string"},
+            "fields": FIELDS_PROPERTY
+        },
+        "additionalProperties": False
+    }
+})
+async def list_qr_codes_handler(client, arguments, api_key):
+    qr_params = {}
+    if arguments.get("page"):
+        qr_params["page"] = arguments.get("page")
+    if arguments.get("limit"):
+        qr_params["limit"] = arguments.get("limit")
+    if arguments.get("search"):
+        qr_params["search"] = arguments.get("search")
+    return await client.list_qr_codes(qr_params if qr_params else None, api_key=api_key)
+
+
+@tool({
+    "name": "update_qr_code",
+    "title": "Update QR code",
+    "description": "Update an existing QR code. Can be called with: update qr, modify qr code, edit qr code, change qr code",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrid": {"type": "string"},
+            "params": {"type": "object"}
+        },
+        "required": ["qrid", "params"],
+        "additionalProperties": False
+    }
+})
+async def update_qr_code_handler(client, arguments, api_key):
+    return await client.update_qr_code(arguments.get("qrid"), arguments.get("params"), api_key=api_key)
+
+
+@tool({
+    "name": "retrieve_qr_code",
+    "title": "Retrieve QR code details",
+    "description": "Get details of a specific QR code. Can be called with: get qr details, fetch qr code, show qr info, qr code info",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrid": {"type": "string"},
+            "fields": FIELDS_PROPERTY
+        },
+        "required": ["qrid"],
+        "additionalProperties": False
+    }
+})
+async def retrieve_qr_code_handler(client, arguments, api_key):
+    return await client.retrieve_qr_code(arguments.get("qrid"), api_key=api_key)
+
+
+@tool({
+    "name": "download_qr_code",
+    "title": "Download QR code image",
+    "description": "Download QR code image. Small images are returned inline; larger exports (e.g. SVG, PDF, EPS) return a download_url to fetch with the same API key. Can be called with: download qr, get qr image, save qr code, export qr code",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrid": {"type": "string"},
+            "params": {"type": "object"}
+        },
+        "required": ["qrid"],
+        "additionalProperties": False
+    }
+})
+async def download_qr_code_handler(client, arguments, api_key):
+    qrid, params = arguments.get("qrid"), arguments.get("params")
+    result = await client.download_qr_code(qrid, params, api_key=api_key)
+    if isinstance(result, dict) and result.get("success") and "data" not in result:
+        # Too large to inline: point the client at the streaming endpoint
+        query = f"?{urlencode(params)}" if params else ""
+        result["download_url"] = f"{MCP_RESOURCE_URL}/download/{quote(qrid, safe='')}{query}"
+    return result
+
+
+@tool({
+    "name": "preview_qr_code",
+    "title": "Preview QR code",
+    "description": "Render a plain QR code for a URL or text locally, as PNG or SVG, without calling the Scanova API. Use it for quick previews; tracked and branded QR codes come from create_qr_code and download_qr_code. Can be called with: preview qr, show qr for url, render qr code, qr code image for text",
+    "annotations": LOCAL_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "data": {"type": "string", "description": "URL or text to encode"},
+            "format": {"type": "string", "enum": ["png", "svg"], "default": "png"},
+            "error_correction": {"type": "string", "enum": ["L", "M", "Q", "H"], "default": "M"},
+            "scale": {"type": "integer", "default": 4, "description": f"Pixels per module, 1-{QR_PREVIEW_MAX_SCALE}"},
+            "border": {"type": "integer", "default": 4, "description": "Quiet zone in modules, 0-16"}
+        },
+        "required": ["data"],
+        "additionalProperties": False
+    }
+})
+def preview_qr_code_handler(client, arguments, api_key):
+    import qr_render
+
+    image_format = (arguments.get("format") or "png").lower()
+    level = (arguments.get("error_correction") or "M").upper()
+    if image_format not in qr_render.FORMATS:
+        return {"error": f"Unknown format {image_format!r}, expected png or svg"}
+    scale = min(max(arguments.get("scale") or 4, 1), QR_PREVIEW_MAX_SCALE)
+    border = arguments.get("border")
+    border = 4 if border is None else min(max(border, 0), 16)
+    try:
+        matrix = qr_render.encode(arguments["data"], level)
+        image = qr_render.render(arguments["data"], image_format, level, scale, border)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {
+        "success": True,
+        "message": "QR code preview rendered locally",
+        "content_type": qr_render.FORMATS[image_format],
+        "size": len(image),
+        "version": matrix.version,
+        "modules": matrix.size,
+        "error_correction": level,
+        "data": base64.b64encode(image).decode("ascii"),
+    }
+
+
+@tool({
+    "name": "activate_qr_code",
+    "title": "Activate QR code",
+    "description": "Activate a QR code. Can be called with: activate qr, enable qr code, turn on qr code, make qr active",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrid": {"type": "string"}
+        },
+        "required": ["qrid"],
+        "additionalProperties": False
+    }
+})
+async def activate_qr_code_handler(client, arguments, api_key):
+    return await client.activate_qr_code(arguments.get("qrid"), api_key=api_key)
+
+
+@tool({
+    "name": "deactivate_qr_code",
+    "title": "Deactivate QR code",
+    "description": "Deactivate a QR code. Can be called with: deactivate qr, disable qr code, turn off qr code, make qr inactive",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrid": {"type": "string"}
+        },
+        "required": ["qrid"],
+        "additionalProperties": False
+    }
+})
+async def deactivate_qr_code_handler(client, arguments, api_key):
+    return await client.deactivate_qr_code(arguments.get("qrid"), api_key=api_key)
+
+
+@tool({
+    "name": "bulk_create_qr_codes",
+    "title": "Bulk create QR codes",
+    "description": "Create many QR codes at once. Returns per-item results; failed items do not stop the others. Can be called with: bulk create qr codes, create multiple qr codes, batch generate qr codes",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "array",
+                "items": {"type": "object"},
+                "description": "QR code parameters for each QR code, as for create_qr_code"
+            }
+        },
+        "required": ["items"],
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT, max_concurrency=BULK_TOOL_MAX_CONCURRENCY)
+async def bulk_create_qr_codes_handler(client, arguments, api_key):
+    from bulk import bulk_create_qr_codes
+
+    return await bulk_create_qr_codes(client, arguments.get("items"), api_key=api_key)
+
+
+@tool({
+    "name": "bulk_update_qr_codes",
+    "title": "Bulk update QR codes",
+    "description": "Update many QR codes at once. Each item has a qrid and params. Returns per-item results; failed items do not stop the others. Can be called with: bulk update qr codes, update multiple qr codes, batch edit qr codes",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "qrid": {"type": "string"},
+                        "params": {"type": "object"}
+                    },
+                    "required": ["qrid", "params"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["items"],
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT, max_concurrency=BULK_TOOL_MAX_CONCURRENCY)
+async def bulk_update_qr_codes_handler(client, arguments, api_key):
+    from bulk import bulk_update_qr_codes
+
+    return await bulk_update_qr_codes(client, arguments.get("items"), api_key=api_key)
+
+
+@tool({
+    "name": "bulk_set_qr_active",
+    "title": "Bulk activate or deactivate QR codes",
+    "description": "Activate or deactivate many QR codes at once. Returns per-item results; failed items do not stop the others. Can be called with: bulk activate qr codes, bulk deactivate qr codes, enable multiple qr codes, disable multiple qr codes",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "qrids": {"type": "array", "items": {"type": "string"}},
+            "is_active": {"type": "boolean", "default": True}
+        },
+        "required": ["qrids"],
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT, max_concurrency=BULK_TOOL_MAX_CONCURRENCY)
+async def bulk_set_qr_active_handler(client, arguments, api_key):
+    from bulk import bulk_set_qr_active
+
+    return await bulk_set_qr_active(client, arguments.get("qrids"), arguments.get("is_active", True), api_key=api_key)
+
+
+# Filters shared by the account-wide listing tools
+FILTERS_PROPERTY = {
+    "type": "object",
+    "description": "Only include QR codes whose fields equal these values, e.g. {\"is_active\": false, \"qr_type\": \"dy\"}; dotted paths such as \"info.url\" are allowed"
+}
+
+
+@tool({
+    "name": "list_all_qr_codes",
+    "title": "List all QR codes",
+    "description": f"List every QR code in the account matching optional filters, following all pages (at most {LIST_ALL_MAX_ITEMS}). Can be called with: list all qr codes, all inactive qr codes, every qr code, export qr list",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "filters": FILTERS_PROPERTY,
+            "search": {"type": "string"},
+            "fields": FIELDS_PROPERTY,
+            "max_items": {"type": "integer", "default": LIST_ALL_MAX_ITEMS}
+        },
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT)
+async def list_all_qr_codes_handler(client, arguments, api_key):
+    from listing import list_all_qr_codes
+
+    return await list_all_qr_codes(
+        client,
+        arguments.get("filters"),
+        arguments.get("search"),
+        arguments.get("fields"),
+        arguments.get("max_items") or LIST_ALL_MAX_ITEMS,
+        api_key=api_key,
+    )
+
+
+@tool({
+    "name": "summarize_qr_codes",
+    "title": "Summarize QR codes",
+    "description": "Count the QR codes in the account matching optional filters, grouped by type, active state and category (or other fields). Can be called with: how many qr codes, count inactive qr codes, qr code summary, qr codes by type",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "filters": FILTERS_PROPERTY,
+            "search": {"type": "string"},
+            "group_by": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Fields to group counts by; defaults to [\"qr_type\", \"is_active\", \"category\"]"
+            }
+        },
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT)
+async def summarize_qr_codes_handler(client, arguments, api_key):
+    from listing import summarize_qr_codes
+
+    return await summarize_qr_codes(
+        client, arguments.get("filters"), arguments.get("search"), arguments.get("group_by"), api_key=api_key
+    )
+
+
+@tool({
+    "name": "search_qr_codes",
+    "title": "Search QR codes",
+    "description": "Search QR codes by name, URL, category, type or any text, answered from a local index that reports how fresh it is. Words match as prefixes; \"name:menu\" searches one field. Can be called with: search qr codes, find qr code, which qr codes point to, look up qr",
+    "annotations": READ_ONLY_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "filters": FILTERS_PROPERTY,
+            "fields": FIELDS_PROPERTY,
+            "limit": {"type": "integer", "default": SEARCH_MAX_RESULTS}
+        },
+        "additionalProperties": False
+    }
+}, timeout=BULK_TOOL_TIMEOUT)
+async def search_qr_codes_handler(client, arguments, api_key):
+    from search import search_qr_codes
+
+    return await search_qr_codes(
+        client,
+        arguments.get("query"),
+        arguments.get("filters"),
+        arguments.get("fields"),
+        arguments.get("limit"),
+        api_key=api_key,
+    )
+
+
+@tool({
+    "name": "start_job",
+    "title": "Start background job",
+    "description": "Start a background job for work too large for one call: creating, updating, activating or deactivating thousands of QR codes, or exporting QR images. Returns a job_id at once; follow it with get_job_status. Jobs continue after a server restart. Kinds and params: bulk_create_qr_codes {items}, bulk_update_qr_codes {items: [{qrid, params}]}, bulk_set_qr_active {qrids, is_active}, export_qr_images {qrids (default: all QR codes), params (download options)}. Can be called with: start job, run in background, export all qr images, update thousands of qr codes",
+    "annotations": WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "kind": {"type": "string", "enum": ["bulk_create_qr_codes", "bulk_update_qr_codes", "bulk_set_qr_active", "export_qr_images"]},
+            "params": {"type": "object"}
+        },
+        "required": ["kind"],
+        "additionalProperties": False
+    }
+})
+async def start_job_handler(client, arguments, api_key):
+    from jobs import start_job
+
+    return await start_job(client, arguments.get("kind"), arguments.get("params"), api_key=api_key)
+
+
+@tool({
+    "name": "get_job_status",
+    "title": "Get background job status",
+    "description": "Show the progress of a background job (items done, succeeded and failed), optionally with its per-item results; without job_id, list recent jobs. Can be called with: job status, is my job done, job progress, list jobs",
+    "annotations": LOCAL_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "job_id": {"type": "string"},
+            "include_results": {"type": "boolean", "default": False},
+            "offset": {"type": "integer", "default": 0},
+            "limit": {"type": "integer", "default": 100}
+        },
+        "additionalProperties": False
+    }
+})
+async def get_job_status_handler(client, arguments, api_key):
+    from jobs import get_job_status
+
+    return await get_job_status(
+        client,
+        arguments.get("job_id"),
+        arguments.get("include_results", False),
+        arguments.get("offset"),
+        arguments.get("limit"),
+        api_key=api_key,
+    )
+
+
+@tool({
+    "name": "cancel_job",
+    "title": "Cancel background job",
+    "description": "Cancel a background job. A queued job is cancelled at once; a running one stops after its current chunk of items, keeping the results so far. Can be called with: cancel job, stop job, abort background job",
+    "annotations": LOCAL_WRITE_TOOL_ANNOTATIONS_JSON,
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "job_id": {"type": "string"}
+        },
+        "required": ["job_id"],
+        "additionalProperties": False
+    }
+})
+async def cancel_job_handler(client, arguments, api_key):
+    from jobs import cancel_job
+
+    return await cancel_job(client, arguments.get("job_id"), api_key=api_key)
+
+
+# Single catalogue of the Scanova MCP tools. Both the stdio server (server.py)
+# and the HTTP server (cloud_server.py) derive names, titles, descriptions,
+# annotations and input schemas from it.
+TOOLS = [handler.definition for handler in TOOL_HANDLERS.values()]
+
+TOOLS_BY_NAME = {tool["name"]: tool for tool in TOOLS}
+
+
+def tool_stats():
+    """
+    Returns:
+        dict: Per-tool call counts and latency, keyed by tool name.
+    """
+    return {name: handler.stats() for name, handler in TOOL_HANDLERS.items()}
+
+
+def catalogue_tool(server, name):
+    """
+    Decorator registering a function on a FastMCP server as catalogue tool ``name``.
+
+    Title, description and annotations come from TOOLS, and the advertised
+    input schema is replaced by the catalogue's so both servers list the same
+    schema. The function signature still drives FastMCP argument parsing.
+    """
+    from mcp.types import ToolAnnotations
+
+    tool = TOOLS_BY_NAME[name]
+
+    def decorator(fn):
+        server.add_tool(
+            fn,
+            name=name,
+            title=tool["title"],
+            description=tool["description"],
+            annotations=ToolAnnotations(**tool["annotations"]),
+        )
+        # FastMCP has no public hook for a hand-written schema (tools= of the
+        # constructor needs every Tool before the server exists), so the
+        # registered Tool is updated; fail at import rather than list another schema
+        manager = getattr(server, "_tool_manager", None)
+        registered = manager.get_tool(name) if hasattr(manager, "get_tool") else None
+        if registered is None or "parameters" not in getattr(type(registered), "model_fields", {}):
+            raise RuntimeError(
+                f"Cannot set the input schema of tool {name}: this MCP SDK version no longer "
+                "keeps tools in FastMCP._tool_manager as Tool models with parameters"
+            )
+        registered.parameters = tool["inputSchema"]
+        return fn
+
+    return decorator
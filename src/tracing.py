@@ -0,0 +1,328 @@
+"""
+Request tracing with OpenTelemetry-compatible span data.
+
+A trace is started per /mcp request and spans for parsing, auth, dispatch,
+upstream calls and serialization are nested under it through a ContextVar.
+Finished traces go to a SpanExporter as dicts shaped like OpenTelemetry spans
+(W3C trace and span ids, unix-nanosecond timestamps, attributes, status),
+and an incoming ``traceparent`` header continues the caller's trace.
+
+With tracing disabled, or for a request that is not recorded, ``span()``
+costs one ContextVar lookup and returns a shared no-op span.
+"""
+import contextvars
+import importlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from config import TRACING_EXPORTER, TRACING_FILE, TRACING_SAMPLE_RATE, TRACING_SLOW_SECONDS
+
+log = logging.getLogger('mcp')
+
+SERVICE_NAME = "scanova-mcp"
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """
+    Destination of finished traces. Implementations must be safe to call
+    from several threads.
+    """
+
+    def export(self, spans):
+        """Receive the spans of one trace, as dicts, children before their parents."""
+        raise NotImplementedError
+
+
+class InMemoryExporter(SpanExporter):
+    """
+    Keeps the most recent ``max_spans`` spans in ``spans``; meant for tests.
+    """
+
+    def __init__(self, max_spans=10000):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """
+    Appends spans to a file, one JSON object per line.
+    """
+
+    def __init__(self, path=TRACING_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span, default=str) + "\n" for span in spans)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(lines)
+
+
+class Trace:
+    """
+    Spans recorded for one request, exported when the root span ends.
+    """
+
+    __slots__ = ("tracer", "trace_id", "sampled", "spans", "closed")
+
+    def __init__(self, tracer, trace_id, sampled):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.closed = False
+
+
+class Span:
+    """
+    A timed operation within a trace. Used as a context manager, it becomes
+    the parent of spans started inside it; an exception leaving it marks it
+    as failed.
+    """
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end", "attributes", "status", "message", "_token")
+
+    recording = True
+
+    def __init__(self, trace, name, parent_id):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = None
+        self.end = None
+        self.attributes = {}
+        self.status = "UNSET"
+        self.message = None
+
+    @property
+    def traceparent(self):
+        """W3C traceparent header value identifying this span."""
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = "ERROR"
+        self.message = message
+
+    def __enter__(self):
+        self._token = current_span.set(self)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current_span.reset(self._token)
+        self.finish(f"{exc_type.__name__}: {exc}" if exc_type is not None else None)
+
+    def finish(self, error=None):
+        """End the span; ``error`` marks it as failed unless a status was set."""
+        self.end = time.time_ns()
+        if error and self.status == "UNSET":
+            self.set_error(error)
+        if not self.trace.closed:
+            self.trace.spans.append(self)
+
+    def to_dict(self):
+        span = {
+            "name": self.name,
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+        if self.message:
+            span["status"]["message"] = self.message
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is recorded."""
+
+    __slots__ = ()
+
+    recording = False
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def defer(self):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class RootSpan(Span):
+    """
+    The span of a whole request; ending it ends the trace.
+
+    A response that is still being sent when its handler returns (a stream)
+    calls ``defer()`` inside the span: leaving the ``with`` block then only
+    restores the context, and ``finish()`` ends the span and the trace once
+    the last byte is sent, keeping the spans recorded meanwhile.
+    """
+
+    __slots__ = ("deferred",)
+
+    def __init__(self, trace, name, parent_id):
+        super().__init__(trace, name, parent_id)
+        self.deferred = False
+
+    def defer(self):
+        self.deferred = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.deferred and exc_type is None:
+            current_span.reset(self._token)
+        else:
+            super().__exit__(exc_type, exc, tb)
+
+    def finish(self, error=None):
+        super().finish(error)
+        trace = self.trace
+        trace.closed = True
+        trace.tracer.finish(trace, self)
+
+
+class Tracer:
+    """
+    Starts traces and decides which are exported.
+
+    A trace is sampled with probability ``sample_rate``, or as the incoming
+    traceparent says. With ``slow_seconds`` set every trace is recorded and
+    unsampled ones are still exported when the request took at least that
+    long, so the slow tail is always kept.
+    """
+
+    def __init__(self, exporter, sample_rate=TRACING_SAMPLE_RATE, slow_seconds=TRACING_SLOW_SECONDS):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.exported = 0
+        self.dropped = 0
+
+    def start_trace(self, name, traceparent=None):
+        """
+        Return the root span for a request, or NOOP_SPAN if it is not recorded.
+
+        Args:
+            name (str): Span name, e.g. "POST /mcp".
+            traceparent (str, optional): W3C traceparent header of the caller.
+        """
+        match = TRACEPARENT.match(traceparent) if traceparent else None
+        if match:
+            trace_id, parent_id = match.group(1), match.group(2)
+            sampled = bool(int(match.group(3), 16) & 1)
+        else:
+            trace_id, parent_id = None, None
+            sampled = random.random() < self.sample_rate
+        if not sampled and not self.slow_seconds:
+            return NOOP_SPAN
+        trace = Trace(self, trace_id or f"{random.getrandbits(128):032x}", sampled)
+        return RootSpan(trace, name, parent_id)
+
+    def finish(self, trace, root):
+        if not trace.sampled and (root.end - root.start) / 1e9 < self.slow_seconds:
+            self.dropped += 1
+            return
+        try:
+            self.exporter.export([span.to_dict() for span in trace.spans])
+            self.exported += 1
+        except Exception as e:
+            log.warning(f"Trace export failed: {str(e)}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Traces exported and traces recorded but not kept.
+        """
+        return {"exported": self.exported, "dropped": self.dropped}
+
+
+def create_exporter(name=TRACING_EXPORTER, path=TRACING_FILE):
+    """
+    Build the exporter configured by TRACING_EXPORTER.
+
+    Returns:
+        SpanExporter: The exporter, or None when tracing is off.
+    """
+    if not name or name.lower() == "none":
+        return None
+    if name.lower() == "memory":
+        return InMemoryExporter()
+    if name.lower() == "file":
+        return FileExporter(path)
+    module, _, attribute = name.partition(":")
+    exporter = getattr(importlib.import_module(module), attribute)
+    return exporter() if isinstance(exporter, type) else exporter
+
+
+_exporter = create_exporter()
+tracer = Tracer(_exporter) if _exporter is not None else None
+
+
+def configure(exporter, sample_rate=TRACING_SAMPLE_RATE, slow_seconds=TRACING_SLOW_SECONDS):
+    """
+    Replace the process-wide tracer; ``exporter=None`` turns tracing off.
+
+    Returns:
+        Tracer: The new tracer, or None.
+    """
+    global tracer
+    tracer = Tracer(exporter, sample_rate, slow_seconds) if exporter is not None else None
+    return tracer
+
+
+def start_trace(name, traceparent=None):
+    """Start a request trace with the process-wide tracer; see Tracer.start_trace."""
+    if tracer is None:
+        return NOOP_SPAN
+    return tracer.start_trace(name, traceparent)
+
+
+def span(name):
+    """
+    Start a child of the current span, or return NOOP_SPAN outside a recorded trace.
+
+    Use as ``with span("name") as s:``; check ``s.recording`` before
+    computing attributes that are costly.
+    """
+    parent = current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id)
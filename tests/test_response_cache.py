@@ -0,0 +1,73 @@
+"""
+Response cache consistency of ScanovaClient reads racing writes.
+
+Run with:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("SCANOVA_DATA_DIR", tempfile.mkdtemp(prefix="scanova-test-"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import httpx
+
+from cache import MemoryBackend, ResponseCache
+from scanova_client import ScanovaClient
+
+API_KEY = "test-key-0123456789abcdef"
+
+
+class ReadDuringWriteTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.name = "before"
+        self.gets = 0
+        self.hold = asyncio.Event()
+        self.held = asyncio.Event()
+
+        async def handler(request):
+            if request.method == "PUT":
+                self.name = "after"
+                return httpx.Response(200, json={"qrid": "1", "name": self.name})
+            self.gets += 1
+            name = self.name
+            if self.gets == 1:
+                # The first read answers with what it saw, after the write is done
+                self.held.set()
+                await self.hold.wait()
+            return httpx.Response(200, json={"qrid": "1", "name": name})
+
+        self.client = ScanovaClient(
+            base_url="http://scanova.test/",
+            transport=httpx.MockTransport(handler),
+            cache=ResponseCache(MemoryBackend()),
+        )
+        self.client.index = None
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_read_started_before_write_is_not_cached(self):
+        read = asyncio.ensure_future(self.client.retrieve_qr_code("1", api_key=API_KEY))
+        await self.held.wait()
+        await self.client.update_qr_code("1", {"name": "after"}, api_key=API_KEY)
+        self.hold.set()
+        self.assertEqual((await read)["name"], "before")
+
+        result = await self.client.retrieve_qr_code("1", api_key=API_KEY)
+        self.assertEqual(result["name"], "after")
+        self.assertEqual(self.gets, 2)
+
+    async def test_read_without_write_is_cached(self):
+        self.hold.set()
+        await self.client.retrieve_qr_code("1", api_key=API_KEY)
+        await self.client.retrieve_qr_code("1", api_key=API_KEY)
+        self.assertEqual(self.gets, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()